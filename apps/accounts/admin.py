@@ -32,21 +32,22 @@ class CustomUserAdmin(UserAdmin):
                 reason = form.cleaned_data['reason']
                 delta = form.cleaned_data['amount_delta']
                 count = 0
-                for user in queryset:
-                    old_balance = user.balance
-                    user.balance += delta
-                    user.save()
-                    
-                    AuditService.log_event(
-                        actor=request.user,
-                        target=user,
-                        event_type=AuditEventType.ADMIN_BALANCE_ADJUSTMENT,
-                        description=f"Balance adjusted by {delta}. Reason: {reason}",
-                        payload_before={"balance": str(old_balance)},
-                        payload_after={"balance": str(user.balance)},
-                        metadata={"reason": reason, "delta": str(delta)}
-                    )
-                    count += 1
+                with AuditService.buffered():
+                    for user in queryset:
+                        old_balance = user.balance
+                        user.balance += delta
+                        user.save()
+                        
+                        AuditService.log_event(
+                            actor=request.user,
+                            target=user,
+                            event_type=AuditEventType.ADMIN_BALANCE_ADJUSTMENT,
+                            description=f"Balance adjusted by {delta}. Reason: {reason}",
+                            payload_before={"balance": str(old_balance)},
+                            payload_after={"balance": str(user.balance)},
+                            metadata={"reason": reason, "delta": str(delta)}
+                        )
+                        count += 1
                 
                 self.message_user(request, f"Successfully adjusted balance for {count} users.")
                 return HttpResponseRedirect(request.get_full_path())
@@ -4,6 +4,12 @@ from rest_framework.decorators import action
 from .models import User, KYCProfile, KYCDocument
 from .serializers import UserSerializer, RegisterSerializer, KYCProfileSerializer, KYCDocumentSerializer
 from .permissions import IsLoanOfficer, IsAdminUser
+from django.shortcuts import get_object_or_404
+from core.models import UploadSession
+from core.serializers import UploadFinishSerializer, UploadSessionSerializer, UploadStartSerializer
+from core.uploads import UploadError, UploadService, hash_file
+
+UPLOAD_PURPOSE = 'kyc_document'
 
 class AuthViewSet(viewsets.GenericViewSet):
     queryset = User.objects.all()
@@ -45,6 +51,53 @@ class KYCViewSet(viewsets.ModelViewSet):
         profile = self.get_object()
         serializer = KYCDocumentSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(profile=profile)
+            content_hash = hash_file(serializer.validated_data['file'])
+            existing = profile.documents.filter(
+                content_hash=content_hash, document_type=serializer.validated_data['document_type']
+            ).first()
+            if existing is not None:
+                return Response(KYCDocumentSerializer(existing).data)
+            serializer.save(profile=profile, content_hash=content_hash)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'])
+    def start_upload(self, request, pk=None):
+        """
+        Opens a chunked upload for a KYC document; send the chunks to
+        /api/uploads/<key>/chunks/<index>/, then call finish_upload.
+        """
+        profile = self.get_object()
+        serializer = UploadStartSerializer(data=request.data, document_types=KYCDocument.DocType.choices)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = UploadService.start(
+                request.user, UPLOAD_PURPOSE, profile.pk, serializer.validated_data['document_type'],
+                serializer.validated_data['file_name'], serializer.validated_data['size']
+            )
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def finish_upload(self, request, pk=None):
+        """
+        Turns a complete chunked upload into a KYCDocument, or returns the
+        profile's existing document of the same type and content (200).
+        """
+        profile = self.get_object()
+        serializer = UploadFinishSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = get_object_or_404(
+            UploadSession, key=serializer.validated_data['upload'], owner=request.user,
+            purpose=UPLOAD_PURPOSE, target_id=profile.pk
+        )
+        document = KYCDocument(profile=profile, document_type=session.document_type)
+        try:
+            document, created = UploadService.finish(session, document, profile.documents.all())
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            KYCDocumentSerializer(document).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
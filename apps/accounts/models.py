@@ -44,6 +44,8 @@ class KYCDocument(AuditBaseModel):
     document_type = models.CharField(max_length=50, choices=DocType.choices)
     file = models.FileField(upload_to='kyc_documents/%Y/%m/%d/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # core.uploads content hash; the same file is stored once per owner and document type
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return f"{self.get_document_type_display()} for {self.profile.user.username}"
\ No newline at end of file
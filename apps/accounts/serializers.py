@@ -26,8 +26,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 class KYCDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = KYCDocument
-        fields = ['id', 'document_type', 'file', 'uploaded_at']
-        read_only_fields = ['uploaded_at']
+        fields = ['id', 'document_type', 'file', 'uploaded_at', 'content_hash']
+        read_only_fields = ['uploaded_at', 'content_hash']
 
 class KYCProfileSerializer(serializers.ModelSerializer):
     documents = KYCDocumentSerializer(many=True, read_only=True)
@@ -1,12 +1,30 @@
 from django.contrib import admin
-from .models import AuditLog, Blacklist
+from .models import AuditLog, AuditCheckpoint, AuditSegment, Blacklist
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ['id', 'created_at', 'actor', 'event_type', 'content_type', 'object_id']
     list_filter = ['event_type', 'created_at', 'content_type']
     search_fields = ['description', 'actor__username', 'object_id']
-    readonly_fields = [f.name for f in AuditLog._meta.get_fields()]
+    search_help_text = "Matches whole words in descriptions and payloads, or an exact object id / actor username."
+    # Skip the COUNT(*) over the whole table on every changelist page
+    show_full_result_count = False
+    readonly_fields = [f.name for f in AuditLog._meta.get_fields() if not f.one_to_many]
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Uses the audit search index instead of LIKE scans over description.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        from django.db.models import Q
+        from .search import matching_ids
+        words = Q()
+        for condition in matching_ids(search_term):
+            words &= condition
+        exact = Q(object_id=search_term) | Q(actor__username=search_term)
+        return queryset.filter(words | exact if words else exact), False
     
     def has_add_permission(self, request):
         return False
@@ -17,6 +35,34 @@ class AuditLogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+@admin.register(AuditCheckpoint)
+class AuditCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['sequence', 'record_hash', 'created_at', 'verified_at']
+    readonly_fields = [f.name for f in AuditCheckpoint._meta.get_fields()]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(AuditSegment)
+class AuditSegmentAdmin(admin.ModelAdmin):
+    list_display = ['partition', 'name', 'rows', 'min_time', 'max_time', 'min_sequence', 'max_sequence', 'sealed_at']
+    readonly_fields = [f.name for f in AuditSegment._meta.get_fields()]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Blacklist)
 class BlacklistAdmin(admin.ModelAdmin):
     list_display = ['user', 'is_active', 'created_at', 'created_by']
@@ -1,32 +1,59 @@
 import csv
 import io
+import zlib
 from decimal import Decimal
-from django.db.models import Sum, F, Count
 from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import BaseRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from loans.models import Loan, LoanInstallment
-from .models import AuditLog
+from core.downloads import ranged_file_response
+from loans.models import Loan
+from .models import AuditLog, ReportJob, ReportSnapshot
 from .services import AuditService
 from .events import AuditEventType
 from .serializers import (
     UserExposureSerializer, DefaultRateSerializer, 
-    LatePaymentSerializer, AdminActionReportSerializer
+    LatePaymentSerializer, AgingBucketSerializer, AdminActionReportSerializer,
+    AuditLogSearchSerializer, AuditSearchQuerySerializer,
+    ReportJobRequestSerializer, ReportJobSerializer
 )
+from . import reports
+from . import search as audit_search
+from .jobs import ReportJobService
+from .snapshots import ReportSnapshotService
 
-class Echo:
-    """An object that implements just the write method of the file-like interface."""
-    def write(self, value):
-        return value
+# Rows are written to the response in chunks of about this size
+CSV_CHUNK_BYTES = 64 * 1024
+
+class CSVRenderer(BaseRenderer):
+    """
+    Lets ?format=csv pass DRF's content negotiation; the CSV views return
+    their own streaming response, so nothing is rendered here.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+class ReportPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
 
 class ComplianceReportViewSet(viewsets.ViewSet):
     """
     ViewSet for generating compliance reports. Restricted to ADMIN users.
     """
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer]
 
     def _check_admin_role(self, user):
         if getattr(user, 'role', '') != 'ADMIN':
@@ -42,83 +69,267 @@ class ComplianceReportViewSet(viewsets.ViewSet):
             metadata={"report_name": report_name, "format": request.query_params.get('format', 'json')}
         )
 
+    def _snapshot(self, request, report):
+        """
+        Resolves ?as_of=YYYY-MM-DD to a stored snapshot of `report`.
+        Returns (snapshot, None), (None, error response), or (None, None)
+        when no as_of was given and the report should be computed live.
+        Today's snapshot is built on first request; past dates must
+        already exist (see snapshot_compliance_reports).
+        """
+        raw = request.query_params.get('as_of')
+        if not raw:
+            return None, None
+        try:
+            as_of = parse_date(raw)
+        except ValueError:
+            as_of = None
+        if as_of is None:
+            return None, Response({"as_of": "Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        snapshot = ReportSnapshotService.get(report, as_of)
+        if snapshot is None and as_of == timezone.now().date():
+            snapshot = ReportSnapshotService.build(report, as_of)
+        if snapshot is None:
+            return None, Response(
+                {"detail": f"No {report} snapshot as of {as_of}."}, status=status.HTTP_404_NOT_FOUND
+            )
+        return snapshot, None
+
+    @staticmethod
+    def _snapshot_headers(response, snapshot):
+        if snapshot is not None:
+            response['X-Report-As-Of'] = snapshot.as_of.isoformat()
+            response['X-Report-Computed-At'] = snapshot.computed_at.isoformat()
+        return response
+
     @action(detail=False, methods=['get'])
     def exposure(self, request):
+        """
+        Outstanding principal per borrower. ?format=csv streams the report
+        through a server-side cursor; add ?compress=gzip for a .csv.gz.
+        ?as_of=YYYY-MM-DD serves the stored snapshot for that date.
+        """
         if not self._check_admin_role(request.user):
             return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
 
-        data = Loan.objects.filter(
-            status=Loan.Status.ACTIVE
-        ).values('borrower', username=F('borrower__username')).annotate(
-            total_exposure=Sum('principal')
-        ).order_by('-total_exposure')
+        snapshot, error = self._snapshot(request, ReportSnapshot.Report.EXPOSURE)
+        if error is not None:
+            return error
+        data = snapshot.data['rows'] if snapshot is not None else reports.borrower_exposure()
 
         if request.query_params.get('format') == 'csv':
-            return self._stream_csv(
-                header=['Borrower ID', 'Username', 'Total Exposure'],
-                rows=[[d['borrower'], d['username'], d['total_exposure']] for d in data],
-                filename='user_exposure_report.csv'
+            self._log_report_access(request, "User Exposure")
+            response = self._stream_csv(
+                header=reports.EXPORT_HEADERS['exposure'],
+                rows=reports.export_rows('exposure', snapshot.data['rows'] if snapshot is not None else None),
+                filename='user_exposure_report.csv',
+                compress=request.query_params.get('compress') == 'gzip'
             )
+            return self._snapshot_headers(response, snapshot)
 
         self._log_report_access(request, "User Exposure")
         serializer = UserExposureSerializer(data, many=True)
-        return Response(serializer.data)
+        return self._snapshot_headers(Response(serializer.data), snapshot)
 
     @action(detail=False, methods=['get'])
     def default_metrics(self, request):
         if not self._check_admin_role(request.user):
             return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
 
-        total_count = Loan.objects.count()
-        default_count = Loan.objects.filter(status__in=[Loan.Status.DEFAULTED, Loan.Status.CLOSED], is_active=False).count()
-        
-        metrics = {
-            "total_disbursed_count": total_count,
-            "default_count": default_count,
-            "default_rate": (default_count / total_count * 100) if total_count > 0 else 0
-        }
+        snapshot, error = self._snapshot(request, ReportSnapshot.Report.DEFAULT_METRICS)
+        if error is not None:
+            return error
+
+        if snapshot is not None:
+            metrics = snapshot.data
+        else:
+            total_count = Loan.objects.count()
+            default_count = Loan.objects.filter(status__in=[Loan.Status.DEFAULTED, Loan.Status.CLOSED], is_active=False).count()
+
+            metrics = {
+                "total_disbursed_count": total_count,
+                "default_count": default_count,
+                "default_rate": (default_count / total_count * 100) if total_count > 0 else 0
+            }
 
         self._log_report_access(request, "Default Metrics")
         serializer = DefaultRateSerializer(metrics)
-        return Response(serializer.data)
+        return self._snapshot_headers(Response(serializer.data), snapshot)
 
     @action(detail=False, methods=['get'])
     def late_payments(self, request):
+        """
+        Overdue installments with days and amount overdue (penalty included)
+        and aging bucket totals, all computed in the database. JSON is
+        paginated (?page=, ?page_size=); ?format=csv streams every row.
+        ?as_of=YYYY-MM-DD serves the stored snapshot for that date.
+        """
         if not self._check_admin_role(request.user):
             return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
 
-        now = timezone.now().date()
-        late_installments = LoanInstallment.objects.filter(
-            status=LoanInstallment.Status.OVERDUE,
-            due_date__lt=now
-        ).annotate(
-            days_overdue=Count(now - F('due_date')), # SQLite specific or complex in ORM, simplified below
-            amount_overdue=F('principal_expected') + F('interest_expected') - F('principal_paid') - F('interest_paid')
-        ).select_related('loan__borrower')
-
-        # Complex date diff handling for cross-DB compatibility often needs extra steps
-        data = []
-        for inst in late_installments:
-            data.append({
-                "loan_id": inst.loan_id,
-                "loan__borrower__username": inst.loan.borrower.username,
-                "days_overdue": (now - inst.due_date).days,
-                "amount_overdue": inst.amount_overdue
-            })
+        snapshot, error = self._snapshot(request, ReportSnapshot.Report.LATE_PAYMENTS)
+        if error is not None:
+            return error
 
+        today = timezone.now().date()
+        if snapshot is not None:
+            installments = snapshot.data['rows']
+            to_row = dict
+        else:
+            installments = reports.late_installments(today)
+            to_row = reports.late_payment_row
+
+        if request.query_params.get('format') == 'csv':
+            self._log_report_access(request, "Late Payments")
+            response = self._stream_csv(
+                header=reports.EXPORT_HEADERS['late_payments'],
+                rows=reports.export_rows(
+                    'late_payments', snapshot.data['rows'] if snapshot is not None else None, today=today
+                ),
+                filename='late_payments_report.csv'
+            )
+            return self._snapshot_headers(response, snapshot)
+
+        paginator = ReportPagination()
+        page = paginator.paginate_queryset(installments, request, view=self)
         self._log_report_access(request, "Late Payments")
-        serializer = LatePaymentSerializer(data, many=True)
-        return Response(serializer.data)
+        response = paginator.get_paginated_response(
+            LatePaymentSerializer([to_row(row) for row in page], many=True).data
+        )
+        buckets = snapshot.data['aging_buckets'] if snapshot is not None else reports.aging_buckets(today)
+        response.data['aging_buckets'] = AgingBucketSerializer(buckets, many=True).data
+        return self._snapshot_headers(response, snapshot)
 
-    def _stream_csv(self, header, rows, filename):
-        pseudo_buffer = Echo()
-        writer = csv.writer(pseudo_buffer)
-        
+    def _stream_csv(self, header, rows, filename, compress=False):
+        """
+        Streams `rows` (any iterable) as CSV without holding them in memory,
+        optionally gzip-compressed on the fly.
+        """
         def iter_csv():
-            yield writer.writerow(header)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(header)
             for row in rows:
-                yield writer.writerow(row)
+                writer.writerow(row)
+                if buffer.tell() >= CSV_CHUNK_BYTES:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue().encode('utf-8')
+
+        def iter_gzip(chunks):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+            for chunk in chunks:
+                compressed = compressor.compress(chunk)
+                if compressed:
+                    yield compressed
+            yield compressor.flush()
 
-        response = StreamingHttpResponse(iter_csv(), content_type="text/csv")
+        if compress:
+            response = StreamingHttpResponse(iter_gzip(iter_csv()), content_type="application/gzip")
+            filename += '.gz'
+        else:
+            response = StreamingHttpResponse(iter_csv(), content_type="text/csv")
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
+
+class AuditLogSearchViewSet(viewsets.ViewSet):
+    """
+    Read-only audit search for investigators. Restricted to ADMIN users.
+    Results are newest first; pass `next_cursor` back as `cursor` for the next page.
+    `include_archived=true` also reads sealed records from cold storage.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        if getattr(request.user, 'role', '') != 'ADMIN':
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        params = AuditSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        event_types = [e.strip() for e in data.get('event_type', '').split(',') if e.strip()]
+        try:
+            records, next_cursor = audit_search.search(
+                AuditLog.objects.select_related('content_type'),
+                actor=data.get('actor'),
+                event_types=event_types,
+                content_type=data.get('target_type'),
+                object_id=data.get('object_id'),
+                since=data.get('since'),
+                until=data.get('until'),
+                query=data.get('q'),
+                cursor=data.get('cursor'),
+                page_size=data['page_size'],
+                include_archived=data['include_archived']
+            )
+        except ValueError as e:
+            return Response({"cursor": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "results": AuditLogSearchSerializer(records, many=True).data,
+            "next_cursor": next_cursor,
+        })
+
+class ReportJobViewSet(viewsets.ViewSet):
+    """
+    Background CSV exports for reports too large to build within a request.
+    POST returns 202 with the job; poll it for progress, then fetch
+    `download/`, which supports Range requests. Restricted to ADMIN users.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _check_admin_role(self, user):
+        return getattr(user, 'role', '') == 'ADMIN'
+
+    def create(self, request):
+        if not self._check_admin_role(request.user):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        params = ReportJobRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = dict(params.validated_data)
+        report = data.pop('report')
+        if 'as_of' in data:
+            data['as_of'] = data['as_of'].isoformat()
+            if ReportSnapshotService.get(report, data['as_of']) is None:
+                return Response(
+                    {"as_of": [f"No {report} snapshot as of {data['as_of']}."]}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+        job, created = ReportJobService.submit(report, data, user=request.user)
+        if created:
+            AuditService.log_event(
+                actor=request.user,
+                target=request.user,
+                event_type=AuditEventType.COMPLIANCE_REPORT_GENERATED,
+                description=f"Compliance report export queued: {report}",
+                metadata={"report_name": report, "job_id": job.pk, **data}
+            )
+        response = Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = reverse('compliance-report-jobs-detail', args=[job.pk])
+        return response
+
+    def retrieve(self, request, pk=None):
+        if not self._check_admin_role(request.user):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        job = ReportJob.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ReportJobSerializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        if not self._check_admin_role(request.user):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        job = ReportJob.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        if job.status != ReportJob.Status.DONE:
+            return Response(
+                {"detail": f"Job is {job.get_status_display().lower()}.", "progress": job.progress},
+                status=status.HTTP_409_CONFLICT
+            )
+        content_type = 'application/gzip' if job.file_name.endswith('.gz') else 'text/csv'
+        return ranged_file_response(request, ReportJobService.output_path(job), content_type, job.file_name)
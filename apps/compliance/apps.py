@@ -4,3 +4,6 @@ class ComplianceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'compliance'
     label = 'compliance'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,176 @@
+import atexit
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def current_buffer():
+    """
+    The innermost active buffer of this thread, or None.
+    """
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+class _SavepointMarker:
+    """
+    No-op on_commit callback standing for an entry logged in a deeper
+    atomic block than its buffer's. Django drops the callbacks of a
+    savepoint that rolls back, so a marker that is neither pending nor
+    run means the entry was rolled back with it.
+    """
+    committed = False
+
+    def __call__(self):
+        self.committed = True
+
+
+class _Buffer(list):
+    def __init__(self):
+        super().__init__()
+        # Number of atomic blocks open when the buffer was started
+        self.depth = len(connection.atomic_blocks)
+        self.markers = {}
+
+    def append(self, entry):
+        if len(connection.atomic_blocks) > self.depth:
+            marker = _SavepointMarker()
+            transaction.on_commit(marker)
+            self.markers[id(entry)] = marker
+        super().append(entry)
+
+    def adopt(self, entries):
+        self.extend(entries)
+        self.markers.update(entries.markers)
+
+    def surviving(self):
+        """
+        The entries not rolled back with an atomic block opened inside the buffer.
+        """
+        if not self.markers:
+            return list(self)
+        pending = {id(callback[1]) for callback in connection.run_on_commit}
+        return [
+            entry for entry in self
+            if (marker := self.markers.get(id(entry))) is None or marker.committed or id(marker) in pending
+        ]
+
+
+@contextmanager
+def buffered():
+    """
+    Collects the AuditLog rows created inside the block and writes them
+    with one bulk insert when the block exits. Nested blocks hand their
+    rows to the enclosing one, so only the outermost block writes.
+
+    Used inside a transaction, the insert happens just before the caller's
+    atomic block commits. A block started inside an atomic block that the
+    enclosing buffer is not in writes its rows when it exits instead, so
+    they are rolled back with that savepoint and kept if it commits. Rows
+    logged in an atomic block opened inside the buffer are dropped if that
+    block rolls back. If the block raises, its rows are dropped only when
+    the transaction is already marked for rollback; otherwise the caller
+    may still catch the exception and commit, so they are written as usual.
+    """
+    stack = _stack()
+    buffer = _Buffer()
+    stack.append(buffer)
+    try:
+        yield buffer
+    except BaseException:
+        stack.pop()
+        if not connection.needs_rollback:
+            _hand_off(buffer, stack)
+        raise
+    stack.pop()
+    _hand_off(buffer, stack)
+
+
+def _hand_off(buffer, stack):
+    if not buffer:
+        return
+    if stack and stack[-1].depth == len(connection.atomic_blocks):
+        stack[-1].adopt(buffer)
+    else:
+        entries = buffer.surviving()
+        if entries:
+            write(entries)
+
+
+def write(entries):
+    """
+    Appends AuditLog instances to the hash chain in order: synchronously
+    with one bulk insert, or, with AUDIT_ASYNC_WRITES, through the
+    background writer once the current transaction commits.
+    """
+    from .chain import append
+    if getattr(settings, 'AUDIT_ASYNC_WRITES', False):
+        transaction.on_commit(lambda: get_writer().submit(entries))
+    else:
+        append(entries)
+
+
+class AuditWriter:
+    """
+    Single background thread draining a FIFO queue of AuditLog batches.
+    One thread keeps batches in submission order.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, entries):
+        self._ensure_started()
+        self._queue.put(list(entries))
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+        from .chain import append
+        while True:
+            entries = self._queue.get()
+            try:
+                close_old_connections()
+                append(entries)
+            except Exception:
+                logger.exception(f"Audit writer failed to persist {len(entries)} audit records.")
+            finally:
+                self._queue.task_done()
+
+    def drain(self):
+        """
+        Blocks until every submitted batch has been written.
+        """
+        self._queue.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter()
+            atexit.register(_writer.drain)
+        return _writer
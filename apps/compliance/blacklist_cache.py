@@ -0,0 +1,138 @@
+"""
+In-process set of actively blacklisted user ids, so eligibility and
+disbursement checks never query Blacklist.
+
+Every process keeps its own copy, tagged with the version token stored in
+the shared cache (BLACKLIST_CACHE_ALIAS). Every write to Blacklist bumps
+the token when it commits (see compliance.signals and BlacklistQuerySet),
+and each process reloads the set the next time it sees a token other
+than its own. A local-memory cache is not shared between processes, so
+with one the set is also reloaded every BLACKLIST_LOCAL_RELOAD_SECONDS;
+deployments with more than one process should set CACHE_URL.
+
+Server processes load the set at startup (see config/wsgi.py and
+config/asgi.py); any other process loads it on its first check.
+"""
+import logging
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, connection, transaction
+from .models import Blacklist
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'compliance:blacklist:version'
+DEFAULT_LOCAL_RELOAD_SECONDS = 10
+
+
+class _PendingPublish:
+    """
+    on_commit callback publishing one blacklist change. Django drops it if
+    its transaction or savepoint rolls back, so while it is still
+    registered and has not run, the change is uncommitted.
+    """
+    def __init__(self, membership):
+        self.membership = membership
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.membership._publish()
+
+
+class BlacklistMembership:
+    def __init__(self):
+        self._members = frozenset()
+        self._version = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        # Publishes registered by this thread's open transaction
+        self._local = threading.local()
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'BLACKLIST_CACHE_ALIAS', 'default')]
+
+    def _expired(self):
+        # Other processes cannot bump a version held in this process's memory
+        if not isinstance(self._cache(), (LocMemCache, DummyCache)):
+            return False
+        ttl = getattr(settings, 'BLACKLIST_LOCAL_RELOAD_SECONDS', DEFAULT_LOCAL_RELOAD_SECONDS)
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= ttl
+
+    def current_version(self):
+        cache = self._cache()
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Evicted or never set: any fresh token forces every process to reload
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def load(self):
+        # Read the version first: a change committed mid-load bumps it again
+        version = self.current_version()
+        members = frozenset(Blacklist.objects.filter(is_active=True).order_by().values_list('user_id', flat=True))
+        with self._lock:
+            self._members, self._version, self._loaded_at = members, version, time.monotonic()
+        return members
+
+    def prime(self):
+        """
+        Loads the set ahead of the first check. A database that cannot be
+        read yet (e.g. not migrated) leaves the load to the first check.
+        """
+        try:
+            self.load()
+        except DatabaseError as e:
+            logger.warning(f"Blacklist membership not preloaded: {e}")
+
+    def _dirty(self):
+        """
+        True while this thread's open transaction holds an unpublished
+        blacklist change. Rolled back and published changes drop out.
+        """
+        pending = [publish for publish in getattr(self._local, 'pending', []) if not publish.done]
+        if pending:
+            registered = {id(callback[1]) for callback in connection.run_on_commit}
+            pending = [publish for publish in pending if id(publish) in registered]
+        self._local.pending = pending
+        return bool(pending)
+
+    def contains(self, user_id):
+        if self._dirty():
+            # This thread's uncommitted change is not in the shared set yet
+            return Blacklist.objects.filter(user_id=user_id, is_active=True).exists()
+        if self._version is None or self._version != self.current_version() or self._expired():
+            self.load()
+        return user_id in self._members
+
+    def invalidate(self):
+        """
+        Publishes a blacklist change once the current transaction commits.
+        """
+        if connection.in_atomic_block:
+            publish = _PendingPublish(self)
+            self._local.pending = getattr(self._local, 'pending', []) + [publish]
+            transaction.on_commit(publish)
+        else:
+            self._publish()
+
+    def _publish(self):
+        self._cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+    def reset(self):
+        """
+        Forgets the loaded set (tests, or after restoring the database).
+        """
+        self._local.pending = []
+        with self._lock:
+            self._members, self._version = frozenset(), None
+
+
+membership = BlacklistMembership()
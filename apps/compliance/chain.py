@@ -0,0 +1,237 @@
+import hashlib
+import heapq
+import hmac
+import json
+import logging
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+GENESIS_HASH = '0' * 64
+DEFAULT_CHECKPOINT_INTERVAL = 10000
+
+
+def checkpoint_interval():
+    return getattr(settings, 'AUDIT_CHECKPOINT_INTERVAL', DEFAULT_CHECKPOINT_INTERVAL)
+
+
+def canonical_payload(entry):
+    """
+    Stable serialization of everything an audit record asserts.
+    """
+    created_at = entry.created_at.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return json.dumps({
+        'sequence': entry.sequence,
+        'actor_id': entry.actor_id,
+        'content_type_id': entry.content_type_id,
+        'object_id': str(entry.object_id),
+        'event_type': entry.event_type,
+        'description': entry.description,
+        'payload_before': entry.payload_before,
+        'payload_after': entry.payload_after,
+        'metadata': entry.metadata,
+        'created_at': created_at,
+    }, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def compute_hash(entry, prev_hash):
+    return hashlib.sha256((prev_hash + canonical_payload(entry)).encode('utf-8')).hexdigest()
+
+
+def sign_checkpoint(sequence, record_hash):
+    key = settings.SECRET_KEY.encode('utf-8')
+    return hmac.new(key, f"{sequence}:{record_hash}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def append(entries):
+    """
+    Inserts unsaved AuditLog instances as pending chain records and adds
+    them to the search index, inside the caller's transaction if there is
+    one. Sequence numbers and hashes are assigned by seal_pending once that
+    transaction commits, so logging an event never waits on the chain head.
+    """
+    if not entries:
+        return entries
+    from .models import AuditLog
+    for entry in entries:
+        entry.chain_pending = True
+    # Inside an existing transaction no extra savepoint is needed
+    with transaction.atomic(savepoint=not connection.in_atomic_block):
+        AuditLog.objects.bulk_create(entries, batch_size=500)
+        if getattr(settings, 'AUDIT_SEARCH_INDEX', True):
+            from .search import index_entries
+            index_entries(entries)
+        transaction.on_commit(_seal_after_commit)
+    return entries
+
+
+def _seal_after_commit():
+    try:
+        seal_pending()
+    except Exception:
+        # The records stay pending and are chained by the next run
+        logger.exception("Chaining pending audit records failed.")
+
+
+def seal_pending(batch_size=1000):
+    """
+    Assigns sequence numbers and chained hashes to committed pending
+    records, in id order, and records any checkpoints due. The chain head
+    row is locked for each batch, so concurrent chainers take turns.
+    Returns the number of records chained.
+    """
+    from .models import AuditLog, AuditChainHead, AuditCheckpoint
+    interval = checkpoint_interval()
+    chained = 0
+    while True:
+        with transaction.atomic():
+            head = AuditChainHead.objects.select_for_update().filter(pk=1).first()
+            if head is None:
+                head = AuditChainHead.objects.create(pk=1, last_sequence=0, last_hash=GENESIS_HASH)
+            entries = list(AuditLog.objects.filter(chain_pending=True).order_by('id')[:batch_size])
+            if not entries:
+                break
+
+            sequence, prev_hash = head.last_sequence, head.last_hash or GENESIS_HASH
+            checkpoints = []
+            for entry in entries:
+                sequence += 1
+                entry.sequence = sequence
+                entry.prev_hash = prev_hash
+                entry.record_hash = compute_hash(entry, prev_hash)
+                entry.chain_pending = False
+                prev_hash = entry.record_hash
+                if sequence % interval == 0:
+                    checkpoints.append(AuditCheckpoint(
+                        sequence=sequence,
+                        record_hash=prev_hash,
+                        signature=sign_checkpoint(sequence, prev_hash)
+                    ))
+
+            AuditLog.objects.bulk_update(
+                entries, ['sequence', 'prev_hash', 'record_hash', 'chain_pending'], batch_size=500
+            )
+            if checkpoints:
+                AuditCheckpoint.objects.bulk_create(checkpoints)
+            AuditChainHead.objects.filter(pk=1).update(last_sequence=sequence, last_hash=prev_hash)
+        chained += len(entries)
+        if len(entries) < batch_size:
+            break
+    return chained
+
+
+class ChainBroken(Exception):
+    def __init__(self, sequence, reason):
+        self.sequence = sequence
+        self.reason = reason
+        super().__init__(f"Audit chain broken at sequence {sequence}: {reason}")
+
+
+def _hot_records(start, last_sequence, chunk_size):
+    from .models import AuditLog
+    fields = [
+        'sequence', 'prev_hash', 'record_hash', 'actor_id', 'content_type_id', 'object_id',
+        'event_type', 'description', 'payload_before', 'payload_after', 'metadata', 'created_at',
+    ]
+    while True:
+        # Keyset pagination on the unique sequence index
+        chunk = list(
+            AuditLog.objects.filter(sequence__gte=start, sequence__lte=last_sequence)
+            .order_by('sequence').only(*fields)[:chunk_size]
+        )
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        start = chunk[-1].sequence + 1
+
+
+def verify(full=False, chunk_size=5000):
+    """
+    Re-hashes the chain from the last verified checkpoint (or from the
+    start with full=True, sealed records included) up to the chain head,
+    checking sequence continuity, hash links and checkpoint signatures,
+    and that the last record is the one the head points at. Checkpoints
+    passed on the way are marked verified.
+
+    Returns {'from_sequence', 'to_sequence', 'records', 'checkpoints'};
+    raises ChainBroken at the first inconsistency.
+    """
+    from django.utils import timezone
+    from .models import AuditLog, AuditChainHead, AuditCheckpoint, AuditSegment
+    from .tiering import AuditTieringService
+
+    # Records chained after this point are left for the next run
+    head = AuditChainHead.objects.filter(pk=1).first()
+    last_sequence = head.last_sequence if head is not None else 0
+    start = None if full else AuditCheckpoint.objects.filter(verified_at__isnull=False).order_by('-sequence').first()
+    if start is not None and not hmac.compare_digest(start.signature, sign_checkpoint(start.sequence, start.record_hash)):
+        raise ChainBroken(start.sequence, "checkpoint signature does not match")
+
+    records = _hot_records(start.sequence + 1 if start is not None else 1, last_sequence, chunk_size)
+    if start is not None:
+        expected_sequence, prev_hash = start.sequence + 1, start.record_hash
+    else:
+        first_hot = AuditLog.objects.filter(sequence__isnull=False).order_by('sequence').values_list(
+            'sequence', flat=True
+        ).first()
+        # Only rows covered by a verified checkpoint are sealed, so a run from
+        # a checkpoint never needs them
+        first_sealed = AuditSegment.objects.filter(min_sequence__isnull=False).order_by('min_sequence').values_list(
+            'min_sequence', flat=True
+        ).first()
+        if first_hot is None and first_sealed is None:
+            return {'from_sequence': None, 'to_sequence': None, 'records': 0, 'checkpoints': 0}
+        expected_sequence, prev_hash = min(s for s in (first_hot, first_sealed) if s is not None), None
+        if first_sealed is not None:
+            records = heapq.merge(records, AuditTieringService.sealed_chain(), key=lambda entry: entry.sequence)
+    from_sequence = expected_sequence
+
+    pending = {
+        cp.sequence: cp for cp in AuditCheckpoint.objects.filter(sequence__gte=expected_sequence)
+    }
+    count = checkpoints = 0
+    verified = []
+    try:
+        for entry in records:
+            if entry.sequence > last_sequence:
+                break
+            if entry.sequence != expected_sequence:
+                raise ChainBroken(expected_sequence, "record missing")
+            if prev_hash is not None and entry.prev_hash != prev_hash:
+                raise ChainBroken(entry.sequence, "previous hash does not match")
+            if compute_hash(entry, entry.prev_hash) != entry.record_hash:
+                raise ChainBroken(entry.sequence, "record hash does not match its contents")
+
+            checkpoint = pending.get(entry.sequence)
+            if checkpoint is not None:
+                if checkpoint.record_hash != entry.record_hash or not hmac.compare_digest(
+                        checkpoint.signature, sign_checkpoint(checkpoint.sequence, checkpoint.record_hash)):
+                    raise ChainBroken(entry.sequence, "checkpoint does not match the chain")
+                verified.append(checkpoint.pk)
+                if len(verified) >= chunk_size:
+                    AuditCheckpoint.objects.filter(pk__in=verified).update(verified_at=timezone.now())
+                    checkpoints += len(verified)
+                    verified = []
+
+            prev_hash = entry.record_hash
+            expected_sequence += 1
+            count += 1
+    except (OSError, EOFError) as e:
+        raise ChainBroken(expected_sequence, f"sealed segment unreadable ({e})")
+    if verified:
+        AuditCheckpoint.objects.filter(pk__in=verified).update(verified_at=timezone.now())
+        checkpoints += len(verified)
+
+    if expected_sequence - 1 != last_sequence:
+        raise ChainBroken(expected_sequence, "record missing")
+    if prev_hash is not None and prev_hash != head.last_hash:
+        raise ChainBroken(last_sequence, "last record does not match the chain head")
+
+    return {
+        'from_sequence': from_sequence,
+        'to_sequence': expected_sequence - 1,
+        'records': count,
+        'checkpoints': checkpoints,
+    }
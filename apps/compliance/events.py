@@ -13,6 +13,8 @@ class AuditEventType(models.TextChoices):
     PAYMENT_FAILED = 'PAYMENT.FAILED', 'Payment Failed'
     PAYMENT_ALLOCATED = 'PAYMENT.ALLOCATED', 'Payment Allocated'
     ALLOCATION_FAILED = 'PAYMENT.ALLOCATION_FAILED', 'Allocation Failed'
+    PAYMENT_REVERSED = 'PAYMENT.REVERSED', 'Payment Reversed'
+    PAYMENT_BULK_IMPORTED = 'PAYMENT.BULK_IMPORTED', 'Payments Bulk Imported'
     
     # Admin Events
     ADMIN_MANUAL_ALLOCATION = 'ADMIN.MANUAL_ALLOCATION', 'Manual Allocation Triggered'
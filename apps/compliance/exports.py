@@ -0,0 +1,32 @@
+import os
+from django.apps import apps
+from django.conf import settings
+from core.columnar import ParquetExporter, CHUNK_SIZE
+
+# name: (model label, month partition field)
+DATASETS = {
+    'loans': ('loans.Loan', 'disbursement_date'),
+    'installments': ('loans.LoanInstallment', 'due_date'),
+    'payments': ('payments.Payment', 'created_at'),
+    'allocations': ('payments.RepaymentAllocation', 'created_at'),
+}
+
+
+def export_root():
+    return getattr(settings, 'ANALYTICS_EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports', 'parquet'))
+
+
+def export_datasets(names=None, start_month=None, end_month=None, root=None, chunk_size=CHUNK_SIZE):
+    """
+    Exports portfolio tables to month-partitioned Parquet for analytics.
+    Returns {dataset: {month: rows}}.
+    """
+    results = {}
+    for name in names or DATASETS:
+        label, partition_field = DATASETS[name]
+        exporter = ParquetExporter(
+            name, apps.get_model(label).objects.all(), partition_field,
+            root or export_root(), chunk_size=chunk_size
+        )
+        results[name] = exporter.export(start_month, end_month)
+    return results
@@ -0,0 +1,120 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from loans.models import Loan, LoanInstallment
+from .blacklist_cache import membership
+
+# Attribute used to memoize the features on the borrower instance
+CACHE_ATTR = '_risk_features'
+
+
+class BorrowerRiskFeatures:
+    """
+    Snapshot of every input the risk rules need for one borrower.
+    """
+    def __init__(self, user_id, is_blacklisted, active_loans, exposure, late_installments, as_of):
+        self.user_id = user_id
+        self.is_blacklisted = is_blacklisted
+        self.active_loans = active_loans
+        self.exposure = exposure
+        self.late_installments = late_installments
+        self.as_of = as_of
+
+    def as_dict(self):
+        return {
+            'is_blacklisted': self.is_blacklisted,
+            'active_loans': self.active_loans,
+            'exposure': str(self.exposure),
+            'late_installments': self.late_installments,
+        }
+
+
+def _aggregate(queryset, group_by, expression, output_field):
+    """
+    Correlated subquery returning a single aggregate per borrower.
+    """
+    return Subquery(
+        queryset.order_by().values(group_by).annotate(value=expression).values('value')[:1],
+        output_field=output_field
+    )
+
+
+def _feature_rows(user_ids, today, late_threshold_days):
+    """
+    One query returning the raw feature columns for every user in `user_ids`.
+    """
+    active_loans = Loan.objects.filter(borrower=OuterRef('pk'), status=Loan.Status.ACTIVE)
+    late_installments = LoanInstallment.objects.filter(
+        loan__borrower=OuterRef('pk'),
+        status=LoanInstallment.Status.OVERDUE,
+        due_date__lt=today - timezone.timedelta(days=late_threshold_days)
+    )
+
+    return get_user_model().objects.filter(pk__in=user_ids).annotate(
+        active_loan_count=Coalesce(_aggregate(active_loans, 'borrower', Count('pk'), IntegerField()), 0),
+        active_exposure=Coalesce(
+            _aggregate(active_loans, 'borrower', Sum('principal'), DecimalField(max_digits=12, decimal_places=2)),
+            Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+        late_installment_count=Coalesce(_aggregate(late_installments, 'loan__borrower', Count('pk'), IntegerField()), 0),
+    ).values('pk', 'is_blacklisted', 'active_loan_count', 'active_exposure', 'late_installment_count')
+
+
+def load_risk_features_bulk(user_ids, late_threshold_days):
+    """
+    Returns {user_id: BorrowerRiskFeatures} for many borrowers in one query.
+    """
+    today = timezone.now().date()
+    return {
+        row['pk']: BorrowerRiskFeatures(
+            user_id=row['pk'],
+            is_blacklisted=row['is_blacklisted'] or membership.contains(row['pk']),
+            active_loans=row['active_loan_count'],
+            exposure=Decimal(str(row['active_exposure'])),
+            late_installments=row['late_installment_count'],
+            as_of=today,
+        )
+        for row in _feature_rows(set(user_ids), today, late_threshold_days)
+    }
+
+
+def load_risk_features(user, late_threshold_days, refresh=False):
+    """
+    Fetches the borrower's blacklist status, active loan count, active
+    principal and severely overdue installment count in a single query.
+
+    The result is memoized on the user instance, so evaluating several
+    applications (or the same one twice) for the same borrower object in
+    a request only hits the database once. Pass refresh=True to reload.
+    """
+    cached = getattr(user, CACHE_ATTR, None)
+    if cached is not None and not refresh and cached.as_of == timezone.now().date():
+        return cached
+
+    features = load_risk_features_bulk([user.pk], late_threshold_days)[user.pk]
+    # The in-memory flag wins if it was set but not yet saved
+    features.is_blacklisted = features.is_blacklisted or user.is_blacklisted
+    setattr(user, CACHE_ATTR, features)
+    return features
+
+
+def prime_risk_features(users, late_threshold_days):
+    """
+    Loads features for many user instances with one query and memoizes
+    them on each, so later load_risk_features() calls are free.
+    """
+    users = list(users)
+    features = load_risk_features_bulk([user.pk for user in users], late_threshold_days)
+    for user in users:
+        user_features = features[user.pk]
+        user_features.is_blacklisted = user_features.is_blacklisted or user.is_blacklisted
+        setattr(user, CACHE_ATTR, user_features)
+
+
+def clear_risk_features(user):
+    """
+    Drops the memoized features, e.g. after a loan is created for the user.
+    """
+    user.__dict__.pop(CACHE_ATTR, None)
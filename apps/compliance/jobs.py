@@ -0,0 +1,166 @@
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from core.workers import get_pool
+from .models import ReportJob
+from . import reports
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+# Progress is written to the job row every N rows
+PROGRESS_EVERY = 5000
+# Active jobs without a heartbeat for this long are treated as dead
+STALE_AFTER = timedelta(minutes=15)
+# Queued jobs older than this are picked up by `run_report_jobs`; the pool
+# they were handed to may have gone with a restarted process
+QUEUED_GRACE = timedelta(minutes=1)
+# Attempts at inserting a job when an identical one finishes concurrently
+SUBMIT_ATTEMPTS = 3
+
+
+def request_key(report, params):
+    payload = json.dumps({'report': report, 'params': params}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ReportJobService:
+    """
+    Runs CSV report exports on a local worker pool, off the request cycle.
+    Output goes to REPORT_OUTPUT_ROOT; progress and the resulting file are
+    recorded on the ReportJob row.
+    """
+
+    @staticmethod
+    def output_root():
+        return getattr(settings, 'REPORT_OUTPUT_ROOT', os.path.join(settings.BASE_DIR, 'media', 'reports'))
+
+    @classmethod
+    def output_path(cls, job):
+        return os.path.join(cls.output_root(), job.file_name)
+
+    @staticmethod
+    def pool():
+        return get_pool('report-jobs', getattr(settings, 'REPORT_JOB_WORKERS', DEFAULT_WORKERS))
+
+    @classmethod
+    def submit(cls, report, params, user=None):
+        """
+        Queues an export and returns (job, created). While an identical
+        request (same report and params) is queued or running, its job is
+        returned instead of starting another.
+        """
+        key = request_key(report, params)
+        active = ReportJob.objects.filter(request_key=key, status__in=ReportJob.ACTIVE_STATUSES)
+        active.filter(heartbeat_at__lt=timezone.now() - STALE_AFTER).update(
+            status=ReportJob.Status.FAILED, error="Worker stopped responding.", finished_at=timezone.now()
+        )
+
+        for attempt in range(SUBMIT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    job = ReportJob.objects.create(report=report, params=params, request_key=key, requested_by=user)
+                break
+            except IntegrityError:
+                # Lost the race to an identical request: the constraint allows one active job per key
+                existing = active.first()
+                if existing is not None:
+                    return existing, False
+                # ...which finished before we could read it, so try again
+                if attempt == SUBMIT_ATTEMPTS - 1:
+                    raise
+
+        transaction.on_commit(lambda: cls.pool().submit(cls.run, job.pk))
+        return job, True
+
+    @classmethod
+    def run_queued(cls, now=None, run=None):
+        """
+        Fails running jobs whose worker died and submits every job queued
+        for longer than QUEUED_GRACE (to `run` instead of the pool, if
+        given). A job submitted twice only runs once. Returns the submitted ids.
+        """
+        now = now or timezone.now()
+        ReportJob.objects.filter(status=ReportJob.Status.RUNNING, heartbeat_at__lt=now - STALE_AFTER).update(
+            status=ReportJob.Status.FAILED, error="Worker stopped responding.", finished_at=now
+        )
+        queued = list(
+            ReportJob.objects.filter(status=ReportJob.Status.QUEUED, created_at__lt=now - QUEUED_GRACE)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        for job_id in queued:
+            if run is not None:
+                run(job_id)
+            else:
+                cls.pool().submit(cls.run, job_id)
+        return queued
+
+    @classmethod
+    def run(cls, job_id):
+        """
+        Executes a queued job. Called on a worker thread.
+        """
+        claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.Status.QUEUED).update(
+            status=ReportJob.Status.RUNNING, started_at=timezone.now(), heartbeat_at=timezone.now()
+        )
+        if not claimed:
+            return
+        job = ReportJob.objects.get(pk=job_id)
+        try:
+            cls._export(job)
+        except Exception as e:
+            logger.exception(f"Report job {job_id} failed.")
+            ReportJob.objects.filter(pk=job_id).update(
+                status=ReportJob.Status.FAILED, error=str(e), finished_at=timezone.now()
+            )
+
+    @classmethod
+    def _export(cls, job):
+        from .snapshots import ReportSnapshotService
+
+        as_of = job.params.get('as_of')
+        snapshot_rows = None
+        if as_of:
+            snapshot = ReportSnapshotService.get(job.report, as_of)
+            if snapshot is None:
+                raise ValueError(f"No {job.report} snapshot as of {as_of}.")
+            snapshot_rows = snapshot.data['rows']
+        today = timezone.now().date()
+
+        total = reports.export_count(job.report, snapshot_rows, today=today)
+        ReportJob.objects.filter(pk=job.pk).update(total_rows=total, heartbeat_at=timezone.now())
+
+        compress = job.params.get('compress') == 'gzip'
+        job.file_name = f"{job.pk}-{job.report}.csv" + ('.gz' if compress else '')
+        path = cls.output_path(job)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = path + '.part'
+
+        opener = gzip.open if compress else open
+        written = 0
+        with opener(partial, 'wt', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(reports.EXPORT_HEADERS[job.report])
+            for row in reports.export_rows(job.report, snapshot_rows, today=today):
+                writer.writerow(row)
+                written += 1
+                if written % PROGRESS_EVERY == 0:
+                    ReportJob.objects.filter(pk=job.pk).update(rows_written=written, heartbeat_at=timezone.now())
+        # Readers only ever see a complete file
+        os.replace(partial, path)
+
+        ReportJob.objects.filter(pk=job.pk).update(
+            status=ReportJob.Status.DONE,
+            rows_written=written,
+            file_name=job.file_name,
+            file_size=os.path.getsize(path),
+            finished_at=timezone.now(),
+            heartbeat_at=timezone.now(),
+        )
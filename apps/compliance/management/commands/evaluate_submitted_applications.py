@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from compliance.risk_engine import RiskEngineService
+
+
+class Command(BaseCommand):
+    help = "Run the risk engine over every SUBMITTED application and print the ranked worklist."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--failures-only', action='store_true', help="Only list applications that failed a rule.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        worklist = RiskEngineService.evaluate_batch(chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+
+        passed = 0
+        for item in worklist:
+            passed += item['is_passed']
+            if options['failures_only'] and item['is_passed']:
+                continue
+            outcome = 'PASS' if item['is_passed'] else item['failed_rule_code']
+            self.stdout.write(
+                f"{item['rank']:>5}  app {item['application_id']}  borrower {item['borrower_id']}  "
+                f"{item['amount']}  {outcome}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Evaluated {len(worklist)} applications in {elapsed:.2f}s: "
+            f"{passed} passed, {len(worklist) - passed} failed."
+        ))
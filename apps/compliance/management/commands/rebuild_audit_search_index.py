@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from compliance.models import AuditLog
+from compliance.search import index_entries
+
+
+class Command(BaseCommand):
+    help = "Index audit records into the search index (e.g. records written before it existed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-id', type=int, default=0, help="Resume after this audit log id.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        last_id = options['from_id']
+        indexed = 0
+        fields = ['id', 'description', 'payload_before', 'payload_after', 'metadata']
+        while True:
+            batch = list(
+                AuditLog.objects.filter(pk__gt=last_id).order_by('pk').only(*fields)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            index_entries(batch)
+            indexed += len(batch)
+            last_id = batch[-1].pk
+            self.stdout.write(f"Indexed up to id {last_id}")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} audit records."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from compliance.jobs import ReportJobService
+from compliance.models import ReportJob
+
+
+class Command(BaseCommand):
+    help = "Run report exports left queued by a restarted worker process (run every few minutes)."
+
+    def handle(self, *args, **options):
+        ran = ReportJobService.run_queued(run=ReportJobService.run)
+        failed = ReportJob.objects.filter(pk__in=ran, status=ReportJob.Status.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f"Ran {len(ran)} queued report jobs ({failed} failed)."))
@@ -0,0 +1,49 @@
+import csv
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from compliance.screening import REVIEW_THRESHOLD, ScreeningService, WatchlistIndex
+
+
+class Command(BaseCommand):
+    help = "Screen all KYC profiles against a watchlist CSV and blacklist confirmed matches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Watchlist CSV (columns: name[, id_number, date_of_birth, reference]).")
+        parser.add_argument('--source', required=True, help="Watchlist name recorded on each Blacklist entry.")
+        parser.add_argument('--actor', default=None, help="Username recorded as the compliance officer.")
+        parser.add_argument('--review-threshold', type=float, default=REVIEW_THRESHOLD,
+                            help="Report name matches at least this similar (0-1).")
+        parser.add_argument('--report', default=None, help="Write every match, confirmed or not, to this CSV.")
+        parser.add_argument('--dry-run', action='store_true', help="Report matches without blacklisting.")
+
+    def handle(self, *args, **options):
+        actor = None
+        if options['actor']:
+            actor = get_user_model().objects.filter(username=options['actor']).first()
+            if actor is None:
+                raise CommandError(f"Unknown user '{options['actor']}'.")
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as handle:
+                index = WatchlistIndex.from_csv(handle)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Indexed {len(index)} watchlist entries.")
+
+        matches = list(ScreeningService.screen(index, threshold=options['review_threshold']))
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['User ID', 'Full Name', 'Watchlist Name', 'Reference', 'Matched On', 'Score', 'Confirmed'])
+                for match in matches:
+                    writer.writerow([
+                        match.user_id, match.full_name, match.entry.name, match.entry.reference,
+                        match.reason, f"{match.score:.3f}", match.confirmed
+                    ])
+
+        confirmed = sum(1 for match in matches if match.confirmed)
+        self.stdout.write(f"{len(matches)} matches, {confirmed} confirmed, {len(matches) - confirmed} for review.")
+        if options['dry_run']:
+            return
+        created = ScreeningService.blacklist_matches(matches, options['source'], actor=actor)
+        self.stdout.write(self.style.SUCCESS(f"Blacklisted {len(created)} users."))
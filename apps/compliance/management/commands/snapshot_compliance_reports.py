@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from compliance.models import ReportSnapshot
+from compliance.snapshots import ReportSnapshotService, SnapshotFrozen
+
+
+class Command(BaseCommand):
+    help = "Compute and store compliance report snapshots (run at month end, or nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', choices=ReportSnapshot.Report.values, action='append',
+                            help="Report to snapshot; repeatable. Defaults to all reports.")
+        parser.add_argument('--as-of', default=None, help="Snapshot date (YYYY-MM-DD). Only today can be built; defaults to today.")
+        parser.add_argument('--full', action='store_true',
+                            help="Recompute from the base tables instead of the previous snapshot.")
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['as_of']:
+            as_of = parse_date(options['as_of'])
+            if as_of is None:
+                raise CommandError("--as-of must be YYYY-MM-DD.")
+
+        for report in options['report'] or ReportSnapshot.Report.values:
+            try:
+                snapshot = ReportSnapshotService.build(report, as_of, full=options['full'])
+            except SnapshotFrozen as e:
+                raise CommandError(str(e))
+            mode = "incrementally" if snapshot.is_incremental else "in full"
+            self.stdout.write(self.style.SUCCESS(f"{snapshot}: {snapshot.rows} rows, computed {mode}."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from compliance.tiering import AuditTieringService, SEGMENT_SIZE
+
+
+class Command(BaseCommand):
+    help = "Seal old, chain-verified audit records into cold-storage segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help="Override AUDIT_HOT_RETENTION_DAYS.")
+        parser.add_argument('--segment-size', type=int, default=SEGMENT_SIZE)
+        parser.add_argument('--verify', action='store_true',
+                            help="Only check sealed segments against their checksums.")
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            broken = AuditTieringService.verify_segments()
+            if broken:
+                raise CommandError("Checksum mismatch: " + ", ".join(str(segment) for segment in broken))
+            self.stdout.write(self.style.SUCCESS("All sealed audit segments match their checksums."))
+            return
+
+        sealed = AuditTieringService.seal(options['older_than_days'], options['segment_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sealed {sealed} audit records."))
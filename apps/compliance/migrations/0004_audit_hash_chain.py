@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:52
+
+from django.db import migrations, models
+
+
+def create_chain_head(apps, schema_editor):
+    AuditChainHead = apps.get_model('compliance', 'AuditChainHead')
+    AuditChainHead.objects.get_or_create(pk=1, defaults={'last_sequence': 0, 'last_hash': '0' * 64})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compliance', '0003_auditlog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditChainHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sequence', models.BigIntegerField(default=0)),
+                ('last_hash', models.CharField(blank=True, max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AuditCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.BigIntegerField(unique=True)),
+                ('record_hash', models.CharField(max_length=64)),
+                ('signature', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-sequence'],
+            },
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='prev_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='record_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='sequence',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.RunPython(create_chain_head, migrations.RunPython.noop),
+    ]
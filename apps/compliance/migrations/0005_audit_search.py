@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compliance', '0004_audit_hash_chain'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='auditlog',
+            name='compliance__content_30560d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['content_type', 'object_id', 'created_at', 'id'], name='audit_target_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['actor', 'created_at', 'id'], name='audit_actor_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['event_type', 'created_at', 'id'], name='audit_event_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at', 'id'], name='audit_time_idx'),
+        ),
+        migrations.AddField(
+            model_name='auditsearchtoken',
+            name='log',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='compliance.auditlog'),
+        ),
+        migrations.AddIndex(
+            model_name='auditsearchtoken',
+            index=models.Index(fields=['log'], name='audit_token_log_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='auditsearchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'log'), name='audit_token_log_unique'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compliance', '0005_audit_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition', models.CharField(max_length=20)),
+                ('name', models.CharField(max_length=100)),
+                ('rows', models.PositiveIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('min_time', models.DateTimeField()),
+                ('max_time', models.DateTimeField()),
+                ('min_sequence', models.BigIntegerField(blank=True, null=True)),
+                ('max_sequence', models.BigIntegerField(blank=True, null=True)),
+                ('sealed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-max_time'],
+                'indexes': [models.Index(fields=['max_time', 'min_time'], name='audit_segment_time_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='auditsegment',
+            constraint=models.UniqueConstraint(fields=('partition', 'name'), name='audit_segment_unique'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compliance', '0006_auditsegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(choices=[('exposure', 'User Exposure'), ('default_metrics', 'Default Metrics'), ('late_payments', 'Late Payments')], max_length=30)),
+                ('as_of', models.DateField()),
+                ('data', models.JSONField()),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('watermark', models.DateTimeField()),
+                ('is_incremental', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-as_of'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reportsnapshot',
+            constraint=models.UniqueConstraint(fields=('report', 'as_of'), name='report_snapshot_unique'),
+        ),
+    ]
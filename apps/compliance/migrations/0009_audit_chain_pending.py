@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compliance', '0008_reportjob_reportjob_report_job_active_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='chain_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(condition=models.Q(('chain_pending', True)), fields=['id'], name='audit_chain_pending_idx'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 class AuditLog(models.Model):
     """
@@ -29,12 +30,26 @@ class AuditLog(models.Model):
     
     metadata = models.JSONField(default=dict, blank=True)  # IP, user agent, etc.
     
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Set when the event is logged, not when a buffered batch is flushed
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
+    # Hash chain (see compliance.chain); null on rows written before chaining
+    sequence = models.BigIntegerField(unique=True, null=True, editable=False)
+    prev_hash = models.CharField(max_length=64, blank=True, editable=False)
+    record_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # Committed but not yet given a sequence number and hash
+    chain_pending = models.BooleanField(default=False, editable=False)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['content_type', 'object_id']),
+            # Composite indexes behind the audit search API (newest first, keyset on id);
+            # the target index also serves plain (content_type, object_id) lookups
+            models.Index(fields=['content_type', 'object_id', 'created_at', 'id'], name='audit_target_time_idx'),
+            models.Index(fields=['actor', 'created_at', 'id'], name='audit_actor_time_idx'),
+            models.Index(fields=['event_type', 'created_at', 'id'], name='audit_event_time_idx'),
+            models.Index(fields=['created_at', 'id'], name='audit_time_idx'),
+            models.Index(fields=['id'], condition=models.Q(chain_pending=True), name='audit_chain_pending_idx'),
         ]
 
     def __str__(self):
@@ -43,11 +58,137 @@ class AuditLog(models.Model):
     def save(self, *args, **kwargs):
         if self.pk:
             raise ValidationError("Audit records are immutable and cannot be updated.")
-        super().save(*args, **kwargs)
+        # New records always enter through the chain
+        from .chain import append
+        append([self])
 
     def delete(self, *args, **kwargs):
         raise ValidationError("Audit records are immutable and cannot be deleted.")
 
+class AuditSearchToken(models.Model):
+    """
+    Inverted index for free-text audit search: one row per distinct token
+    of a record's description and payloads (see compliance.search).
+    """
+    token = models.CharField(max_length=64)
+    log = models.ForeignKey(AuditLog, on_delete=models.CASCADE, related_name='search_tokens', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'log'], name='audit_token_log_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['log'], name='audit_token_log_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.log_id}"
+
+class AuditSegment(models.Model):
+    """
+    Manifest of sealed audit segments in cold storage (see compliance.tiering).
+    The time and sequence ranges let reads skip segments that cannot match.
+    """
+    partition = models.CharField(max_length=20)
+    name = models.CharField(max_length=100)
+    rows = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    min_time = models.DateTimeField()
+    max_time = models.DateTimeField()
+    min_sequence = models.BigIntegerField(null=True, blank=True)
+    max_sequence = models.BigIntegerField(null=True, blank=True)
+    sealed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-max_time']
+        constraints = [
+            models.UniqueConstraint(fields=['partition', 'name'], name='audit_segment_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['max_time', 'min_time'], name='audit_segment_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.partition}/{self.name} ({self.rows} rows)"
+
+class ReportSnapshot(models.Model):
+    """
+    A compliance report computed as of a date (see compliance.snapshots).
+    `watermark` is when the computation started, less a safety margin for
+    transactions still open then; the next snapshot only re-reads loans
+    and installments changed after it.
+    """
+    class Report(models.TextChoices):
+        EXPOSURE = 'exposure', 'User Exposure'
+        DEFAULT_METRICS = 'default_metrics', 'Default Metrics'
+        LATE_PAYMENTS = 'late_payments', 'Late Payments'
+
+    report = models.CharField(max_length=30, choices=Report.choices)
+    as_of = models.DateField()
+    data = models.JSONField()
+    rows = models.PositiveIntegerField(default=0)
+    watermark = models.DateTimeField()
+    is_incremental = models.BooleanField(default=False)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-as_of']
+        constraints = [
+            models.UniqueConstraint(fields=['report', 'as_of'], name='report_snapshot_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_report_display()} as of {self.as_of}"
+
+class AuditChainHead(models.Model):
+    """
+    Single row holding the tip of the audit hash chain. The chainer
+    (compliance.chain.seal_pending) locks it while assigning sequence
+    numbers; the transactions that log events never touch it.
+    """
+    last_sequence = models.BigIntegerField(default=0)
+    last_hash = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Audit chain head at {self.last_sequence}"
+
+class AuditCheckpoint(models.Model):
+    """
+    Signed snapshot of the chain every AUDIT_CHECKPOINT_INTERVAL records.
+    Verification resumes from the last checkpoint marked verified.
+    """
+    sequence = models.BigIntegerField(unique=True)
+    record_hash = models.CharField(max_length=64)
+    signature = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    verified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-sequence']
+
+    def __str__(self):
+        return f"Audit checkpoint at {self.sequence}"
+
+class BlacklistQuerySet(models.QuerySet):
+    """
+    Bulk writes send no post_save signal, so they publish the membership
+    change themselves (see compliance.signals for single-row writes).
+    """
+    def update(self, **kwargs):
+        from .blacklist_cache import membership
+        updated = super().update(**kwargs)
+        if updated:
+            membership.invalidate()
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .blacklist_cache import membership
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            membership.invalidate()
+        return created
+
 class Blacklist(models.Model):
     """
     Formal record of blacklisted users with reasons and timestamps.
@@ -72,6 +213,8 @@ class Blacklist(models.Model):
         related_name='created_blacklists'
     )
 
+    objects = BlacklistQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Blacklist"
         ordering = ['-created_at']
@@ -82,3 +225,54 @@ class Blacklist(models.Model):
     def __str__(self):
         status = "ACTIVE" if self.is_active else "REVOKED"
         return f"Blacklist for {self.user.username} ({status})"
+
+class ReportJob(models.Model):
+    """
+    A report export run by the background worker pool (see compliance.jobs).
+    Identical requests share a job while it is queued or running.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    ACTIVE_STATUSES = [Status.QUEUED, Status.RUNNING]
+
+    report = models.CharField(max_length=30)
+    params = models.JSONField(default=dict)
+    request_key = models.CharField(max_length=64, help_text="SHA-256 of report and params")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs'
+    )
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(default=0)
+    file_name = models.CharField(max_length=255, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Bumped with every progress update; a stale heartbeat means the worker died
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['request_key'], condition=models.Q(status__in=['QUEUED', 'RUNNING']),
+                name='report_job_active_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Report job {self.pk} ({self.report}, {self.status})"
+
+    @property
+    def progress(self):
+        if self.status == self.Status.DONE:
+            return 100.0
+        if not self.total_rows:
+            return 0.0
+        return round(self.rows_written * 100 / self.total_rows, 1)
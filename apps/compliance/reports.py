@@ -0,0 +1,159 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db.models import (
+    Count, DateField, DecimalField, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
+from loans.models import Loan, LoanInstallment
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+CENTS = Decimal('0.01')
+
+# (label, min days overdue, max days overdue or None)
+AGING_BUCKETS = [
+    ('1-30', 1, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+]
+
+
+def amount_overdue_expression():
+    """
+    Unpaid penalty, interest and principal of an installment.
+    """
+    return ExpressionWrapper(
+        (F('penalty_expected') + F('interest_expected') + F('principal_expected'))
+        - (F('penalty_paid') + F('interest_paid') + F('principal_paid')),
+        output_field=MONEY
+    )
+
+
+def late_installments(today):
+    """
+    Overdue installments past their due date, oldest first, with days and
+    amount overdue computed by the database.
+    """
+    return LoanInstallment.objects.filter(
+        status=LoanInstallment.Status.OVERDUE,
+        due_date__lt=today
+    ).annotate(
+        overdue_for=ExpressionWrapper(Value(today, output_field=DateField()) - F('due_date'), output_field=DurationField()),
+        amount_overdue=amount_overdue_expression(),
+    ).order_by('due_date', 'id').values(
+        'id', 'loan_id', 'due_date', 'overdue_for', 'amount_overdue',
+        borrower_username=F('loan__borrower__username'),
+    )
+
+
+def late_payment_row(row):
+    """
+    Flattens a late_installments() row for the serializer / CSV writer.
+    """
+    return {
+        'installment_id': row['id'],
+        'loan_id': row['loan_id'],
+        'borrower_username': row['borrower_username'],
+        'due_date': row['due_date'],
+        'days_overdue': row['overdue_for'].days,
+        'amount_overdue': Decimal(row['amount_overdue']).quantize(CENTS),
+    }
+
+
+def aging_buckets(today):
+    """
+    Count and amount overdue per aging bucket, in one aggregate query.
+    """
+    aggregates = {}
+    for label, low, high in AGING_BUCKETS:
+        condition = Q(due_date__lte=today - timedelta(days=low))
+        if high is not None:
+            condition &= Q(due_date__gte=today - timedelta(days=high))
+        key = label.replace('-', '_').replace('+', '_plus')
+        aggregates[f'count_{key}'] = Count('id', filter=condition)
+        aggregates[f'amount_{key}'] = Coalesce(
+            Sum(amount_overdue_expression(), filter=condition), Decimal('0'), output_field=MONEY
+        )
+
+    totals = LoanInstallment.objects.filter(
+        status=LoanInstallment.Status.OVERDUE,
+        due_date__lt=today
+    ).aggregate(**aggregates)
+
+    buckets = []
+    for label, _, _ in AGING_BUCKETS:
+        key = label.replace('-', '_').replace('+', '_plus')
+        buckets.append({'bucket': label, 'count': totals[f'count_{key}'], 'amount_overdue': totals[f'amount_{key}']})
+    return buckets
+
+
+def borrower_exposure():
+    """
+    Outstanding principal (principal minus principal repaid) of each
+    borrower's active loans, largest first. One row per borrower with at
+    least one active loan, computed entirely in the database.
+    """
+    principal = Subquery(
+        Loan.objects.filter(borrower=OuterRef('pk'), status=Loan.Status.ACTIVE)
+        .order_by().values('borrower').annotate(total=Sum('principal')).values('total')[:1],
+        output_field=MONEY
+    )
+    repaid = Subquery(
+        LoanInstallment.objects.filter(loan__borrower=OuterRef('pk'), loan__status=Loan.Status.ACTIVE)
+        .order_by().values('loan__borrower').annotate(total=Sum('principal_paid')).values('total')[:1],
+        output_field=MONEY
+    )
+    return get_user_model().objects.annotate(
+        active_principal=principal
+    ).filter(
+        active_principal__isnull=False
+    ).annotate(
+        total_exposure=ExpressionWrapper(
+            F('active_principal') - Coalesce(repaid, Decimal('0'), output_field=MONEY), output_field=MONEY
+        )
+    ).order_by('-total_exposure', 'pk').values('username', 'total_exposure', borrower=F('pk'))
+
+
+
+EXPORT_HEADERS = {
+    'exposure': ['Borrower ID', 'Username', 'Total Exposure'],
+    'late_payments': ['Installment ID', 'Loan ID', 'Borrower', 'Due Date', 'Days Overdue', 'Amount Overdue'],
+}
+
+
+def _export_queryset(report, today):
+    if report == 'exposure':
+        return borrower_exposure()
+    if report == 'late_payments':
+        return late_installments(today)
+    raise ValueError(f"No CSV export for report '{report}'.")
+
+
+def export_count(report, snapshot_rows=None, today=None):
+    """
+    Number of rows export_rows() will yield.
+    """
+    if snapshot_rows is not None:
+        return len(snapshot_rows)
+    return _export_queryset(report, today).count()
+
+
+def export_rows(report, snapshot_rows=None, today=None):
+    """
+    CSV rows (matching EXPORT_HEADERS) for `report`, read from a snapshot's
+    rows when given, otherwise streamed from the database in chunks.
+    """
+    if snapshot_rows is None:
+        snapshot_rows = _export_queryset(report, today).iterator(chunk_size=2000)
+        if report == 'late_payments':
+            snapshot_rows = map(late_payment_row, snapshot_rows)
+
+    if report == 'exposure':
+        return (
+            [d['borrower'], d['username'], Decimal(d['total_exposure']).quantize(CENTS)] for d in snapshot_rows
+        )
+    return (
+        [r['installment_id'], r['loan_id'], r['borrower_username'], r['due_date'], r['days_overdue'], r['amount_overdue']]
+        for r in snapshot_rows
+    )
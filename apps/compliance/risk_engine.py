@@ -1,7 +1,6 @@
 from decimal import Decimal
-from django.db.models import Sum
-from loans.models import Loan, LoanInstallment
-from django.utils import timezone
+from .features import load_risk_features, load_risk_features_bulk
+from .rules import build_context, get_rule_set
 from .services import AuditService
 from .events import AuditEventType
 
@@ -13,73 +12,126 @@ class RiskResult:
         self.metadata = metadata or {}
 
 class RiskEngineService:
-    # Configurable Thresholds
+    # Thresholds of the default rule set, used by products whose
+    # eligibility_criteria define no rules of their own
     MAX_ACTIVE_LOANS = 2
     MAX_EXPOSURE = Decimal('5000.00')
     LATE_PAYMENT_THRESHOLD_DAYS = 30
     LATE_PAYMENT_COUNT_THRESHOLD = 0  # No late payments allowed exceeding threshold days
 
+    # Order in which failed applications are listed in the batch worklist;
+    # codes from product-specific rules sort after these
+    RULE_CODES = ['USER_BLACKLISTED', 'MAX_ACTIVE_LOANS_EXCEEDED', 'EXPOSURE_LIMIT_REACHED', 'POOR_REPAYMENT_HISTORY']
+
+    @classmethod
+    def evaluate(cls, application, actor=None, features=None):
+        """
+        Evaluate a loan application against its product's eligibility rules.
+        All rule inputs come from one BorrowerRiskFeatures snapshot.
+        """
+        if features is None:
+            features = load_risk_features(application.borrower, cls.LATE_PAYMENT_THRESHOLD_DAYS)
+        is_passed, failed_rule_code, message, results, timings = cls._check(application, features)
+        return cls._finalize_evaluation(is_passed, failed_rule_code, message, application, actor, results, timings)
+
     @classmethod
-    def evaluate(cls, application, actor=None):
+    def _check(cls, application, features):
         """
-        Evaluate a loan application against compliance and risk rules.
+        Runs the product's compiled rules (see compliance.rules) and stops at
+        the first failure.
+        Returns (is_passed, failed_rule_code, message, rule_results, timings_us).
         """
-        user = application.borrower
-        results = {}
+        rule_set = get_rule_set(application.product, cls)
+        return rule_set.evaluate(build_context(application, features))
+
+    @classmethod
+    def evaluate_batch(cls, applications=None, actor=None, chunk_size=500):
+        """
+        Evaluates many applications (default: every SUBMITTED one) in one pass.
+
+        Features are loaded with one query per chunk of borrowers and the
+        audit records are bulk-inserted. Returns a worklist: passed
+        applications first (oldest first), then failures grouped by rule.
+        """
+        from loan_applications.models import LoanApplication
+        if applications is None:
+            applications = LoanApplication.objects.filter(status=LoanApplication.Status.SUBMITTED)
+        applications = applications.order_by('created_at', 'id').select_related('product').only(
+            'id', 'borrower_id', 'amount', 'term', 'created_at', 'statement_features',
+            'product__id', 'product__updated_at', 'product__eligibility_criteria'
+        )
 
-        # R01: Global Blacklist
-        from .services import BlacklistService
-        if user.is_blacklisted or BlacklistService.is_blacklisted(user):
-            return cls._finalize_evaluation(
-                False, 'USER_BLACKLISTED', "User is on the global blacklist.",
-                application, actor, results
-            )
-        results['R01'] = True
+        worklist = []
+        chunk = []
+        for application in applications.iterator(chunk_size=chunk_size):
+            chunk.append(application)
+            if len(chunk) >= chunk_size:
+                worklist.extend(cls._evaluate_chunk(chunk, actor))
+                chunk = []
+        if chunk:
+            worklist.extend(cls._evaluate_chunk(chunk, actor))
 
-        # R02: Maximum Active Loans
-        active_loans_count = Loan.objects.filter(borrower=user, status=Loan.Status.ACTIVE).count()
-        if active_loans_count >= cls.MAX_ACTIVE_LOANS:
-            return cls._finalize_evaluation(
-                False, 'MAX_ACTIVE_LOANS_EXCEEDED', 
-                f"User already has {active_loans_count} active loans (limit: {cls.MAX_ACTIVE_LOANS}).",
-                application, actor, results
-            )
-        results['R02'] = True
+        worklist.sort(key=lambda item: (
+            not item['is_passed'],
+            cls._rule_rank(item['failed_rule_code']),
+            item['submitted_at'],
+            item['application_id'],
+        ))
+        for rank, item in enumerate(worklist, start=1):
+            item['rank'] = rank
+        return worklist
 
-        # R03: Maximum Outstanding Balance
-        current_exposure = Loan.objects.filter(
-            borrower=user, 
-            status=Loan.Status.ACTIVE
-        ).aggregate(total=Sum('principal'))['total'] or Decimal('0')
-        
-        if (current_exposure + application.amount) > cls.MAX_EXPOSURE:
-            return cls._finalize_evaluation(
-                False, 'EXPOSURE_LIMIT_REACHED',
-                f"Total exposure (${current_exposure + application.amount}) exceeds limit of ${cls.MAX_EXPOSURE}.",
-                application, actor, results
-            )
-        results['R03'] = True
+    @classmethod
+    def _evaluate_chunk(cls, applications, actor):
+        features = load_risk_features_bulk(
+            [application.borrower_id for application in applications], cls.LATE_PAYMENT_THRESHOLD_DAYS
+        )
+        items = []
+        # One insert for the whole chunk's audit records
+        with AuditService.buffered():
+            for application in applications:
+                items.append(cls._evaluate_buffered(application, features[application.borrower_id], actor))
+        return items
 
-        # R04: Excessive Late Payments
-        # Check for any historical installments that were overdue for > threshold days
-        late_installments = LoanInstallment.objects.filter(
-            loan__borrower=user,
-            status=LoanInstallment.Status.OVERDUE,
-            due_date__lt=timezone.now().date() - timezone.timedelta(days=cls.LATE_PAYMENT_THRESHOLD_DAYS)
-        ).count()
+    @classmethod
+    def _evaluate_buffered(cls, application, borrower_features, actor):
+        is_passed, failed_rule_code, message, results, timings = cls._check(application, borrower_features)
+        AuditService.log_event(
+            actor=actor,
+            target=application,
+            event_type=AuditEventType.COMPLIANCE_RISK_EVALUATION,
+            description=message,
+            payload_after=cls._evaluation_payload(is_passed, failed_rule_code, results, timings),
+            metadata={"source": "RiskEngineService", "batch": True}
+        )
+        return {
+            'application_id': application.pk,
+            'borrower_id': application.borrower_id,
+            'amount': application.amount,
+            'submitted_at': application.created_at,
+            'is_passed': is_passed,
+            'failed_rule_code': failed_rule_code,
+            'message': message,
+            'features': borrower_features.as_dict(),
+        }
 
-        if late_installments > cls.LATE_PAYMENT_COUNT_THRESHOLD:
-             return cls._finalize_evaluation(
-                False, 'POOR_REPAYMENT_HISTORY',
-                f"User has {late_installments} severely overdue installments.",
-                application, actor, results
-            )
-        results['R04'] = True
+    @classmethod
+    def _rule_rank(cls, code):
+        if code is None:
+            return -1
+        return cls.RULE_CODES.index(code) if code in cls.RULE_CODES else len(cls.RULE_CODES)
 
-        return cls._finalize_evaluation(True, None, "All risk checks passed.", application, actor, results)
+    @staticmethod
+    def _evaluation_payload(is_passed, failed_rule_code, results, timings=None):
+        return {
+            "is_passed": is_passed,
+            "failed_rule_code": failed_rule_code,
+            "rule_results": results,
+            "rule_timings_us": timings or {}
+        }
 
     @staticmethod
-    def _finalize_evaluation(is_passed, failed_rule_code, message, application, actor, results):
+    def _finalize_evaluation(is_passed, failed_rule_code, message, application, actor, results, timings=None):
         """
         Helper to log the evaluation and return the result.
         """
@@ -88,11 +140,7 @@ class RiskEngineService:
             target=application,
             event_type=AuditEventType.COMPLIANCE_RISK_EVALUATION,
             description=message,
-            payload_after={
-                "is_passed": is_passed,
-                "failed_rule_code": failed_rule_code,
-                "rule_results": results
-            },
+            payload_after=RiskEngineService._evaluation_payload(is_passed, failed_rule_code, results, timings),
             metadata={"source": "RiskEngineService"}
         )
         return RiskResult(is_passed, failed_rule_code, message, results)
@@ -0,0 +1,277 @@
+"""
+Declarative eligibility rules, stored per product in
+LoanProduct.eligibility_criteria:
+
+    {
+        "rules": [
+            {
+                "id": "R02",
+                "code": "MAX_ACTIVE_LOANS_EXCEEDED",
+                "require": {"field": "active_loans", "op": "lt", "value": 2},
+                "message": "User already has {active_loans} active loans (limit: 2)."
+            },
+            {
+                "id": "R05",
+                "code": "TERM_TOO_LONG_FOR_EXPOSURE",
+                "require": {"any": [
+                    {"field": "term", "op": "lte", "value": 6},
+                    {"field": "exposure_after", "op": "lt", "value": "2000"}
+                ]},
+                "message": "Long terms need exposure below $2000."
+            }
+        ]
+    }
+
+Each rule passes when its `require` condition holds; rules run in order
+and evaluation stops at the first failure. Conditions combine with
+"all", "any" and "not". A product without a "rules" key gets the
+default rule set built from RiskEngineService's thresholds. The global
+rules (the blacklist check) run first for every product, whatever its
+own rules say; a product rule reusing a global rule's id is taken to be a
+copy of it and skipped.
+
+Rule sets are compiled once into closures and cached per product
+version (pk, updated_at), so editing a product's criteria takes effect
+on the next evaluation without a deploy.
+"""
+import operator
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+
+OPERATORS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'in': lambda left, right: left in right,
+    'not_in': lambda left, right: left not in right,
+}
+
+# Fields a condition may reference, and how to coerce literal values for them
+FIELDS = {
+    'is_blacklisted': bool,
+    'active_loans': int,
+    'exposure': Decimal,
+    'exposure_after': Decimal,
+    'late_installments': int,
+    'amount': Decimal,
+    'term': int,
+    # From processed bank statements (loan_applications.statements); zero without one
+    'has_statement': bool,
+    'monthly_income': Decimal,
+    'monthly_expenses': Decimal,
+    'net_monthly_income': Decimal,
+}
+
+
+def build_context(application, features):
+    """
+    The values conditions are evaluated against.
+    """
+    statement = getattr(application, 'statement_features', None) or {}
+    return {
+        'is_blacklisted': features.is_blacklisted,
+        'active_loans': features.active_loans,
+        'exposure': features.exposure,
+        'exposure_after': features.exposure + application.amount,
+        'late_installments': features.late_installments,
+        'amount': application.amount,
+        'term': application.term,
+        'has_statement': bool(statement.get('has_statement')),
+        'monthly_income': Decimal(statement.get('monthly_income', '0')),
+        'monthly_expenses': Decimal(statement.get('monthly_expenses', '0')),
+        'net_monthly_income': Decimal(statement.get('net_monthly_income', '0')),
+    }
+
+
+BOOLEAN_STRINGS = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}
+
+
+def _parse_bool(value):
+    # bool("false") is True, so strings and numbers are parsed explicitly
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in BOOLEAN_STRINGS:
+        return BOOLEAN_STRINGS[value.strip().lower()]
+    raise ValueError(value)
+
+
+def _coerce(field, value):
+    cast = FIELDS[field]
+    if cast is bool:
+        cast = _parse_bool
+    try:
+        if isinstance(value, (list, tuple)):
+            return frozenset(cast(str(item)) if cast is Decimal else cast(item) for item in value)
+        return cast(str(value)) if cast is Decimal else cast(value)
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValidationError(f"Invalid value {value!r} for field '{field}'.")
+
+
+def compile_condition(spec):
+    """
+    Turns a condition dict into a callable(context) -> bool.
+    """
+    if not isinstance(spec, dict):
+        raise ValidationError(f"A condition must be an object, got {spec!r}.")
+
+    if 'all' in spec or 'any' in spec:
+        combinator = all if 'all' in spec else any
+        children = spec['all'] if 'all' in spec else spec['any']
+        if not isinstance(children, list) or not children:
+            raise ValidationError("'all'/'any' need a non-empty list of conditions.")
+        compiled = tuple(compile_condition(child) for child in children)
+        return lambda context: combinator(check(context) for check in compiled)
+
+    if 'not' in spec:
+        inner = compile_condition(spec['not'])
+        return lambda context: not inner(context)
+
+    field, op = spec.get('field'), spec.get('op')
+    if field not in FIELDS:
+        raise ValidationError(f"Unknown field '{field}'. Allowed: {', '.join(sorted(FIELDS))}.")
+    if op not in OPERATORS:
+        raise ValidationError(f"Unknown operator '{op}'. Allowed: {', '.join(sorted(OPERATORS))}.")
+    if 'value' not in spec:
+        raise ValidationError(f"Condition on '{field}' has no value.")
+    compare = OPERATORS[op]
+    value = _coerce(field, spec['value'])
+    return lambda context: compare(context[field], value)
+
+
+class CompiledRule:
+    __slots__ = ('id', 'code', 'message', 'check')
+
+    def __init__(self, id, code, message, check):
+        self.id = id
+        self.code = code
+        self.message = message
+        self.check = check
+
+
+class CompiledRuleSet:
+    def __init__(self, rules):
+        self.rules = rules
+
+    def evaluate(self, context):
+        """
+        Runs the rules in order, stopping at the first failure.
+        Returns (is_passed, failed_rule_code, message, rule_results, timings_us).
+        """
+        results, timings = {}, {}
+        for rule in self.rules:
+            started = time.perf_counter_ns()
+            passed = rule.check(context)
+            timings[rule.id] = (time.perf_counter_ns() - started) / 1000
+            if not passed:
+                return False, rule.code, rule.message.format(**context), results, timings
+            results[rule.id] = True
+        return True, None, "All risk checks passed.", results, timings
+
+
+def compile_rules(criteria):
+    """
+    Compiles an eligibility_criteria document. Raises ValidationError
+    describing the first problem found.
+    """
+    specs = criteria.get('rules') if isinstance(criteria, dict) else None
+    if not isinstance(specs, list):
+        raise ValidationError("Eligibility criteria must contain a 'rules' list.")
+
+    rules, seen = [], set()
+    for position, spec in enumerate(specs, start=1):
+        if not isinstance(spec, dict) or not spec.get('id') or not spec.get('code') or 'require' not in spec:
+            raise ValidationError(f"Rule #{position} needs 'id', 'code' and 'require'.")
+        if spec['id'] in seen:
+            raise ValidationError(f"Duplicate rule id '{spec['id']}'.")
+        seen.add(spec['id'])
+        message = spec.get('message') or f"Rule {spec['id']} failed."
+        try:
+            message.format(**{field: '' for field in FIELDS})
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValidationError(f"Rule '{spec['id']}' message references an unknown field: {e}.")
+        rules.append(CompiledRule(spec['id'], spec['code'], message, compile_condition(spec['require'])))
+    return CompiledRuleSet(rules)
+
+
+def global_criteria():
+    """
+    Rules every product runs before its own.
+    """
+    return {'rules': [
+        {
+            'id': 'R01', 'code': 'USER_BLACKLISTED',
+            'require': {'field': 'is_blacklisted', 'op': 'eq', 'value': False},
+            'message': "User is on the global blacklist.",
+        },
+    ]}
+
+
+def default_criteria(engine):
+    """
+    The original hard-coded rules, expressed in the rule language.
+    """
+    return {'rules': global_criteria()['rules'] + [
+        {
+            'id': 'R02', 'code': 'MAX_ACTIVE_LOANS_EXCEEDED',
+            'require': {'field': 'active_loans', 'op': 'lt', 'value': engine.MAX_ACTIVE_LOANS},
+            'message': f"User already has {{active_loans}} active loans (limit: {engine.MAX_ACTIVE_LOANS}).",
+        },
+        {
+            'id': 'R03', 'code': 'EXPOSURE_LIMIT_REACHED',
+            'require': {'field': 'exposure_after', 'op': 'lte', 'value': str(engine.MAX_EXPOSURE)},
+            'message': f"Total exposure (${{exposure_after}}) exceeds limit of ${engine.MAX_EXPOSURE}.",
+        },
+        {
+            'id': 'R04', 'code': 'POOR_REPAYMENT_HISTORY',
+            'require': {'field': 'late_installments', 'op': 'lte', 'value': engine.LATE_PAYMENT_COUNT_THRESHOLD},
+            'message': "User has {late_installments} severely overdue installments.",
+        },
+    ]}
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_rule_set(product, engine):
+    """
+    Returns the compiled rules for a product, compiling at most once per
+    product version. Products without their own rules share the default
+    set; the others get the global rules followed by theirs.
+    """
+    criteria = product.eligibility_criteria if product is not None else None
+    if not isinstance(criteria, dict) or 'rules' not in criteria:
+        key = ('default', engine.MAX_ACTIVE_LOANS, engine.MAX_EXPOSURE, engine.LATE_PAYMENT_COUNT_THRESHOLD)
+        criteria = None
+    else:
+        key = (product.pk, product.updated_at)
+
+    rule_set = _cache.get(key)
+    if rule_set is None:
+        if criteria is None:
+            rule_set = compile_rules(default_criteria(engine))
+        else:
+            global_rules = global_criteria()['rules']
+            global_ids = {spec['id'] for spec in global_rules}
+            rule_set = compile_rules({'rules': global_rules + [
+                spec for spec in criteria['rules'] if not isinstance(spec, dict) or spec.get('id') not in global_ids
+            ]})
+        with _cache_lock:
+            if criteria is not None:
+                # Forget older versions of this product
+                for stale in [k for k in _cache if k[0] == product.pk]:
+                    del _cache[stale]
+            _cache[key] = rule_set
+    return rule_set
+
+
+def clear_rule_cache():
+    with _cache_lock:
+        _cache.clear()
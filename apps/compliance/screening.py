@@ -0,0 +1,228 @@
+"""
+Screening of KYC profiles against sanctions / fraud watchlists.
+
+A watchlist is a CSV file with a header row and at least a `name` column;
+`id_number`, `date_of_birth` (YYYY-MM-DD) and `reference` are optional.
+
+Names are normalized (accents, punctuation and case removed) into tokens.
+The watchlist is indexed by each token and by every single-character
+deletion of it, so a customer token finds watchlist tokens up to one
+typo away without comparing every pair. Candidates sharing enough tokens
+are scored with difflib on the sorted tokens, which ignores word order.
+
+Only an ID number hit, or a close name match on the same date of birth,
+is confirmed and blacklisted. A name match without a date of birth on
+both sides is reported for manual review however close it is: common
+names would otherwise blacklist every customer who shares them.
+"""
+import csv
+import difflib
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+NON_WORD = re.compile(r'[^a-z0-9]+')
+NON_ALNUM = re.compile(r'[^A-Z0-9]')
+
+# Name similarity at or above which a match on the same date of birth is confirmed and blacklisted
+CONFIRM_THRESHOLD = 0.92
+# Lower bound for matches reported for manual review
+REVIEW_THRESHOLD = 0.8
+# Tokens shorter than this only match exactly
+MIN_FUZZY_LENGTH = 4
+
+
+def normalize_name(name):
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode('ascii')
+    return [token for token in NON_WORD.split(ascii_name.lower()) if token]
+
+
+def normalize_id(id_number):
+    return NON_ALNUM.sub('', (id_number or '').upper())
+
+
+def token_keys(token):
+    """
+    The token plus its single-deletion variants: two tokens within one
+    edit (insert, delete or substitute) share at least one key.
+    """
+    keys = {token}
+    if len(token) >= MIN_FUZZY_LENGTH:
+        keys.update(token[:i] + token[i + 1:] for i in range(len(token)))
+    return keys
+
+
+class WatchlistEntry:
+    __slots__ = ('name', 'tokens', 'sort_key', 'id_number', 'date_of_birth', 'reference')
+
+    def __init__(self, name, id_number='', date_of_birth=None, reference=''):
+        self.name = name
+        self.tokens = normalize_name(name)
+        self.sort_key = ' '.join(sorted(self.tokens))
+        self.id_number = normalize_id(id_number)
+        self.date_of_birth = date_of_birth
+        self.reference = reference
+
+
+class ScreeningMatch:
+    __slots__ = ('user_id', 'full_name', 'entry', 'score', 'reason')
+
+    def __init__(self, user_id, full_name, entry, score, reason):
+        self.user_id = user_id
+        self.full_name = full_name
+        self.entry = entry
+        self.score = score
+        self.reason = reason
+
+    @property
+    def confirmed(self):
+        if self.reason == 'id_number':
+            return True
+        return self.reason == 'name_date_of_birth' and self.score >= CONFIRM_THRESHOLD
+
+
+class WatchlistIndex:
+    def __init__(self, entries):
+        self.entries = [entry for entry in entries if entry.tokens or entry.id_number]
+        self.by_id = {}
+        self.by_key = defaultdict(set)
+        for position, entry in enumerate(self.entries):
+            if entry.id_number:
+                self.by_id.setdefault(entry.id_number, position)
+            for token in entry.tokens:
+                for key in token_keys(token):
+                    self.by_key[key].add(position)
+
+    @classmethod
+    def from_csv(cls, handle):
+        reader = csv.DictReader(handle)
+        if 'name' not in (reader.fieldnames or []):
+            raise ValueError("Watchlist file needs a 'name' column.")
+        return cls(
+            WatchlistEntry(
+                row['name'],
+                row.get('id_number') or '',
+                parse_date(row['date_of_birth']) if row.get('date_of_birth') else None,
+                row.get('reference') or '',
+            )
+            for row in reader
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidates(self, tokens):
+        """
+        Positions of entries sharing enough (fuzzily equal) tokens with `tokens`.
+        """
+        hits = Counter()
+        for token in set(tokens):
+            matched = set()
+            for key in token_keys(token):
+                matched |= self.by_key.get(key, set())
+            hits.update(matched)
+        return [
+            position for position, shared in hits.items()
+            if shared >= min(2, len(set(tokens)), len(set(self.entries[position].tokens)))
+        ]
+
+    def match(self, full_name, id_number, date_of_birth=None, threshold=REVIEW_THRESHOLD):
+        """
+        The best watchlist match for one person as (entry, score, reason), or
+        None. The reason is 'id_number', 'name_date_of_birth' when both dates
+        of birth are known and equal, or 'name'.
+        """
+        position = self.by_id.get(normalize_id(id_number)) if id_number else None
+        if position is not None:
+            return self.entries[position], 1.0, 'id_number'
+
+        tokens = normalize_name(full_name)
+        sort_key = ' '.join(sorted(tokens))
+        best = None
+        for position in self.candidates(tokens):
+            entry = self.entries[position]
+            if entry.date_of_birth and date_of_birth and entry.date_of_birth != date_of_birth:
+                continue
+            score = difflib.SequenceMatcher(None, sort_key, entry.sort_key).ratio()
+            reason = 'name_date_of_birth' if entry.date_of_birth and date_of_birth else 'name'
+            # On equal scores a match backed by the date of birth wins
+            if score >= threshold and (best is None or (score, reason != 'name') > (best[1], best[2] != 'name')):
+                best = (entry, score, reason)
+        return best
+
+
+class ScreeningService:
+    """
+    Screens every KYC profile against a watchlist and blacklists confirmed
+    matches in bulk.
+    """
+
+    @staticmethod
+    def screen(index, threshold=REVIEW_THRESHOLD, chunk_size=5000):
+        """
+        Yields a ScreeningMatch for each profile scoring at least `threshold`.
+        """
+        from accounts.models import KYCProfile
+        profiles = KYCProfile.objects.order_by().values_list('user_id', 'full_name', 'id_number', 'date_of_birth')
+        for user_id, full_name, id_number, date_of_birth in profiles.iterator(chunk_size=chunk_size):
+            found = index.match(full_name, id_number, date_of_birth, threshold)
+            if found is not None:
+                yield ScreeningMatch(user_id, full_name, *found)
+
+    @staticmethod
+    def blacklist_matches(matches, source, actor=None):
+        """
+        Blacklists the users behind confirmed matches who are not blacklisted
+        yet: one bulk insert of Blacklist rows, one flag update and one
+        buffered batch of audit events. Returns the new Blacklist rows.
+        """
+        from .blacklist_cache import membership
+        from .events import AuditEventType
+        from .models import Blacklist
+        from .services import AuditService
+
+        confirmed = {}
+        for match in matches:
+            if match.confirmed and not membership.contains(match.user_id):
+                confirmed.setdefault(match.user_id, match)
+        if not confirmed:
+            return []
+
+        User = get_user_model()
+        with transaction.atomic(), AuditService.buffered():
+            entries = Blacklist.objects.bulk_create([
+                Blacklist(user_id=user_id, reason=ScreeningService._reason(match, source), created_by=actor)
+                for user_id, match in confirmed.items()
+            ])
+            User.objects.filter(pk__in=confirmed).update(is_blacklisted=True)
+            users = User.objects.in_bulk(list(confirmed))
+            for entry in entries:
+                match = confirmed[entry.user_id]
+                AuditService.log_event(
+                    actor=actor,
+                    target=users[entry.user_id],
+                    event_type=AuditEventType.USER_BLACKLISTED,
+                    description=f"User {users[entry.user_id].username} blacklisted. Reason: {entry.reason}",
+                    metadata={
+                        "blacklist_id": entry.pk,
+                        "watchlist": source,
+                        "watchlist_reference": match.entry.reference,
+                        "match_reason": match.reason,
+                        "score": round(match.score, 3),
+                    }
+                )
+        return entries
+
+    @staticmethod
+    def _reason(match, source):
+        if match.reason == 'id_number':
+            matched_on = "ID number"
+        else:
+            matched_on = f"name ({match.score:.0%} similar)"
+            if match.reason == 'name_date_of_birth':
+                matched_on += " and date of birth"
+        reference = f" {match.entry.reference}" if match.entry.reference else ""
+        return f"Watchlist match: {source}{reference} \"{match.entry.name}\" on {matched_on}."
@@ -0,0 +1,132 @@
+import base64
+import itertools
+import re
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9_.@-]*")
+MAX_TOKEN_LENGTH = 64
+MIN_TOKEN_LENGTH = 2
+MAX_TOKENS_PER_RECORD = 200
+STOPWORDS = frozenset({'a', 'an', 'and', 'by', 'for', 'from', 'in', 'is', 'of', 'on', 'the', 'to', 'was', 'with'})
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens, keeping ids, references and emails intact
+    (e.g. 'bank_3f2a', 'loan-42', 'a@b.com').
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(str(text).lower()):
+        token = token.rstrip('.-')
+        if MIN_TOKEN_LENGTH <= len(token) <= MAX_TOKEN_LENGTH and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def _payload_text(value):
+    """
+    Yields the scalar values of a JSON payload (keys are not indexed).
+    """
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _payload_text(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _payload_text(item)
+    elif value is not None and not isinstance(value, bool):
+        yield str(value)
+
+
+def record_tokens(entry):
+    tokens = set(tokenize(entry.description))
+    for payload in (entry.payload_before, entry.payload_after, entry.metadata):
+        for text in _payload_text(payload):
+            tokens.update(tokenize(text))
+            if len(tokens) >= MAX_TOKENS_PER_RECORD:
+                return sorted(tokens)[:MAX_TOKENS_PER_RECORD]
+    return sorted(tokens)
+
+
+def index_entries(entries):
+    """
+    Adds saved AuditLog instances to the search index.
+    """
+    from .models import AuditSearchToken
+    AuditSearchToken.objects.bulk_create(
+        [AuditSearchToken(token=token, log_id=entry.pk) for entry in entries for token in record_tokens(entry)],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+def matching_ids(query):
+    """
+    Subquery filters restricting AuditLog to records containing every token of `query`.
+    """
+    from .models import AuditSearchToken
+    return [
+        Q(pk__in=AuditSearchToken.objects.filter(token=token).values('log_id'))
+        for token in dict.fromkeys(tokenize(query))
+    ]
+
+
+def encode_cursor(entry):
+    raw = f"{entry.created_at.isoformat()}|{entry.pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Returns (created_at, id) or raises ValueError.
+    """
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        parsed = parse_datetime(created_at)
+        if parsed is None:
+            raise ValueError
+        return parsed, int(pk)
+    except (ValueError, UnicodeError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+def search(queryset, actor=None, event_types=None, content_type=None, object_id=None,
+           since=None, until=None, query=None, cursor=None, page_size=50, include_archived=False):
+    """
+    Filters AuditLog newest first with keyset pagination on (created_at, id).
+    With include_archived, sealed records (see compliance.tiering) are
+    merged in, in the same order.
+    Returns (records, next_cursor).
+    """
+    before = decode_cursor(cursor) if cursor else None
+    if actor is not None:
+        queryset = queryset.filter(actor_id=actor)
+    if event_types:
+        queryset = queryset.filter(event_type__in=event_types)
+    if content_type is not None:
+        queryset = queryset.filter(content_type=content_type)
+        if object_id is not None:
+            queryset = queryset.filter(object_id=str(object_id))
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    if query:
+        for condition in matching_ids(query):
+            queryset = queryset.filter(condition)
+    if before:
+        created_at, pk = before
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    records = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+    if include_archived:
+        from .tiering import AuditTieringService, filter_archived
+        archived = filter_archived(
+            AuditTieringService.read(content_type, object_id, since, until, before),
+            actor=actor, event_types=event_types, query=query
+        )
+        records.extend(itertools.islice(archived, page_size + 1))
+        records.sort(key=lambda record: (record.created_at, record.pk), reverse=True)
+        records = records[:page_size + 1]
+    next_cursor = encode_cursor(records[page_size - 1]) if len(records) > page_size else None
+    return records[:page_size], next_cursor
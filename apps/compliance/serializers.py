@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .models import ReportJob
 
 class UserExposureSerializer(serializers.Serializer):
     borrower_id = serializers.IntegerField(source='borrower')
@@ -11,10 +12,17 @@ class DefaultRateSerializer(serializers.Serializer):
     default_rate = serializers.FloatField()
 
 class LatePaymentSerializer(serializers.Serializer):
+    installment_id = serializers.IntegerField()
     loan_id = serializers.IntegerField()
-    borrower_username = serializers.CharField(source='loan__borrower__username')
+    borrower_username = serializers.CharField()
+    due_date = serializers.DateField()
     days_overdue = serializers.IntegerField()
-    amount_overdue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    amount_overdue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class AgingBucketSerializer(serializers.Serializer):
+    bucket = serializers.CharField()
+    count = serializers.IntegerField()
+    amount_overdue = serializers.DecimalField(max_digits=14, decimal_places=2)
 
 class AdminActionReportSerializer(serializers.Serializer):
     id = serializers.IntegerField()
@@ -24,3 +32,70 @@ class AdminActionReportSerializer(serializers.Serializer):
     target_object = serializers.CharField(source='content_object')
     description = serializers.CharField()
     reason = serializers.JSONField(source='metadata')
+
+class AuditLogSearchSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    sequence = serializers.IntegerField(allow_null=True)
+    created_at = serializers.DateTimeField()
+    actor_id = serializers.IntegerField(allow_null=True)
+    event_type = serializers.CharField()
+    target_type = serializers.SerializerMethodField()
+    object_id = serializers.CharField()
+    description = serializers.CharField()
+    payload_before = serializers.JSONField()
+    payload_after = serializers.JSONField()
+    metadata = serializers.JSONField()
+    archived = serializers.SerializerMethodField()
+
+    def get_target_type(self, obj):
+        from django.contrib.contenttypes.models import ContentType
+        content_type = ContentType.objects.get_for_id(obj.content_type_id)
+        return f"{content_type.app_label}.{content_type.model}"
+
+    def get_archived(self, obj):
+        return getattr(obj, 'archived', False)
+
+class AuditSearchQuerySerializer(serializers.Serializer):
+    actor = serializers.IntegerField(required=False)
+    event_type = serializers.CharField(required=False, help_text="Comma-separated event types.")
+    target_type = serializers.CharField(required=False, help_text="app_label.model, e.g. payments.payment")
+    object_id = serializers.CharField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    q = serializers.CharField(required=False, help_text="Free text; every word must match.")
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=200, default=50)
+    include_archived = serializers.BooleanField(required=False, default=False)
+
+    def validate_target_type(self, value):
+        from django.contrib.contenttypes.models import ContentType
+        try:
+            app_label, model = value.lower().split('.', 1)
+            return ContentType.objects.get_by_natural_key(app_label, model)
+        except (ValueError, ContentType.DoesNotExist):
+            raise serializers.ValidationError("Unknown target type.")
+
+    def validate(self, attrs):
+        if 'object_id' in attrs and 'target_type' not in attrs:
+            raise serializers.ValidationError({"object_id": "Requires target_type."})
+        if attrs.get('include_archived') and 'object_id' not in attrs and 'since' not in attrs:
+            raise serializers.ValidationError(
+                {"include_archived": "Requires a target (target_type and object_id) or a since date."}
+            )
+        return attrs
+
+class ReportJobRequestSerializer(serializers.Serializer):
+    report = serializers.ChoiceField(choices=['exposure', 'late_payments'])
+    as_of = serializers.DateField(required=False, help_text="Export a stored snapshot instead of live data.")
+    compress = serializers.ChoiceField(choices=['gzip'], required=False)
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report', 'params', 'status', 'progress', 'total_rows', 'rows_written',
+            'file_size', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
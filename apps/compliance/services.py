@@ -1,17 +1,26 @@
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
+from . import audit_writer
 from .models import AuditLog, Blacklist
+from .features import clear_risk_features
+from .blacklist_cache import membership
 from .events import AuditEventType
 
 class AuditService:
+    # Group several events into one bulk insert: `with AuditService.buffered(): ...`
+    buffered = staticmethod(audit_writer.buffered)
+
     @staticmethod
     def log_event(actor, target, event_type, description, payload_before=None, payload_after=None, metadata=None):
         """
         Standard utility for logging an audit event.
+        Inside AuditService.buffered() the record is queued and written when
+        the block exits; otherwise it is written immediately.
         """
+        # get_for_model is served from ContentType's per-process cache
         content_type = ContentType.objects.get_for_model(target)
         
-        return AuditLog.objects.create(
+        entry = AuditLog(
             actor=actor,
             content_type=content_type,
             object_id=str(target.pk),
@@ -21,6 +30,12 @@ class AuditService:
             payload_after=payload_after,
             metadata=metadata or {}
         )
+        buffer = audit_writer.current_buffer()
+        if buffer is not None:
+            buffer.append(entry)
+        else:
+            audit_writer.write([entry])
+        return entry
 
 class BlacklistService:
     @staticmethod
@@ -42,6 +57,7 @@ class BlacklistService:
             # Sync to User model flag for performance
             user.is_blacklisted = True
             user.save()
+            clear_risk_features(user)
             
             # Audit Log
             AuditService.log_event(
@@ -70,6 +86,7 @@ class BlacklistService:
             # Sync to User model flag
             user.is_blacklisted = False
             user.save()
+            clear_risk_features(user)
             
             # Audit Log
             AuditService.log_event(
@@ -83,5 +100,6 @@ class BlacklistService:
     def is_blacklisted(user):
         """
         Checks if the user has an active blacklist record.
+        Served from the in-process membership set (see blacklist_cache).
         """
-        return Blacklist.objects.filter(user=user, is_active=True).exists()
+        return membership.contains(user.pk)
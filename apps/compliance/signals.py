@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .blacklist_cache import membership
+from .models import Blacklist
+
+
+@receiver([post_save, post_delete], sender=Blacklist, dispatch_uid='compliance.blacklist_changed')
+def blacklist_changed(sender, **kwargs):
+    """
+    Publishes every saved or deleted Blacklist row (services, admin, shell)
+    to the membership sets of all processes once it commits.
+    """
+    membership.invalidate()
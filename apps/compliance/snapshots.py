@@ -0,0 +1,182 @@
+"""
+Materialized compliance reports.
+
+A ReportSnapshot stores a report computed as of a date. Building the
+next snapshot starts from the latest earlier one and only re-reads the
+loans and installments whose updated_at is past its watermark, so a
+month-end run touches the rows that changed during the month rather
+than the whole book. updated_at is set when a row is saved, not when
+its transaction commits, so the watermark is set back by
+REPORT_SNAPSHOT_WATERMARK_MARGIN_SECONDS, which must cover the longest
+transaction that writes loans or installments. Snapshots are only built
+as of today, since the live tables say nothing about other dates, and
+snapshots for past dates are never rewritten, which keeps month-end
+figures reproducible.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from loans.models import Loan, LoanInstallment
+from .models import ReportSnapshot
+from . import reports
+
+Report = ReportSnapshot.Report
+
+DEFAULT_WATERMARK_MARGIN_SECONDS = 15 * 60
+
+
+class SnapshotFrozen(Exception):
+    """Raised when asked to build a snapshot for any date but today."""
+
+
+def _money(value):
+    return str(Decimal(value).quantize(reports.CENTS))
+
+
+def _exposure_row(row):
+    return {'borrower': row['borrower'], 'username': row['username'], 'total_exposure': _money(row['total_exposure'])}
+
+
+def _late_row(row, as_of):
+    return {
+        'installment_id': row['id'],
+        'loan_id': row['loan_id'],
+        'borrower_username': row['borrower_username'],
+        'due_date': row['due_date'].isoformat(),
+        'days_overdue': (as_of - row['due_date']).days,
+        'amount_overdue': _money(row['amount_overdue']),
+    }
+
+
+def aging_buckets(rows):
+    """
+    reports.aging_buckets() computed over snapshot rows.
+    """
+    buckets = []
+    for label, low, high in reports.AGING_BUCKETS:
+        matching = [r for r in rows if r['days_overdue'] >= low and (high is None or r['days_overdue'] <= high)]
+        buckets.append({
+            'bucket': label,
+            'count': len(matching),
+            'amount_overdue': _money(sum((Decimal(r['amount_overdue']) for r in matching), Decimal('0'))),
+        })
+    return buckets
+
+
+class ReportSnapshotService:
+    """
+    Builds and looks up ReportSnapshot rows.
+    """
+
+    @staticmethod
+    def get(report, as_of):
+        return ReportSnapshot.objects.filter(report=report, as_of=as_of).first()
+
+    @classmethod
+    def build(cls, report, as_of=None, full=False):
+        """
+        Computes `report` as of today and stores it, incrementally from the
+        latest earlier snapshot unless `full`. Today's snapshot may be
+        refreshed; any other `as_of` raises SnapshotFrozen.
+        """
+        today = timezone.now().date()
+        as_of = as_of or today
+        if as_of < today and ReportSnapshot.objects.filter(report=report, as_of=as_of).exists():
+            raise SnapshotFrozen(f"The {report} snapshot as of {as_of} is frozen.")
+        if as_of != today:
+            raise SnapshotFrozen(f"A {report} snapshot can only be built as of today ({today}), not {as_of}.")
+
+        # Taken before reading, and set back so that rows saved before it by a
+        # transaction still open now are picked up next time
+        watermark = timezone.now() - timedelta(seconds=getattr(
+            settings, 'REPORT_SNAPSHOT_WATERMARK_MARGIN_SECONDS', DEFAULT_WATERMARK_MARGIN_SECONDS
+        ))
+        previous = None
+        if not full:
+            previous = ReportSnapshot.objects.filter(report=report, as_of__lte=as_of).order_by('-as_of').first()
+
+        builder = {
+            Report.EXPOSURE: cls._build_exposure,
+            Report.DEFAULT_METRICS: cls._build_default_metrics,
+            Report.LATE_PAYMENTS: cls._build_late_payments,
+        }[report]
+        data = builder(as_of, previous)
+
+        with transaction.atomic():
+            snapshot, _ = ReportSnapshot.objects.update_or_create(
+                report=report, as_of=as_of,
+                defaults={
+                    'data': data,
+                    'rows': len(data['rows']) if 'rows' in data else 1,
+                    'watermark': watermark,
+                    'is_incremental': previous is not None,
+                }
+            )
+        return snapshot
+
+    @staticmethod
+    def _changed_loans(since):
+        """
+        Loans changed after `since`, directly or through one of their installments.
+        """
+        return Loan.objects.filter(
+            Q(updated_at__gt=since) | Q(pk__in=LoanInstallment.objects.filter(updated_at__gt=since).values('loan_id'))
+        )
+
+    @classmethod
+    def _build_exposure(cls, as_of, previous):
+        if previous is None:
+            return {'rows': [_exposure_row(row) for row in reports.borrower_exposure().iterator(chunk_size=2000)]}
+
+        borrowers = set(cls._changed_loans(previous.watermark).values_list('borrower_id', flat=True))
+        rows = {row['borrower']: row for row in previous.data['rows'] if row['borrower'] not in borrowers}
+        for row in reports.borrower_exposure().filter(pk__in=borrowers):
+            rows[row['borrower']] = _exposure_row(row)
+        # Same order as borrower_exposure(): largest exposure first, then borrower id
+        return {'rows': sorted(rows.values(), key=lambda r: (-Decimal(r['total_exposure']), r['borrower']))}
+
+    @staticmethod
+    def _build_default_metrics(as_of, previous):
+        # Two indexed counts; cheaper to recompute than to reconcile
+        total_count = Loan.objects.count()
+        default_count = Loan.objects.filter(
+            status__in=[Loan.Status.DEFAULTED, Loan.Status.CLOSED], is_active=False
+        ).count()
+        return {
+            'total_disbursed_count': total_count,
+            'default_count': default_count,
+            'default_rate': (default_count / total_count * 100) if total_count > 0 else 0,
+        }
+
+    @classmethod
+    def _build_late_payments(cls, as_of, previous):
+        late = reports.late_installments(as_of)
+        if previous is None:
+            rows = [_late_row(row, as_of) for row in late.iterator(chunk_size=2000)]
+            return {'rows': rows, 'aging_buckets': aging_buckets(rows)}
+
+        since = previous.watermark
+        changed = LoanInstallment.objects.filter(
+            Q(updated_at__gt=since) | Q(loan__in=cls._changed_loans(since))
+        )
+        changed_ids = set(changed.values_list('id', flat=True))
+
+        rows = {}
+        for row in previous.data['rows']:
+            if row['installment_id'] in changed_ids:
+                continue
+            row = dict(row)
+            row['days_overdue'] = (as_of - date.fromisoformat(row['due_date'])).days
+            rows[row['installment_id']] = row
+        # Changed rows, plus unchanged overdue rows that became late since the previous as_of
+        refreshed = late.filter(
+            Q(pk__in=changed.values('id')) | Q(due_date__gte=previous.as_of)
+        )
+        for row in refreshed:
+            rows[row['id']] = _late_row(row, as_of)
+
+        rows = sorted(rows.values(), key=lambda r: (r['due_date'], r['installment_id']))
+        return {'rows': rows, 'aging_buckets': aging_buckets(rows)}
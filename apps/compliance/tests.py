@@ -1,9 +1,12 @@
-from django.test import TestCase
+import os
+import unittest
+from django.test import TestCase, override_settings
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
-from compliance.models import AuditLog
+from compliance.models import AuditLog, AuditSegment, ReportSnapshot
 from compliance.risk_engine import RiskEngineService
 from compliance.events import AuditEventType
 from loan_applications.models import LoanApplication
@@ -50,6 +53,10 @@ class AuditLogTestCase(TestCase):
 
 class RiskEngineTestCase(TestCase):
     def setUp(self):
+        from compliance.blacklist_cache import membership
+        # As at process start: blacklist membership is already in memory
+        membership.reset()
+        membership.load()
         self.user = User.objects.create_user(username='borrower', password='password')
         self.product = LoanProduct.objects.create(
             name="Test Product", 
@@ -152,6 +159,455 @@ class RiskEngineTestCase(TestCase):
         self.assertFalse(result.is_passed)
         self.assertEqual(result.failed_rule_code, 'POOR_REPAYMENT_HISTORY')
 
+    def test_features_loaded_in_one_query_and_memoized(self):
+        """Verify all rule inputs come from a single query, reused across evaluations."""
+        from compliance.features import load_risk_features
+        app = LoanApplication.objects.create(borrower=self.user, product=self.product, amount=1200, term=6)
+        loan = Loan.objects.create(
+            application=app, borrower=self.user, product=self.product,
+            principal=1200, interest_rate=10, interest_type='fixed', term=6,
+            status=Loan.Status.ACTIVE
+        )
+        LoanInstallment.objects.create(
+            loan=loan, due_date=timezone.now().date() - timezone.timedelta(days=10),
+            principal_expected=200, interest_expected=20, status=LoanInstallment.Status.OVERDUE
+        )
+
+        with self.assertNumQueries(1):
+            features = load_risk_features(self.user, RiskEngineService.LATE_PAYMENT_THRESHOLD_DAYS)
+        self.assertEqual(
+            (features.is_blacklisted, features.active_loans, features.exposure, features.late_installments),
+            (False, 1, Decimal('1200'), 0)
+        )
+
+        # Evaluations reuse the memoized snapshot and only append their audit record
+        # (insert, search tokens; chaining runs after the commit)
+        with self.assertNumQueries(2):
+            result = RiskEngineService.evaluate(self.app)
+        self.assertTrue(result.is_passed)
+
+    def test_batch_evaluation_ranks_worklist(self):
+        """Verify batch evaluation of the SUBMITTED queue with bulk audit writes."""
+        from compliance.services import BlacklistService
+        other = User.objects.create_user(username='flagged', password='password')
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistService.add_to_blacklist(other, "Fraud", None)
+        self.assertTrue(BlacklistService.is_blacklisted(other))  # reloads the published membership set
+        self.app.status = LoanApplication.Status.SUBMITTED
+        self.app.save()
+        flagged_app = LoanApplication.objects.create(
+            borrower=other, product=self.product, amount=500, term=6, status=LoanApplication.Status.SUBMITTED
+        )
+        big_app = LoanApplication.objects.create(
+            borrower=self.user, product=self.product, amount=6000, term=6, status=LoanApplication.Status.SUBMITTED
+        )
+
+        ContentType.objects.get_for_model(LoanApplication)  # served from the per-process cache in production
+        with self.assertNumQueries(4):  # applications, features, audit insert, search tokens
+            worklist = RiskEngineService.evaluate_batch()
+
+        self.assertEqual(
+            [(item['rank'], item['application_id'], item['failed_rule_code']) for item in worklist],
+            [(1, self.app.pk, None), (2, flagged_app.pk, 'USER_BLACKLISTED'), (3, big_app.pk, 'EXPOSURE_LIMIT_REACHED')]
+        )
+        self.assertEqual(AuditLog.objects.filter(
+            event_type=AuditEventType.COMPLIANCE_RISK_EVALUATION, metadata__batch=True
+        ).count(), 3)
+
+    def test_risk_worklist_api_is_staff_only(self):
+        from rest_framework.test import APIClient
+        self.app.status = LoanApplication.Status.SUBMITTED
+        self.app.save()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.post('/api/applications/risk_worklist/').status_code, 403)
+
+        officer = User.objects.create_user(username='officer', password='password', role='LOAN_OFFICER')
+        client.force_authenticate(user=officer)
+        response = client.post('/api/applications/risk_worklist/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['application_id'], self.app.pk)
+        self.assertTrue(response.data[0]['is_passed'])
+
+    def test_product_rules_run_after_global_rules(self):
+        """Verify a product's declarative rules are compiled, cached per version and evaluated."""
+        from compliance.rules import clear_rule_cache, get_rule_set
+        clear_rule_cache()
+        self.product.eligibility_criteria = {'rules': [
+            {'id': 'R01', 'code': 'USER_BLACKLISTED', 'require': {'field': 'is_blacklisted', 'op': 'eq', 'value': False}},
+            {
+                'id': 'R05', 'code': 'TERM_TOO_LONG',
+                'require': {'any': [
+                    {'field': 'term', 'op': 'lte', 'value': 3},
+                    {'field': 'exposure_after', 'op': 'lt', 'value': '500'},
+                ]},
+                'message': "Term {term} needs exposure below $500 (was ${exposure_after}).",
+            },
+        ]}
+        self.product.full_clean()
+        self.product.save()
+
+        result = RiskEngineService.evaluate(self.app)
+        self.assertFalse(result.is_passed)
+        self.assertEqual(result.failed_rule_code, 'TERM_TOO_LONG')
+        self.assertEqual(result.message, "Term 6 needs exposure below $500 (was $1000).")
+        log = AuditLog.objects.filter(event_type=AuditEventType.COMPLIANCE_RISK_EVALUATION).latest('id')
+        self.assertEqual(set(log.payload_after['rule_timings_us']), {'R01', 'R05'})
+
+        # Same version is compiled once; a new version recompiles
+        self.assertIs(get_rule_set(self.product, RiskEngineService), get_rule_set(self.product, RiskEngineService))
+        self.app.term = 3
+        self.assertTrue(RiskEngineService.evaluate(self.app).is_passed)
+
+        # Dropping R01 from the product's rules does not skip the blacklist
+        self.product.eligibility_criteria['rules'].pop(0)
+        self.product.save()
+        from compliance.services import BlacklistService
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistService.add_to_blacklist(self.user, "Fraud", None)
+        result = RiskEngineService.evaluate(self.app)
+        self.assertEqual(result.failed_rule_code, 'USER_BLACKLISTED')
+
+    def test_boolean_rule_values_are_parsed(self):
+        from compliance.rules import compile_condition
+        check = compile_condition({'field': 'is_blacklisted', 'op': 'eq', 'value': 'false'})
+        self.assertTrue(check({'is_blacklisted': False}))
+        self.assertFalse(check({'is_blacklisted': True}))
+        with self.assertRaises(ValidationError):
+            compile_condition({'field': 'has_statement', 'op': 'eq', 'value': 'nope'})
+
+    def test_invalid_rules_rejected(self):
+        self.product.eligibility_criteria = {'rules': [
+            {'id': 'R01', 'code': 'X', 'require': {'field': 'credit_score', 'op': 'gt', 'value': 1}},
+        ]}
+        with self.assertRaises(ValidationError) as cm:
+            self.product.full_clean()
+        self.assertIn('credit_score', str(cm.exception))
+
+class AuditBufferTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='password')
+
+    def test_buffered_events_are_written_in_one_insert_in_order(self):
+        from compliance.services import AuditService
+        AuditService.log_event(self.user, self.user, 'WARMUP', "Warm the content type cache")
+        with self.assertNumQueries(2):  # one insert, search tokens; chaining waits for the commit
+            with AuditService.buffered():
+                first = AuditService.log_event(self.user, self.user, 'FIRST', "First")
+                with AuditService.buffered():
+                    AuditService.log_event(self.user, self.user, 'SECOND', "Second")
+                AuditService.log_event(self.user, self.user, 'THIRD', "Third")
+                self.assertIsNone(first.pk)
+
+        logs = list(AuditLog.objects.filter(event_type__in=['FIRST', 'SECOND', 'THIRD']).order_by('id'))
+        self.assertEqual([log.event_type for log in logs], ['FIRST', 'SECOND', 'THIRD'])
+        self.assertTrue(logs[0].created_at <= logs[1].created_at <= logs[2].created_at)
+        with self.assertRaises(ValidationError):
+            logs[0].save()
+
+    def test_buffer_dropped_when_transaction_rolls_back(self):
+        from django.db import transaction
+        from compliance.services import AuditService
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic(), AuditService.buffered():
+                AuditService.log_event(self.user, self.user, 'ROLLED_BACK', "Never written")
+                raise RuntimeError
+        self.assertFalse(AuditLog.objects.filter(event_type='ROLLED_BACK').exists())
+
+    def test_buffer_follows_savepoints_not_exceptions(self):
+        from django.db import transaction
+        from compliance.services import AuditService
+        with transaction.atomic(), AuditService.buffered():
+            # Caught inside the transaction: the events are kept
+            try:
+                with AuditService.buffered():
+                    AuditService.log_event(self.user, self.user, 'CAUGHT', "Written")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # Rolled back savepoint inside the outer buffer: the events go with it
+            try:
+                with transaction.atomic(), AuditService.buffered():
+                    AuditService.log_event(self.user, self.user, 'SAVEPOINT', "Rolled back")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(
+            list(AuditLog.objects.filter(event_type__in=['CAUGHT', 'SAVEPOINT']).values_list('event_type', flat=True)),
+            ['CAUGHT']
+        )
+
+    def test_buffered_events_are_dropped_with_an_inner_savepoint(self):
+        from django.db import transaction
+        from compliance.services import AuditService
+        with transaction.atomic(), AuditService.buffered():
+            AuditService.log_event(self.user, self.user, 'BEFORE', "Kept")
+            try:
+                with transaction.atomic():
+                    AuditService.log_event(self.user, self.user, 'INNER_FAILED', "Rolled back")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            with transaction.atomic():
+                with transaction.atomic():
+                    AuditService.log_event(self.user, self.user, 'INNER_KEPT', "Released")
+        self.assertEqual(
+            list(AuditLog.objects.filter(event_type__in=['BEFORE', 'INNER_FAILED', 'INNER_KEPT'])
+                 .order_by('pk').values_list('event_type', flat=True)),
+            ['BEFORE', 'INNER_KEPT']
+        )
+
+    def test_async_mode_hands_batches_to_writer_on_commit(self):
+        from unittest.mock import patch
+        from django.test import override_settings
+        from compliance import audit_writer
+        from compliance.services import AuditService
+
+        with override_settings(AUDIT_ASYNC_WRITES=True), \
+                patch.object(audit_writer.AuditWriter, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                with AuditService.buffered():
+                    AuditService.log_event(self.user, self.user, 'ASYNC_1', "One")
+                    AuditService.log_event(self.user, self.user, 'ASYNC_2', "Two")
+                submit.assert_not_called()
+        submit.assert_called_once()
+        self.assertEqual([entry.event_type for entry in submit.call_args[0][0]], ['ASYNC_1', 'ASYNC_2'])
+
+@override_settings(AUDIT_CHECKPOINT_INTERVAL=3)
+class AuditChainTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='chained', password='password')
+
+    def _log(self, count):
+        from compliance.services import AuditService
+        with self.captureOnCommitCallbacks(execute=True), AuditService.buffered():
+            for i in range(count):
+                AuditService.log_event(self.user, self.user, 'CHAIN_TEST', f"Event {i}", payload_after={"i": i})
+
+    def test_records_are_chained_after_commit(self):
+        from compliance.models import AuditChainHead
+        from compliance.services import AuditService
+        self._log(1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(2):  # insert, search tokens: the chain head is not locked
+                entry = AuditService.log_event(self.user, self.user, 'CHAIN_TEST', "Pending")
+        entry = AuditLog.objects.get(pk=entry.pk)
+        self.assertEqual((entry.sequence, entry.chain_pending), (None, True))
+        self.assertEqual(AuditChainHead.objects.get().last_sequence, 1)
+
+        for callback in callbacks:
+            callback()
+        entry = AuditLog.objects.get(pk=entry.pk)
+        self.assertEqual((entry.sequence, entry.chain_pending), (2, False))
+        self.assertEqual(AuditChainHead.objects.get().last_hash, entry.record_hash)
+
+    def test_records_are_chained_and_checkpointed(self):
+        from compliance.chain import verify
+        from compliance.models import AuditCheckpoint
+        self._log(7)
+        logs = list(AuditLog.objects.filter(sequence__isnull=False).order_by('sequence'))
+        self.assertEqual([log.sequence for log in logs], list(range(1, 8)))
+        for previous, log in zip(logs, logs[1:]):
+            self.assertEqual(log.prev_hash, previous.record_hash)
+        self.assertEqual(list(AuditCheckpoint.objects.order_by('sequence').values_list('sequence', flat=True)), [3, 6])
+
+        self.assertEqual(verify()['records'], 7)
+        # The next run starts after the last verified checkpoint
+        self._log(2)
+        result = verify()
+        self.assertEqual((result['from_sequence'], result['records'], result['checkpoints']), (7, 3, 1))
+
+    def test_tampering_is_detected(self):
+        from django.core.management import call_command, CommandError
+        self._log(4)
+        target = AuditLog.objects.get(sequence=2)
+        AuditLog.objects.filter(pk=target.pk).update(description="Rewritten")
+        with self.assertRaises(CommandError) as cm:
+            call_command('verify_audit_chain', '--full')
+        self.assertIn("sequence 2", str(cm.exception))
+
+    def test_deleted_record_is_detected(self):
+        from compliance.chain import ChainBroken, verify
+        self._log(4)
+        AuditLog.objects.filter(sequence=3).delete()
+        with self.assertRaises(ChainBroken) as cm:
+            verify(full=True)
+        self.assertEqual(cm.exception.sequence, 3)
+
+    def test_deleted_last_record_is_detected(self):
+        from compliance.chain import ChainBroken, verify
+        self._log(4)
+        AuditLog.objects.filter(sequence=4).delete()
+        with self.assertRaises(ChainBroken) as cm:
+            verify(full=True)
+        self.assertEqual(cm.exception.sequence, 4)
+
+class AuditSearchTestCase(TestCase):
+    def setUp(self):
+        from compliance.services import AuditService
+        from rest_framework.test import APIClient
+        self.admin = User.objects.create_user(username='investigator', password='password', role='ADMIN')
+        self.other = User.objects.create_user(username='clerk', password='password')
+        with AuditService.buffered():
+            for i in range(5):
+                AuditService.log_event(
+                    self.admin, self.other, 'SEARCH_TEST', f"Balance adjusted for ticket T-{i}",
+                    payload_after={"reference": f"bank_ref{i}", "note": "Manual review"}
+                )
+            AuditService.log_event(self.other, self.admin, 'OTHER_EVENT', "Unrelated event")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.url = '/compliance/api/audit/'
+
+    def test_free_text_uses_index_and_matches_all_words(self):
+        response = self.client.get(self.url, {'q': 'manual BANK_REF3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['payload_after']['reference'] for r in response.data['results']], ['bank_ref3'])
+        self.assertEqual(self.client.get(self.url, {'q': 'manual unrelated'}).data['results'], [])
+
+    def test_filters_and_keyset_pagination(self):
+        seen = []
+        params = {'actor': self.admin.pk, 'event_type': 'SEARCH_TEST', 'target_type': 'accounts.user',
+                  'object_id': self.other.pk, 'page_size': 2}
+        cursor = None
+        while True:
+            response = self.client.get(self.url, dict(params, **({'cursor': cursor} if cursor else {})))
+            self.assertEqual(response.status_code, 200)
+            seen.extend(r['id'] for r in response.data['results'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        expected = list(AuditLog.objects.filter(event_type='SEARCH_TEST').order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_admin_search_uses_index(self):
+        self.admin.is_staff = self.admin.is_superuser = True
+        self.admin.save()
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/compliance/auditlog/', {'q': 'bank_ref2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_requires_admin_and_valid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 400)
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+@override_settings(AUDIT_CHECKPOINT_INTERVAL=2)
+class AuditTieringTestCase(TestCase):
+    def setUp(self):
+        import tempfile
+        from compliance.services import AuditService
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        settings_override = override_settings(AUDIT_ARCHIVE_ROOT=archive_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = User.objects.create_user(username='tiering', password='password', role='ADMIN')
+        with self.captureOnCommitCallbacks(execute=True), AuditService.buffered():
+            for i in range(5):
+                AuditService.log_event(self.admin, self.admin, 'TIER_TEST', f"Event number{i}")
+
+    def test_seal_verified_rows_and_read_through(self):
+        from rest_framework.test import APIClient
+        from compliance.chain import verify
+        from compliance.tiering import AuditTieringService
+
+        # Nothing is sealed before the chain has been verified
+        self.assertEqual(AuditTieringService.seal(older_than_days=0), 0)
+        verify()
+        self.assertEqual(AuditTieringService.seal(older_than_days=0), 4)
+        self.assertEqual(list(AuditLog.objects.values_list('sequence', flat=True)), [5])
+        self.assertEqual(AuditTieringService.verify_segments(), [])
+        self.assertEqual(verify()['records'], 1)
+
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        params = {'target_type': 'accounts.user', 'object_id': self.admin.pk, 'include_archived': 'true', 'page_size': 2}
+        seen, cursor = [], None
+        while True:
+            response = client.get('/compliance/api/audit/', dict(params, **({'cursor': cursor} if cursor else {})))
+            self.assertEqual(response.status_code, 200)
+            seen.extend((r['sequence'], r['archived']) for r in response.data['results'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [(5, False), (4, True), (3, True), (2, True), (1, True)])
+
+        response = client.get('/compliance/api/audit/', dict(params, q='number2', page_size=10))
+        self.assertEqual([r['sequence'] for r in response.data['results']], [3])
+
+    def test_segment_tampering_detected(self):
+        import gzip, os
+        from compliance.chain import verify
+        from compliance.tiering import AuditTieringService
+        verify()
+        AuditTieringService.seal(older_than_days=0)
+        segment = AuditSegment.objects.get()
+        path = os.path.join(AuditTieringService.store().root, segment.partition, segment.name)
+        with gzip.open(path, 'ab') as f:
+            f.write(b'{"id": 999}\n')
+        self.assertEqual(AuditTieringService.verify_segments(), [segment])
+
+        # Updating the store's own index does not hide it: the manifest is the reference
+        store = AuditTieringService.store()
+        index = store.read_index(segment.partition)
+        index['segments'][segment.name]['sha256'] = store.checksum(segment.partition, segment.name)
+        store._write_index(segment.partition, index)
+        self.assertEqual(AuditTieringService.verify_segments(), [segment])
+
+    def test_full_verify_rehashes_sealed_records(self):
+        import gzip, json, os
+        from compliance.chain import ChainBroken, verify
+        from compliance.tiering import AuditTieringService
+        verify()
+        AuditTieringService.seal(older_than_days=0, segment_size=2)
+        result = verify(full=True)
+        self.assertEqual((result['from_sequence'], result['to_sequence'], result['records']), (1, 5, 5))
+
+        # Rewritten in cold storage, with the manifest checksum updated to match
+        segment = AuditSegment.objects.get(min_sequence=3)
+        path = os.path.join(AuditTieringService.store().root, segment.partition, segment.name)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        rows[0]['description'] = "Rewritten"
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        AuditSegment.objects.filter(pk=segment.pk).update(
+            sha256=AuditTieringService.store().checksum(segment.partition, segment.name)
+        )
+        self.assertEqual(AuditTieringService.verify_segments(), [])
+        with self.assertRaises(ChainBroken) as cm:
+            verify(full=True)
+        self.assertEqual(cm.exception.sequence, rows[0]['sequence'])
+
+    def test_full_verify_detects_a_missing_sealed_segment(self):
+        from compliance.chain import ChainBroken, verify
+        from compliance.tiering import AuditTieringService
+        verify()
+        AuditTieringService.seal(older_than_days=0, segment_size=2)
+        AuditSegment.objects.filter(min_sequence=3).delete()
+        with self.assertRaises(ChainBroken) as cm:
+            verify(full=True)
+        self.assertEqual(cm.exception.sequence, 3)
+
+    def test_read_opens_segments_newest_first_as_needed(self):
+        from unittest.mock import patch
+        from compliance.chain import verify
+        from compliance.tiering import AuditTieringService
+        from core.archive import SegmentStore
+        verify()
+        self.assertEqual(AuditTieringService.seal(older_than_days=0, segment_size=2), 4)
+        self.assertEqual(AuditSegment.objects.count(), 2)
+
+        with patch.object(SegmentStore, 'read_segment', autospec=True, side_effect=SegmentStore.read_segment) as read_segment:
+            records = AuditTieringService.read()
+            self.assertEqual(next(records).sequence, 4)
+            self.assertEqual(read_segment.call_count, 1)
+            self.assertEqual([record.sequence for record in records], [3, 2, 1])
+            self.assertEqual(read_segment.call_count, 2)
+
 class BlacklistTestCase(TestCase):
     def setUp(self):
         self.admin = User.objects.create_user(username='admin', password='password', is_staff=True)
@@ -210,6 +666,174 @@ class BlacklistTestCase(TestCase):
         self.assertIn("blocked", str(cm.exception))
         self.assertEqual(self.borrower.balance, Decimal('0.00'))
 
+    def test_membership_checks_are_served_from_memory(self):
+        from compliance.blacklist_cache import BlacklistMembership, membership
+        from compliance.services import BlacklistService
+        membership.reset()
+        other_process = BlacklistMembership()
+        with self.assertNumQueries(2):  # each process loads the set once
+            self.assertFalse(BlacklistService.is_blacklisted(self.borrower))
+            self.assertFalse(other_process.contains(self.admin.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(BlacklistService.is_blacklisted(self.borrower))
+            self.assertFalse(other_process.contains(self.borrower.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistService.add_to_blacklist(self.borrower, "Fraud", self.admin)
+            # Visible to the writer before commit, not yet published to other processes
+            self.assertTrue(BlacklistService.is_blacklisted(self.borrower))
+            with self.assertNumQueries(0):
+                self.assertFalse(other_process.contains(self.borrower.pk))
+
+        # The commit bumped the shared version: each process reloads once
+        with self.assertNumQueries(1):
+            self.assertTrue(other_process.contains(self.borrower.pk))
+        with self.assertNumQueries(1):
+            self.assertTrue(BlacklistService.is_blacklisted(self.borrower))
+        with self.assertNumQueries(0):
+            self.assertTrue(BlacklistService.is_blacklisted(self.borrower))
+
+    def test_every_blacklist_write_is_published(self):
+        from compliance.blacklist_cache import BlacklistMembership
+        from compliance.models import Blacklist
+        other_process = BlacklistMembership()
+        self.assertFalse(other_process.contains(self.borrower.pk))
+
+        # An admin edit goes through save(), not BlacklistService
+        self.client.force_login(self.admin)
+        self.admin.is_superuser = True
+        self.admin.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/compliance/blacklist/add/', {
+                'user': self.borrower.pk, 'reason': "Added in admin", 'is_active': 'on'
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(other_process.contains(self.borrower.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Blacklist.objects.filter(user=self.borrower).update(is_active=False)
+        self.assertFalse(other_process.contains(self.borrower.pk))
+
+    def test_rolled_back_writes_stop_bypassing_the_set(self):
+        from django.db import transaction
+        from compliance.blacklist_cache import membership
+        from compliance.models import Blacklist
+        membership.reset()
+        membership.prime()
+        with self.assertNumQueries(0):
+            self.assertFalse(membership.contains(self.borrower.pk))
+
+        try:
+            with transaction.atomic():
+                Blacklist.objects.create(user=self.borrower, reason="Rolled back")
+                self.assertTrue(membership.contains(self.borrower.pk))  # read through while uncommitted
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with self.assertNumQueries(0):
+            self.assertFalse(membership.contains(self.borrower.pk))
+
+    def test_local_memory_cache_reloads_after_ttl(self):
+        from unittest.mock import patch
+        from compliance.blacklist_cache import BlacklistMembership
+        from compliance.models import Blacklist
+        other_process = BlacklistMembership()
+        self.assertFalse(other_process.contains(self.borrower.pk))
+        # A write in another process cannot reach this process's local cache
+        with patch.object(BlacklistMembership, 'invalidate'):
+            Blacklist.objects.create(user=self.borrower, reason="Elsewhere")
+        with self.assertNumQueries(0):
+            self.assertFalse(other_process.contains(self.borrower.pk))
+        other_process._loaded_at -= 60
+        with self.assertNumQueries(1):
+            self.assertTrue(other_process.contains(self.borrower.pk))
+
+    def test_watchlist_screening_blacklists_confirmed_matches(self):
+        import datetime
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        from accounts.models import KYCProfile
+        from compliance.blacklist_cache import membership
+        from compliance.models import Blacklist
+        from compliance.screening import ScreeningService, WatchlistEntry, WatchlistIndex
+
+        def person(username, full_name, id_number, dob=datetime.date(1980, 1, 1)):
+            user = User.objects.create_user(username=username, password='password')
+            KYCProfile.objects.create(user=user, full_name=full_name, id_number=id_number, date_of_birth=dob)
+            return user
+
+        reordered = person('jose', "José Álvarez-Núñez", 'P-1')
+        by_id = person('mary', "Mary Jones", 'x9-55')
+        typo = person('jon', "Jonathan Smyth", 'P-3')
+        person('other_dob', "Ivan Petrov", 'P-4', dob=datetime.date(1990, 5, 5))
+        person('clean', "Grace Hopper", 'P-5')
+
+        index = WatchlistIndex([
+            WatchlistEntry("NUNEZ, Jose Alvarez", date_of_birth=datetime.date(1980, 1, 1), reference='OFAC-1'),
+            WatchlistEntry("M. J.", id_number='X955', reference='FRAUD-7'),
+            WatchlistEntry("Jonathon Smith"),
+            WatchlistEntry("Ivan Petrov", date_of_birth=datetime.date(1970, 1, 1)),
+        ])
+        matches = {m.user_id: m for m in ScreeningService.screen(index)}
+        self.assertEqual(set(matches), {reordered.pk, by_id.pk, typo.pk})
+        self.assertEqual((matches[by_id.pk].reason, matches[by_id.pk].confirmed), ('id_number', True))
+        self.assertEqual((matches[reordered.pk].reason, matches[reordered.pk].confirmed), ('name_date_of_birth', True))
+        self.assertFalse(matches[typo.pk].confirmed)  # similar enough to review, not to blacklist
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(
+                "name,id_number,date_of_birth,reference\n"
+                "NUNEZ Jose Alvarez,,1980-01-01,OFAC-1\nM. J.,X955,,FRAUD-7\nJonathon Smith,,,\n"
+            )
+        self.addCleanup(os.unlink, handle.name)
+        out = StringIO()
+        call_command('screen_watchlist', handle.name, source='OFAC', dry_run=True, stdout=out)
+        self.assertIn("3 matches, 2 confirmed, 1 for review.", out.getvalue())
+        self.assertFalse(Blacklist.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('screen_watchlist', handle.name, source='OFAC', actor='admin', stdout=out)
+        self.assertEqual(set(Blacklist.objects.values_list('user_id', flat=True)), {reordered.pk, by_id.pk})
+        self.assertTrue(User.objects.get(pk=by_id.pk).is_blacklisted)
+        self.assertTrue(membership.contains(reordered.pk))
+        self.assertEqual(AuditLog.objects.filter(
+            event_type=AuditEventType.USER_BLACKLISTED, metadata__watchlist='OFAC', actor=self.admin
+        ).count(), 2)
+
+        # Screening again does not blacklist anyone twice
+        self.assertEqual(ScreeningService.blacklist_matches(ScreeningService.screen(index), 'OFAC'), [])
+
+    def test_name_only_watchlist_matches_are_left_for_review(self):
+        import datetime
+        from accounts.models import KYCProfile
+        from compliance.models import Blacklist
+        from compliance.screening import ScreeningService, WatchlistEntry, WatchlistIndex
+
+        def person(username, dob):
+            user = User.objects.create_user(username=username, password='password')
+            KYCProfile.objects.create(user=user, full_name="John Smith", id_number=username, date_of_birth=dob)
+            return user
+
+        listed = person('smith_listed', datetime.date(1975, 3, 3))
+        namesake = person('smith_namesake', datetime.date(1990, 9, 9))
+
+        index = WatchlistIndex([WatchlistEntry("John Smith", date_of_birth=datetime.date(1975, 3, 3))])
+        matches = {m.user_id: m for m in ScreeningService.screen(index)}
+        self.assertEqual(set(matches), {listed.pk})  # a different date of birth is not a match
+        self.assertEqual((matches[listed.pk].score, matches[listed.pk].confirmed), (1.0, True))
+
+        # Without a date of birth on the watchlist, an exact name is only reported
+        undated_index = WatchlistIndex([WatchlistEntry("John Smith")])
+        matches = list(ScreeningService.screen(undated_index))
+        self.assertEqual({m.user_id for m in matches}, {listed.pk, namesake.pk})
+        self.assertEqual({(m.reason, m.score, m.confirmed) for m in matches}, {('name', 1.0, False)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(ScreeningService.blacklist_matches(matches, 'OFAC'), [])
+            ScreeningService.blacklist_matches(ScreeningService.screen(index), 'OFAC')
+        self.assertEqual(list(Blacklist.objects.values_list('user_id', flat=True)), [listed.pk])
+
 class AdminSafeguardTestCase(TestCase):
     def setUp(self):
         self.admin = User.objects.create_user(username='superadmin', password='password', role='ADMIN', is_staff=True)
@@ -375,3 +999,355 @@ class ReportingTestCase(TestCase):
         self.assertEqual(response.data['total_disbursed_count'], 2)
         self.assertEqual(response.data['default_count'], 1)
         self.assertEqual(response.data['default_rate'], 50.0)
+
+    def test_late_payments_report(self):
+        """Test DB-side days/amount overdue, aging buckets, pagination and CSV."""
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+        today = timezone.now().date()
+        for days, penalty in [(5, 0), (40, 10), (45, 0), (120, 25)]:
+            LoanInstallment.objects.create(
+                loan=self.loan, due_date=today - timezone.timedelta(days=days),
+                principal_expected=100, interest_expected=10, penalty_expected=penalty,
+                principal_paid=20, status=LoanInstallment.Status.OVERDUE
+            )
+
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        url = reverse('compliance-reports-late-payments')
+
+        response = client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4)
+        self.assertIsNotNone(response.data['next'])
+        first = response.data['results'][0]
+        self.assertEqual((first['days_overdue'], Decimal(first['amount_overdue'])), (120, Decimal('115.00')))
+        self.assertEqual(
+            [(b['bucket'], b['count'], Decimal(b['amount_overdue'])) for b in response.data['aging_buckets']],
+            [('1-30', 1, Decimal('90')), ('31-60', 2, Decimal('190')), ('61-90', 0, Decimal('0')), ('90+', 1, Decimal('115'))]
+        )
+
+        response = client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[1].split(',')[4:], ['120', '115.00'])
+
+    def test_exposure_uses_outstanding_principal_and_streams_gzip(self):
+        import gzip
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+        LoanInstallment.objects.create(
+            loan=self.loan, due_date=timezone.now().date(),
+            principal_expected=400, interest_expected=40, principal_paid=300, interest_paid=40,
+            status=LoanInstallment.Status.PARTIAL
+        )
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        url = reverse('compliance-reports-exposure')
+
+        self.assertEqual(Decimal(client.get(url).data[0]['total_exposure']), Decimal('1700.00'))
+
+        response = client.get(url, {'format': 'csv', 'compress': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(lines, ['Borrower ID,Username,Total Exposure', f'{self.borrower.pk},borrower,1700.00'])
+
+class ReportSnapshotTests(TestCase):
+    def setUp(self):
+        ReportingTestCase.setUp(self)
+        self.today = timezone.now().date()
+        self.yesterday = self.today - timezone.timedelta(days=1)
+
+    def _late(self, days, **fields):
+        fields.setdefault('status', LoanInstallment.Status.OVERDUE)
+        return LoanInstallment.objects.create(
+            loan=self.loan, due_date=self.today - timezone.timedelta(days=days),
+            principal_expected=100, interest_expected=10, **fields
+        )
+
+    def _build_yesterday(self, report):
+        # Only today's snapshot can be built, so replay yesterday's run
+        from unittest.mock import patch
+        from compliance.snapshots import ReportSnapshotService
+        with patch('compliance.snapshots.timezone.now', return_value=timezone.now() - timezone.timedelta(days=1)):
+            return ReportSnapshotService.build(report)
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        from compliance.snapshots import ReportSnapshotService
+        stale = self._late(30)
+        kept = self._late(31)
+        first = self._build_yesterday('late_payments')
+        self.assertEqual([r['days_overdue'] for r in first.data['rows']], [30, 29])
+        exposure = self._build_yesterday('exposure')
+        self.assertEqual(exposure.data['rows'][0]['total_exposure'], '2000.00')
+
+        stale.apply_funds(0, 10, 100)  # paid off: drops out of the report
+        self._late(1, principal_paid=40, status=LoanInstallment.Status.PARTIAL)
+        due_today = self._late(0)  # not late yet as of today
+
+        snapshot = ReportSnapshotService.build('late_payments')
+        self.assertTrue(snapshot.is_incremental)
+        self.assertEqual([(r['installment_id'], r['days_overdue']) for r in snapshot.data['rows']], [(kept.pk, 31)])
+        self.assertEqual(snapshot.data, ReportSnapshotService.build('late_payments', full=True).data)
+        self.assertNotIn(due_today.pk, [r['installment_id'] for r in snapshot.data['rows']])
+
+        exposure = ReportSnapshotService.build('exposure')
+        self.assertTrue(exposure.is_incremental)
+        self.assertEqual(exposure.data['rows'], [
+            {'borrower': self.borrower.pk, 'username': 'borrower', 'total_exposure': '1860.00'}
+        ])
+
+    def test_late_commits_before_the_watermark_are_picked_up(self):
+        from compliance.snapshots import ReportSnapshotService
+        late = self._late(5)
+        ReportSnapshotService.build('late_payments')
+
+        # Saved just before the previous build started, committed after it
+        LoanInstallment.objects.filter(pk=late.pk).update(
+            status=LoanInstallment.Status.PAID, principal_paid=100, interest_paid=10,
+            updated_at=timezone.now() - timezone.timedelta(minutes=1)
+        )
+        snapshot = ReportSnapshotService.build('late_payments')
+        self.assertTrue(snapshot.is_incremental)
+        self.assertEqual(snapshot.data['rows'], [])
+
+    def test_past_snapshots_are_frozen(self):
+        from io import StringIO
+        from django.core.management import call_command, CommandError
+        from compliance.snapshots import ReportSnapshotService, SnapshotFrozen
+        call_command('snapshot_compliance_reports', as_of=self.today.isoformat(), stdout=StringIO())
+        self.assertEqual(
+            set(ReportSnapshot.objects.filter(as_of=self.today).values_list('report', flat=True)),
+            {'exposure', 'default_metrics', 'late_payments'}
+        )
+        ReportSnapshot.objects.update(as_of=self.yesterday)
+        with self.assertRaises(SnapshotFrozen):
+            ReportSnapshotService.build('exposure', self.yesterday)
+        with self.assertRaises(CommandError):
+            call_command('snapshot_compliance_reports', as_of=self.yesterday.isoformat(), stdout=StringIO())
+
+    def test_snapshots_are_only_built_as_of_today(self):
+        from io import StringIO
+        from django.core.management import call_command, CommandError
+        from compliance.snapshots import ReportSnapshotService, SnapshotFrozen
+        self._late(10)
+        # Live tables only describe today: other dates would be mislabelled
+        for as_of in (self.yesterday, self.today + timezone.timedelta(days=1)):
+            with self.assertRaises(SnapshotFrozen):
+                ReportSnapshotService.build('late_payments', as_of)
+        with self.assertRaises(CommandError):
+            call_command('snapshot_compliance_reports', as_of=self.yesterday.isoformat(), stdout=StringIO())
+        self.assertFalse(ReportSnapshot.objects.exists())
+
+    def test_endpoints_serve_snapshots_by_date(self):
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+        from compliance.snapshots import ReportSnapshotService
+        self._late(10)
+        self._build_yesterday('default_metrics')
+        self._build_yesterday('late_payments')
+        self.loan.status = Loan.Status.DEFAULTED
+        self.loan.is_active = False
+        self.loan.save()
+
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        url = reverse('compliance-reports-default-metrics')
+        response = client.get(url, {'as_of': self.yesterday.isoformat()})
+        self.assertEqual((response.status_code, response.data['default_count']), (200, 0))
+        self.assertEqual(response['X-Report-As-Of'], self.yesterday.isoformat())
+        self.assertEqual(client.get(url).data['default_count'], 1)
+        self.assertEqual(client.get(url, {'as_of': self.today.isoformat()}).data['default_count'], 1)
+        self.assertEqual(client.get(url, {'as_of': '2001-01-31'}).status_code, 404)
+        self.assertEqual(client.get(url, {'as_of': 'last-month'}).status_code, 400)
+
+        response = client.get(reverse('compliance-reports-late-payments'), {'as_of': self.yesterday.isoformat()})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['days_overdue'], 9)
+        self.assertEqual(response.data['aging_buckets'][0]['count'], 1)
+
+        response = client.get(reverse('compliance-reports-exposure'), {'as_of': self.today.isoformat(), 'format': 'csv'})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), ['Borrower ID,Username,Total Exposure'])
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        import tempfile
+        ReportingTestCase.setUp(self)
+        self.output_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_root.cleanup)
+        settings_override = override_settings(REPORT_OUTPUT_ROOT=self.output_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        from rest_framework.test import APIClient
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _submit(self, **data):
+        from unittest.mock import patch
+        from django.urls import reverse
+        from compliance.jobs import ReportJobService
+        with patch.object(ReportJobService, 'pool') as pool, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('compliance-report-jobs-list'), data, format='json')
+        return response, pool.return_value.submit
+
+    def test_identical_requests_share_one_job(self):
+        from compliance.models import ReportJob
+        first, submit = self._submit(report='exposure')
+        self.assertEqual((first.status_code, first.data['status']), (202, 'QUEUED'))
+        submit.assert_called_once()
+        second, submit = self._submit(report='exposure')
+        self.assertEqual(second.data['id'], first.data['id'])
+        submit.assert_not_called()
+
+        other, _ = self._submit(report='exposure', compress='gzip')
+        self.assertNotEqual(other.data['id'], first.data['id'])
+        self.assertEqual(ReportJob.objects.count(), 2)
+        self.assertEqual(
+            AuditLog.objects.filter(description__startswith="Compliance report export queued").count(), 2
+        )
+
+    def test_worker_writes_file_served_with_ranges(self):
+        from django.urls import reverse
+        from compliance.jobs import ReportJobService
+        response, submit = self._submit(report='exposure')
+        job_id = response.data['id']
+        download = reverse('compliance-report-jobs-download', args=[job_id])
+        self.assertEqual(self.client.get(download).status_code, 409)
+
+        fn, args = submit.call_args[0][0], submit.call_args[0][1:]
+        fn(*args)
+        ReportJobService.run(job_id)  # already claimed: no-op
+
+        job = self.client.get(reverse('compliance-report-jobs-detail', args=[job_id])).data
+        self.assertEqual((job['status'], job['progress'], job['total_rows'], job['rows_written']), ('DONE', 100.0, 1, 1))
+
+        response = self.client.get(download)
+        body = b''.join(response.streaming_content)
+        self.assertEqual(body.decode().splitlines(), ['Borrower ID,Username,Total Exposure', f'{self.borrower.pk},borrower,2000.00'])
+        self.assertEqual((response['Accept-Ranges'], int(response['Content-Length'])), ('bytes', len(body)))
+
+        response = self.client.get(download, HTTP_RANGE='bytes=7-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 7-{len(body) - 1}/{len(body)}')
+        self.assertEqual(b''.join(response.streaming_content), body[7:])
+        response = self.client.get(download, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), body[-4:])
+        self.assertEqual(self.client.get(download, HTTP_RANGE=f'bytes={len(body)}-').status_code, 416)
+
+        # A finished job no longer absorbs new requests
+        self.assertNotEqual(self._submit(report='exposure')[0].data['id'], job_id)
+
+    def test_failed_and_stale_jobs(self):
+        from compliance.jobs import ReportJobService, STALE_AFTER
+        from compliance.models import ReportJob
+        response, _ = self._submit(report='late_payments', as_of=timezone.now().date().isoformat())
+        self.assertEqual(response.status_code, 400)
+
+        job, created = ReportJobService.submit('late_payments', {})
+        ReportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - STALE_AFTER * 2)
+        retry, created = ReportJobService.submit('late_payments', {})
+        self.assertTrue(created)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('FAILED', "Worker stopped responding."))
+
+        self.assertEqual(self.client.post('/compliance/api/report-jobs/', {'report': 'audit'}).status_code, 400)
+
+        # The identical job finished between the failed insert and the re-read
+        from unittest.mock import patch
+        from django.db import IntegrityError
+        create = ReportJob.objects.create
+        attempts = []
+
+        def create_once_conflicting(**fields):
+            attempts.append(fields)
+            if len(attempts) == 1:
+                raise IntegrityError
+            return create(**fields)
+
+        with patch.object(ReportJob.objects, 'create', side_effect=create_once_conflicting):
+            job, created = ReportJobService.submit('exposure', {'retry': True})
+        self.assertEqual((created, len(attempts), job.status), (True, 2, ReportJob.Status.QUEUED))
+        self.client.force_authenticate(user=self.borrower)
+        self.assertEqual(self.client.post('/compliance/api/report-jobs/', {'report': 'exposure'}).status_code, 403)
+
+    def test_queued_jobs_lost_with_their_pool_are_swept(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from compliance.jobs import ReportJobService, QUEUED_GRACE, STALE_AFTER
+        from compliance.models import ReportJob
+        lost, _ = ReportJobService.submit('exposure', {})  # never handed to a pool
+        fresh, _ = ReportJobService.submit('late_payments', {})
+        dead, _ = ReportJobService.submit('default_metrics', {})
+        ReportJob.objects.filter(pk=lost.pk).update(created_at=timezone.now() - QUEUED_GRACE * 2)
+        ReportJob.objects.filter(pk=dead.pk).update(
+            status=ReportJob.Status.RUNNING, heartbeat_at=timezone.now() - STALE_AFTER * 2
+        )
+
+        call_command('run_report_jobs', stdout=StringIO())
+        statuses = dict(ReportJob.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            (statuses[lost.pk], statuses[fresh.pk], statuses[dead.pk]),
+            (ReportJob.Status.DONE, ReportJob.Status.QUEUED, ReportJob.Status.FAILED)
+        )
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+@unittest.skipUnless(pq, "pyarrow is not installed")
+class ParquetExportTests(TestCase):
+    def setUp(self):
+        import tempfile
+        ReportingTestCase.setUp(self)
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def test_exports_typed_month_partitions_in_chunks(self):
+        import datetime
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        for month, day in [(1, 5), (1, 20), (1, 28), (2, 3)]:
+            LoanInstallment.objects.create(
+                loan=self.loan, due_date=datetime.date(2026, month, day),
+                principal_expected=Decimal('333.33'), interest_expected=10
+            )
+
+        call_command('export_parquet', dataset=['installments', 'loans'], chunk_size=2,
+                     output=self.root.name, stdout=StringIO())
+
+        january = pq.ParquetFile(f"{self.root.name}/installments/month=2026-01/data.parquet")
+        self.assertEqual((january.metadata.num_rows, january.metadata.num_row_groups), (3, 2))
+        table = january.read()
+        self.assertEqual(str(table.schema.field('principal_expected').type), 'decimal128(12, 2)')
+        self.assertEqual(str(table.schema.field('due_date').type), 'date32[day]')
+        self.assertEqual(table.column('principal_expected')[0].as_py(), Decimal('333.33'))
+        self.assertEqual(table.column('loan_id').to_pylist(), [self.loan.pk] * 3)
+        self.assertEqual(pq.read_table(f"{self.root.name}/installments/month=2026-02/data.parquet").num_rows, 1)
+
+        from payments.models import Payment
+        payment = Payment.objects.create(
+            user=self.borrower, loan=self.loan, amount=Decimal('12.5'), payment_method='WALLET',
+            idempotency_key='pq-1', metadata={'source': 'test'}
+        )
+        call_command('export_parquet', dataset=['payments'], output=self.root.name, stdout=StringIO())
+        payments = pq.read_table(f"{self.root.name}/payments").to_pylist()
+        self.assertEqual(
+            [(p['id'], p['amount'], p['metadata'], p['created_at']) for p in payments],
+            [(payment.pk, Decimal('12.50'), '{"source": "test"}', payment.created_at)]
+        )
+
+        loans = pq.read_table(f"{self.root.name}/loans")
+        self.assertEqual(loans.column('principal').to_pylist(), [Decimal('2000.00')])
+        self.assertEqual(str(loans.schema.field('disbursement_date').type), 'timestamp[us, tz=UTC]')
+
+        # Re-exporting a month replaces its file, or removes it once empty
+        LoanInstallment.objects.filter(due_date__month=1).delete()
+        call_command('export_parquet', dataset=['installments'], from_month='2026-01', to_month='2026-01',
+                     output=self.root.name, stdout=StringIO())
+        self.assertFalse(os.path.exists(f"{self.root.name}/installments/month=2026-01"))
+        self.assertTrue(os.path.exists(f"{self.root.name}/installments/month=2026-02/data.parquet"))
@@ -0,0 +1,237 @@
+import heapq
+import itertools
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.archive import SegmentStore
+from .models import AuditLog, AuditCheckpoint, AuditSegment
+from .search import record_tokens, tokenize
+
+DEFAULT_HOT_RETENTION_DAYS = 365
+SEGMENT_SIZE = 10000
+
+
+def target_key(content_type_id, object_id):
+    return f"{content_type_id}:{object_id}"
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _newest_first(record):
+    # heapq pops the smallest key first
+    return (-((record.created_at - _EPOCH) // timedelta(microseconds=1)), -record.pk)
+
+
+class AuditTieringService:
+    """
+    Seals old AuditLog rows into compressed, checksummed segment files
+    (core.archive.SegmentStore, one partition per month) and reads them
+    back transparently.
+
+    Only rows covered by a verified chain checkpoint are sealed, so
+    verify_audit_chain never meets a gap; rows written before chaining
+    are sealed by age alone. Each sealed record keeps its chain hashes,
+    and verify_audit_chain --full re-hashes sealed records along with the
+    hot ones (see sealed_chain).
+    """
+
+    @staticmethod
+    def retention_days():
+        return getattr(settings, 'AUDIT_HOT_RETENTION_DAYS', DEFAULT_HOT_RETENTION_DAYS)
+
+    @staticmethod
+    def store():
+        root = getattr(settings, 'AUDIT_ARCHIVE_ROOT', os.path.join(settings.BASE_DIR, 'archive', 'audit'))
+        return SegmentStore(root)
+
+    @classmethod
+    def sealable(cls, older_than_days=None):
+        days = cls.retention_days() if older_than_days is None else older_than_days
+        verified_up_to = AuditCheckpoint.objects.filter(
+            verified_at__isnull=False
+        ).aggregate(last=Max('sequence'))['last'] or 0
+        return AuditLog.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=days), chain_pending=False
+        ).filter(Q(sequence__isnull=True) | Q(sequence__lte=verified_up_to))
+
+    @classmethod
+    def seal(cls, older_than_days=None, segment_size=SEGMENT_SIZE):
+        """
+        Moves sealable rows to cold storage, oldest month first.
+        A segment and its manifest row are written before the rows are
+        deleted, so an interrupted run never loses records; readers
+        de-duplicate by id if a month is sealed twice.
+        Returns the number of rows sealed.
+        """
+        store = cls.store()
+        candidates = cls.sealable(older_than_days)
+        months = candidates.annotate(month=TruncMonth('created_at')).values_list('month', flat=True).distinct()
+
+        sealed = 0
+        for month in sorted(months):
+            month_rows = candidates.filter(
+                created_at__gte=month,
+                created_at__lt=(month + timedelta(days=32)).replace(day=1)
+            ).order_by('created_at', 'id')
+            while True:
+                batch = list(month_rows.values()[:segment_size])
+                if not batch:
+                    break
+                for row in batch:
+                    row['target'] = target_key(row['content_type_id'], row['object_id'])
+                entry = store.write_segment(f"{month:%Y-%m}", batch, key_field='target')
+                sequences = [row['sequence'] for row in batch if row['sequence'] is not None]
+                with transaction.atomic():
+                    AuditSegment.objects.create(
+                        partition=f"{month:%Y-%m}",
+                        name=entry['name'],
+                        rows=entry['rows'],
+                        sha256=entry['sha256'],
+                        min_time=parse_datetime(entry['min_time']),
+                        max_time=parse_datetime(entry['max_time']),
+                        min_sequence=min(sequences) if sequences else None,
+                        max_sequence=max(sequences) if sequences else None,
+                    )
+                    # Queryset delete: AuditLog.delete() refuses single-row deletes
+                    AuditLog.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+                sealed += len(batch)
+        return sealed
+
+    @classmethod
+    def verify_segments(cls):
+        """
+        Returns the manifest entries whose file is missing or no longer
+        matches the checksum recorded in the manifest.
+        """
+        store = cls.store()
+        broken = []
+        for segment in AuditSegment.objects.order_by('min_time'):
+            try:
+                if store.checksum(segment.partition, segment.name) != segment.sha256:
+                    broken.append(segment)
+            except (OSError, EOFError):
+                broken.append(segment)
+        return broken
+
+    @classmethod
+    def read(cls, content_type=None, object_id=None, since=None, until=None, before=None):
+        """
+        Yields sealed records as unsaved AuditLog instances (flagged
+        `archived`), newest first. `before` is a (created_at, id) keyset
+        bound, as used by the search API.
+
+        Segments are opened newest first, and only once no record already
+        read could be newer than what they hold, so a caller that stops
+        early only decompresses the segments it needed.
+        """
+        store = cls.store()
+        segments = AuditSegment.objects.all()
+        if since is not None:
+            segments = segments.filter(max_time__gte=since)
+        if until is not None:
+            segments = segments.filter(min_time__lt=until)
+        if before is not None:
+            segments = segments.filter(min_time__lte=before[0])
+
+        if content_type is not None and object_id is not None:
+            key = target_key(content_type.pk, object_id)
+            wanted = set()
+            for partition in segments.values_list('partition', flat=True).distinct():
+                wanted.update((partition, name) for name in store.segments_with_key(partition, key))
+            segments = [s for s in segments.order_by('-max_time', '-id') if (s.partition, s.name) in wanted]
+        else:
+            segments = list(segments.order_by('-max_time', '-id'))
+
+        heap = []
+        order = itertools.count()
+        last_key = None
+        position = 0
+        while True:
+            # A segment may hold records newer than anything read so far until
+            # the newest pending record is past its max_time
+            while position < len(segments) and (not heap or segments[position].max_time >= heap[0][2].created_at):
+                segment = segments[position]
+                position += 1
+                for row in store.read_segment(segment.partition, segment.name):
+                    record = cls._to_instance(row)
+                    if cls._matches(record, content_type, object_id, since, until, before):
+                        heapq.heappush(heap, (_newest_first(record), next(order), record))
+            if not heap:
+                return
+            key, _, record = heapq.heappop(heap)
+            # A month sealed twice has its rows in two segments
+            if key != last_key:
+                last_key = key
+                yield record
+
+    @classmethod
+    def sealed_chain(cls):
+        """
+        Yields sealed chain records as unsaved AuditLog instances in sequence
+        order. Segments are opened in min_sequence order, only once no record
+        already read could come after what they hold.
+        """
+        store = cls.store()
+        segments = list(AuditSegment.objects.filter(min_sequence__isnull=False).order_by('min_sequence', 'id'))
+        heap = []
+        order = itertools.count()
+        last_sequence = None
+        position = 0
+        while True:
+            while position < len(segments) and (not heap or segments[position].min_sequence <= heap[0][0]):
+                segment = segments[position]
+                position += 1
+                for row in store.read_segment(segment.partition, segment.name):
+                    if row.get('sequence') is not None:
+                        heapq.heappush(heap, (row['sequence'], next(order), cls._to_instance(row)))
+            if not heap:
+                return
+            sequence, _, record = heapq.heappop(heap)
+            # A month sealed twice has its rows in two segments
+            if sequence != last_sequence:
+                last_sequence = sequence
+                yield record
+
+    @staticmethod
+    def _to_instance(row):
+        row = dict(row)
+        row.pop('target', None)
+        row['created_at'] = parse_datetime(row['created_at'])
+        record = AuditLog(**row)
+        record.archived = True
+        return record
+
+    @staticmethod
+    def _matches(record, content_type, object_id, since, until, before):
+        if content_type is not None and record.content_type_id != content_type.pk:
+            return False
+        if object_id is not None and record.object_id != str(object_id):
+            return False
+        if since is not None and record.created_at < since:
+            return False
+        if until is not None and record.created_at >= until:
+            return False
+        if before is not None and (record.created_at, record.pk) >= before:
+            return False
+        return True
+
+
+def filter_archived(records, actor=None, event_types=None, query=None):
+    """
+    Applies the search API's remaining filters to sealed records in memory.
+    """
+    words = set(tokenize(query)) if query else set()
+    for record in records:
+        if actor is not None and record.actor_id != actor:
+            continue
+        if event_types and record.event_type not in event_types:
+            continue
+        if words and not words.issubset(record_tokens(record)):
+            continue
+        yield record
@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .api import ComplianceReportViewSet
+from .api import ComplianceReportViewSet, AuditLogSearchViewSet, ReportJobViewSet
 
 router = DefaultRouter()
 router.register(r'reports', ComplianceReportViewSet, basename='compliance-reports')
+router.register(r'audit', AuditLogSearchViewSet, basename='compliance-audit')
+router.register(r'report-jobs', ReportJobViewSet, basename='compliance-report-jobs')
 
 urlpatterns = [
     path('api/', include(router.urls)),
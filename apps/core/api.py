@@ -0,0 +1,42 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .models import UploadSession
+from .serializers import UploadSessionSerializer
+from .uploads import UploadError, UploadService
+
+
+class UploadSessionViewSet(viewsets.ViewSet):
+    """
+    Chunks and status of an upload opened by a document endpoint's
+    `start_upload`. PUT each chunk's raw bytes to chunks/<index>/
+    (optionally with an X-Chunk-SHA256 header); GET lists the chunks still
+    missing, so an interrupted upload resumes where it stopped.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'key'
+    lookup_value_regex = r'[0-9a-f-]{36}'
+
+    def _session(self, request, key):
+        return get_object_or_404(UploadSession, key=key, owner=request.user)
+
+    def retrieve(self, request, key=None):
+        return Response(UploadSessionSerializer(self._session(request, key)).data)
+
+    def destroy(self, request, key=None):
+        UploadService.abort(self._session(request, key))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, key=None, index=None):
+        session = self._session(request, key)
+        if request.stream is None:
+            return Response({'error': "Chunk body is empty."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            session = UploadService.write_chunk(
+                session, int(index), request.stream, expected_sha256=request.headers.get('X-Chunk-SHA256')
+            )
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data)
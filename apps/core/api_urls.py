@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .api import UploadSessionViewSet
+
+router = DefaultRouter()
+router.register(r'', UploadSessionViewSet, basename='upload')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,179 @@
+import bisect
+import contextlib
+import datetime
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """
+    Keeps full microsecond precision on datetimes (DjangoJSONEncoder
+    truncates to milliseconds), so archived values match the originals.
+    """
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class SegmentStore:
+    """
+    Append-only archive of gzip-compressed JSONL segment files.
+
+    Layout: <root>/<partition>/<segment>.jsonl.gz, a sorted list of the
+    segment's lookup keys (e.g. payment ids) beside it in <segment>.keys,
+    and one small <root>/<partition>/index.json per partition listing each
+    segment (row count, checksum, created_at and key range). Writers update
+    the index under an exclusive lock on index.lock, so concurrent seals of
+    one partition do not drop each other's entries. A lookup skips
+    segments whose key range excludes the key, binary-searches the key files
+    of the rest and only decompresses the segments that hold the key.
+    """
+    INDEX_NAME = 'index.json'
+    LOCK_NAME = 'index.lock'
+    KEYS_SUFFIX = '.keys'
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def partitions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def read_index(self, partition):
+        path = os.path.join(self.root, partition, self.INDEX_NAME)
+        if not os.path.exists(path):
+            return {'segments': {}}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_json(self, partition, name, data):
+        directory = os.path.join(self.root, partition)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    def _write_index(self, partition, index):
+        self._write_json(partition, self.INDEX_NAME, index)
+
+    @contextlib.contextmanager
+    def _index_lock(self, partition):
+        with open(os.path.join(self.root, partition, self.LOCK_NAME), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def write_segment(self, partition, records, key_field, time_field='created_at'):
+        """
+        Writes `records` (dicts) as a new segment and registers it in the
+        partition index. Existing segments are never modified.
+        Returns the segment's index entry.
+        """
+        directory = os.path.join(self.root, partition)
+        os.makedirs(directory, exist_ok=True)
+        name = f"segment-{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        path = os.path.join(directory, name)
+
+        digest = hashlib.sha256()
+        keys = set()
+        min_time = max_time = None
+        rows = 0
+        with gzip.open(path + '.tmp', 'wb') as f:
+            for record in records:
+                line = (json.dumps(record, cls=ArchiveJSONEncoder, separators=(',', ':')) + '\n').encode('utf-8')
+                f.write(line)
+                digest.update(line)
+                rows += 1
+                keys.add(str(record[key_field]))
+                stamp = record.get(time_field)
+                stamp = stamp.isoformat() if hasattr(stamp, 'isoformat') else stamp
+                if stamp is not None:
+                    min_time = stamp if min_time is None else min(min_time, stamp)
+                    max_time = stamp if max_time is None else max(max_time, stamp)
+        keys = sorted(keys)
+        self._write_json(partition, name + self.KEYS_SUFFIX, keys)
+        os.replace(path + '.tmp', path)
+
+        entry = {
+            'rows': rows, 'sha256': digest.hexdigest(), 'min_time': min_time, 'max_time': max_time,
+            'min_key': keys[0] if keys else None, 'max_key': keys[-1] if keys else None,
+        }
+        with self._index_lock(partition):
+            index = self.read_index(partition)
+            index['segments'][name] = entry
+            self._write_index(partition, index)
+        return dict(entry, name=name)
+
+    def checksum(self, partition, name):
+        """
+        SHA-256 of the segment's uncompressed contents, as recorded when it
+        was written. Raises OSError if the file is missing or unreadable.
+        """
+        digest = hashlib.sha256()
+        with gzip.open(os.path.join(self.root, partition, name), 'rb') as f:
+            for line in f:
+                digest.update(line)
+        return digest.hexdigest()
+
+    def verify_segment(self, partition, name):
+        """
+        True if the segment's contents still match the checksum in the index.
+        """
+        entry = self.read_index(partition)['segments'].get(name)
+        if entry is None:
+            return False
+        try:
+            return self.checksum(partition, name) == entry['sha256']
+        except OSError:
+            return False
+
+    def read_segment(self, partition, name):
+        with gzip.open(os.path.join(self.root, partition, name), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def has_key(self, partition, name, key, index=None):
+        """
+        True if segment `name` holds a record with lookup key `key`.
+        """
+        key = str(key)
+        index = index or self.read_index(partition)
+        entry = index['segments'].get(name)
+        if entry is None:
+            return False
+        if entry['min_key'] is None or not entry['min_key'] <= key <= entry['max_key']:
+            return False
+        with open(os.path.join(self.root, partition, name + self.KEYS_SUFFIX), 'r', encoding='utf-8') as f:
+            keys = json.load(f)
+        position = bisect.bisect_left(keys, key)
+        return position < len(keys) and keys[position] == key
+
+    def segments_with_key(self, partition, key):
+        index = self.read_index(partition)
+        return [name for name in sorted(index['segments']) if self.has_key(partition, name, key, index)]
+
+    def lookup(self, key, key_field):
+        """
+        Yields every archived record whose `key_field` equals `key`.
+        """
+        key = str(key)
+        for partition in self.partitions():
+            for name in self.segments_with_key(partition, key):
+                for record in self.read_segment(partition, name):
+                    if str(record.get(key_field)) == key:
+                        yield record
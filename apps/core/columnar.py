@@ -0,0 +1,159 @@
+"""
+Columnar (Parquet) export of querysets for offline analytics.
+
+pyarrow is optional: it is imported on first use, and only the export
+commands need it installed (pip install pyarrow).
+"""
+import datetime
+import json
+import os
+import tempfile
+from decimal import Decimal
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models.functions import TruncMonth
+
+CHUNK_SIZE = 10000
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImproperlyConfigured("Parquet export requires pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def _column(pa, field):
+    """
+    (arrow type, value converter) for a concrete model field.
+    """
+    if isinstance(field, models.DecimalField):
+        exponent = Decimal(1).scaleb(-field.decimal_places)
+        return pa.decimal128(field.max_digits, field.decimal_places), lambda v: v if v is None else Decimal(v).quantize(exponent)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC'), None
+    if isinstance(field, models.DateField):
+        return pa.date32(), None
+    if isinstance(field, models.BooleanField):
+        return pa.bool_(), None
+    if isinstance(field, models.ForeignKey):
+        return _column(pa, field.target_field)
+    if isinstance(field, (models.AutoField, models.BigAutoField, models.IntegerField)):
+        return pa.int64(), None
+    if isinstance(field, models.FloatField):
+        return pa.float64(), None
+    if isinstance(field, models.JSONField):
+        return pa.string(), lambda v: v if v is None else json.dumps(v, cls=DjangoJSONEncoder, sort_keys=True)
+    return pa.string(), lambda v: v if v is None else str(v)
+
+
+class ParquetExporter:
+    """
+    Writes a model's rows to Hive-style month partitions:
+
+        <root>/<name>/month=YYYY-MM/data.parquet
+
+    Rows are read in chunks ordered by the partition field and written as
+    one Parquet row group per chunk, so memory stays bounded by the chunk
+    size whatever the table size. Each month file is written to a
+    temporary name and swapped in once complete; re-exporting a month
+    replaces it.
+    """
+
+    def __init__(self, name, queryset, partition_field, root, fields=None, chunk_size=CHUNK_SIZE):
+        self.pa = _arrow()
+        self.name = name
+        self.queryset = queryset
+        self.partition_field = partition_field
+        self.root = str(root)
+        self.chunk_size = chunk_size
+
+        model_fields = [f for f in queryset.model._meta.concrete_fields if fields is None or f.name in fields]
+        self.columns = [f.attname for f in model_fields]
+        types, self.converters = zip(*(_column(self.pa, f) for f in model_fields))
+        self.schema = self.pa.schema([
+            self.pa.field(column, arrow_type, nullable=f.null)
+            for column, arrow_type, f in zip(self.columns, types, model_fields)
+        ])
+
+    def partition_path(self, month):
+        return os.path.join(self.root, self.name, f"month={month:%Y-%m}", 'data.parquet')
+
+    def months(self):
+        return sorted(
+            self.queryset.annotate(_month=TruncMonth(self.partition_field))
+            .values_list('_month', flat=True).distinct().order_by()
+        )
+
+    def exported_months(self):
+        directory = os.path.join(self.root, self.name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            datetime.date.fromisoformat(entry[len('month='):] + '-01')
+            for entry in os.listdir(directory) if entry.startswith('month=')
+        )
+
+    def export(self, start_month=None, end_month=None):
+        """
+        Exports every month in [start_month, end_month] (dates, either
+        bound optional). Partitions in that range whose rows are all gone
+        are removed. Returns {month label: rows written}.
+        """
+        def in_range(month):
+            month = month.date() if isinstance(month, datetime.datetime) else month
+            if start_month and month < start_month.replace(day=1):
+                return False
+            return not (end_month and month > end_month.replace(day=1))
+
+        written = {}
+        for month in filter(in_range, self.months()):
+            next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+            rows = self.queryset.filter(**{
+                f'{self.partition_field}__gte': month, f'{self.partition_field}__lt': next_month
+            }).order_by(self.partition_field, 'pk')
+            written[f"{month:%Y-%m}"] = self._write(rows, self.partition_path(month))
+
+        for month in filter(in_range, self.exported_months()):
+            if f"{month:%Y-%m}" not in written:
+                path = self.partition_path(month)
+                if os.path.exists(path):
+                    os.unlink(path)
+                os.rmdir(os.path.dirname(path))
+        return written
+
+    def _write(self, queryset, path):
+        pq = self.pa.parquet
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        os.close(fd)
+        count = 0
+        try:
+            with pq.ParquetWriter(partial, self.schema, compression='zstd') as writer:
+                chunk = []
+                for row in queryset.values_list(*self.columns).iterator(chunk_size=self.chunk_size):
+                    chunk.append(row)
+                    if len(chunk) >= self.chunk_size:
+                        writer.write_table(self._table(chunk))
+                        count += len(chunk)
+                        chunk = []
+                if chunk or not count:
+                    writer.write_table(self._table(chunk))
+                    count += len(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+        return count
+
+    def _table(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(self.columns)
+        arrays = []
+        for values, convert, field in zip(columns, self.converters, self.schema):
+            if convert is not None:
+                values = [convert(v) for v in values]
+            arrays.append(self.pa.array(values, type=field.type))
+        return self.pa.Table.from_arrays(arrays, schema=self.schema)
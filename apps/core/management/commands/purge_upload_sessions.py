@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.uploads import UploadService
+
+
+class Command(BaseCommand):
+    help = "Delete expired, unfinished chunked uploads and their partial files (run hourly or nightly)."
+
+    def handle(self, *args, **options):
+        purged = UploadService.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired upload sessions."))
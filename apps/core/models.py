@@ -1,3 +1,4 @@
+import uuid
 from django.conf import settings
 from django.db import models
 
@@ -11,3 +12,24 @@ class Transaction(models.Model):
 
 	def __str__(self):
 		return f"Transaction {self.id} - {self.user} - {self.amount}"
+
+
+class UploadSession(models.Model):
+	"""
+	A resumable, chunked upload in progress (see core.uploads).
+	"""
+	key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+	owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+	# What the finished file becomes, e.g. 'application_document' for application 12
+	purpose = models.CharField(max_length=50)
+	target_id = models.PositiveBigIntegerField()
+	document_type = models.CharField(max_length=50)
+	file_name = models.CharField(max_length=255)
+	total_size = models.PositiveBigIntegerField()
+	# {chunk index: sha256 hex} for every chunk received so far
+	chunk_hashes = models.JSONField(default=dict)
+	created_at = models.DateTimeField(auto_now_add=True)
+	expires_at = models.DateTimeField()
+
+	def __str__(self):
+		return f"Upload {self.key} - {self.file_name} ({len(self.chunk_hashes)} chunks received)"
@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+import os
+
+
+class RecordFormat:
+    CSV = 'csv'
+    JSONL = 'jsonl'
+
+    @classmethod
+    def detect(cls, filename, default=CSV):
+        ext = os.path.splitext(filename or '')[1].lower()
+        if ext in ('.jsonl', '.ndjson', '.json'):
+            return cls.JSONL
+        if ext in ('.csv', '.txt'):
+            return cls.CSV
+        return default
+
+
+def iter_records(fileobj, fmt):
+    """
+    Streams records from a CSV or JSONL file one line at a time.
+    Yields (row_number, record, error) so callers can report bad rows
+    without aborting the whole file. Never loads the file into memory.
+    """
+    raw = getattr(fileobj, 'file', fileobj)
+    if hasattr(raw, 'seek'):
+        raw.seek(0)
+    text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+    try:
+        if fmt == RecordFormat.JSONL:
+            for row_number, line in enumerate(text, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield row_number, None, f"Invalid JSON: {e}"
+                    continue
+                if not isinstance(record, dict):
+                    yield row_number, None, "Each line must be a JSON object."
+                    continue
+                yield row_number, record, None
+        else:
+            reader = csv.DictReader(text)
+            for row_number, record in enumerate(reader, start=1):
+                yield row_number, {k.strip().lower(): (v or '').strip() for k, v in record.items() if k}, None
+    finally:
+        # Don't let the wrapper close the caller's file handle
+        text.detach()
@@ -0,0 +1,39 @@
+from rest_framework import serializers
+from .models import UploadSession
+from .uploads import CHUNK_SIZE, UploadService
+
+
+class UploadStartSerializer(serializers.Serializer):
+    document_type = serializers.ChoiceField(choices=[])
+    file_name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+
+    def __init__(self, *args, document_types=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['document_type'].choices = document_types
+
+
+class UploadFinishSerializer(serializers.Serializer):
+    upload = serializers.UUIDField()
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+    chunk_count = serializers.SerializerMethodField()
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'key', 'purpose', 'target_id', 'document_type', 'file_name', 'total_size',
+            'chunk_size', 'chunk_count', 'missing_chunks', 'expires_at'
+        ]
+
+    def get_chunk_size(self, obj):
+        return CHUNK_SIZE
+
+    def get_chunk_count(self, obj):
+        return UploadService.chunk_count(obj)
+
+    def get_missing_chunks(self, obj):
+        return UploadService.missing_chunks(obj)
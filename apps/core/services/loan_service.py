@@ -65,3 +65,4 @@ class LedgerService:
         user.balance -= amount
         user.save()
         return tx
+
@@ -1,3 +1,146 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import User
+from core.archive import SegmentStore
+from core.models import UploadSession
+from core.uploads import CHUNK_SIZE, hash_file
+from loan_applications.models import ApplicationDocument, LoanApplication
+from loan_products.models import LoanProduct
 
-# Create your tests here.
+
+class SegmentStoreTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = SegmentStore(self.root)
+
+    def test_lookup_uses_key_ranges_and_key_files(self):
+        first = self.store.write_segment('2024-01', [{'id': 1, 'key': 10}, {'id': 2, 'key': 12}], key_field='key')
+        second = self.store.write_segment('2024-01', [{'id': 3, 'key': 11}, {'id': 4, 'key': 30}], key_field='key')
+        self.assertEqual((first['min_key'], first['max_key']), ('10', '12'))
+        self.assertNotIn('keys', self.store.read_index('2024-01'))
+
+        # 11 is within both ranges but only in the second segment's key file
+        self.assertEqual(self.store.segments_with_key('2024-01', 11), [second['name']])
+        self.assertEqual([r['id'] for r in self.store.lookup(11, key_field='key')], [3])
+        self.assertEqual(list(self.store.lookup(99, key_field='key')), [])
+        self.assertTrue(self.store.verify_segment('2024-01', first['name']))
+
+    def test_concurrent_writers_keep_every_index_entry(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            written = list(pool.map(
+                lambda n: self.store.write_segment('2024-01', [{'id': n}], key_field='id'), range(32)
+            ))
+        self.assertEqual(set(self.store.read_index('2024-01')['segments']), {entry['name'] for entry in written})
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, UPLOAD_PARTIAL_ROOT=os.path.join(self.media_root, 'partial')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.borrower = User.objects.create_user(username='borrower', password='password')
+        product = LoanProduct.objects.create(
+            name="Test Product", min_amount=100, max_amount=10000, min_term=1, max_term=12, default_interest_rate=10
+        )
+        self.app = LoanApplication.objects.create(borrower=self.borrower, product=product, amount=1000, term=6)
+        self.other_app = LoanApplication.objects.create(borrower=self.borrower, product=product, amount=2000, term=6)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.borrower)
+        self.data = os.urandom(CHUNK_SIZE + 10)
+
+    def start(self, application):
+        response = self.client.post(f'/api/applications/{application.pk}/start_upload/', {
+            'document_type': 'BANK_STATEMENT', 'file_name': 'statement.csv', 'size': len(self.data)
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['key']
+
+    def put_chunk(self, key, index, body, **headers):
+        return self.client.put(
+            f'/api/uploads/{key}/chunks/{index}/', body, content_type='application/octet-stream', **headers
+        )
+
+    def test_chunks_resume_in_any_order_and_identical_files_are_deduplicated_per_target(self):
+        key = self.start(self.app)
+        first, last = self.data[:CHUNK_SIZE], self.data[CHUNK_SIZE:]
+
+        self.assertEqual(self.put_chunk(key, 1, last).data['missing_chunks'], [0])
+        self.assertEqual(self.put_chunk(key, 0, first[:100]).status_code, 400)  # short chunk
+        self.assertEqual(self.put_chunk(key, 0, b'').status_code, 400)
+        bad = self.put_chunk(key, 0, first, HTTP_X_CHUNK_SHA256=hashlib.sha256(b'other').hexdigest())
+        self.assertEqual(bad.status_code, 400)
+        # A resuming client asks what is missing
+        self.assertEqual(self.client.get(f'/api/uploads/{key}/').data['missing_chunks'], [0])
+        response = self.put_chunk(key, 0, first, HTTP_X_CHUNK_SHA256=hashlib.sha256(first).hexdigest())
+        self.assertEqual(response.data['missing_chunks'], [])
+
+        response = self.client.post(f'/api/applications/{self.app.pk}/finish_upload/', {'upload': key}, format='json')
+        self.assertEqual(response.status_code, 201)
+        document = ApplicationDocument.objects.get(pk=response.data['id'])
+        # Same hash as a whole-file upload of the same bytes
+        self.assertEqual(document.content_hash, hash_file(SimpleUploadedFile('statement.csv', self.data)))
+        with document.file.open('rb') as handle:
+            self.assertEqual(handle.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'partial')), [])
+
+        # The same file again on the same application: the existing document is returned
+        response = self.client.post(
+            f'/api/applications/{self.app.pk}/upload_document/',
+            {'document_type': 'BANK_STATEMENT', 'file': SimpleUploadedFile('copy.csv', self.data)}, format='multipart'
+        )
+        self.assertEqual((response.status_code, response.data['id']), (200, document.pk))
+        # ...but not when it is sent as another type of document
+        response = self.client.post(
+            f'/api/applications/{self.app.pk}/upload_document/',
+            {'document_type': 'OTHER', 'file': SimpleUploadedFile('copy.csv', self.data)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data['id'], document.pk)
+
+        # On another application it gets its own document and its own stored file
+        key = self.start(self.other_app)
+        self.put_chunk(key, 0, first)
+        self.put_chunk(key, 1, last)
+        response = self.client.post(
+            f'/api/applications/{self.other_app.pk}/finish_upload/', {'upload': key}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        other = ApplicationDocument.objects.get(pk=response.data['id'])
+        self.assertEqual(other.content_hash, document.content_hash)
+        self.assertNotEqual(other.file.name, document.file.name)
+        other.file.delete()
+        with document.file.open('rb') as handle:
+            self.assertEqual(handle.read(), self.data)
+
+    def test_unfinished_uploads_cannot_be_finished_or_touched_by_others(self):
+        key = self.start(self.app)
+        self.put_chunk(key, 0, self.data[:CHUNK_SIZE])
+        response = self.client.post(f'/api/applications/{self.app.pk}/finish_upload/', {'upload': key}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.put_chunk(key, 2, b'x').status_code, 400)
+
+        self.put_chunk(key, 1, self.data[CHUNK_SIZE:])
+        UploadSession.objects.filter(key=key).update(expires_at=timezone.now())
+        response = self.client.post(f'/api/applications/{self.app.pk}/finish_upload/', {'upload': key}, format='json')
+        self.assertEqual((response.status_code, response.data['error']), (400, "Upload session has expired."))
+
+        stranger = APIClient()
+        stranger.force_authenticate(user=User.objects.create_user(username='stranger', password='password'))
+        self.assertEqual(stranger.get(f'/api/uploads/{key}/').status_code, 404)
+
+        self.assertEqual(self.client.delete(f'/api/uploads/{key}/').status_code, 204)
+        self.assertFalse(UploadSession.objects.exists())
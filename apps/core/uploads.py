@@ -0,0 +1,211 @@
+"""
+Chunked, resumable uploads with content hashing.
+
+A client opens an UploadSession for a file of known size, then PUTs the
+file in CHUNK_SIZE pieces (the last one shorter), in any order and as
+many times as needed: each chunk is streamed straight into its place in a
+partial file under UPLOAD_PARTIAL_ROOT and hashed on the way. The session
+lists the chunks received so far, which is all a client needs to resume.
+
+The content hash of a file is the SHA-256 of its chunks' SHA-256
+digests, in order. It is known as soon as the last chunk arrives, without
+reading the file again, and whole-file uploads hash to the same value
+(see hash_file), so identical documents are recognized however they came
+in. Finishing an upload moves the partial file into the document's
+storage location, or drops it when the target already has a document
+of the same type with the same hash. Documents never share a stored file, so deleting or
+replacing one cannot affect another.
+"""
+import hashlib
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .models import UploadSession
+
+CHUNK_SIZE = 4 * 1024 * 1024
+# Chunk bodies are copied to disk in pieces of this size
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+def tree_hash(chunk_digests):
+    root = hashlib.sha256()
+    for digest in chunk_digests:
+        root.update(bytes.fromhex(digest))
+    return root.hexdigest()
+
+
+def hash_file(uploaded_file):
+    """
+    Content hash of a whole uploaded file, as a chunked upload would compute it.
+    """
+    # Not File.chunks(): in-memory uploads yield the whole file as one piece
+    digests = []
+    uploaded_file.seek(0)
+    while True:
+        digest = hashlib.sha256()
+        remaining = CHUNK_SIZE
+        while remaining:
+            data = uploaded_file.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining -= len(data)
+        if remaining == CHUNK_SIZE and digests:
+            break
+        digests.append(digest.hexdigest())
+        if remaining:
+            break
+    uploaded_file.seek(0)
+    return tree_hash(digests)
+
+
+class UploadService:
+    @staticmethod
+    def partial_root():
+        return getattr(settings, 'UPLOAD_PARTIAL_ROOT', os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial'))
+
+    @classmethod
+    def partial_path(cls, session):
+        return os.path.join(cls.partial_root(), f"{session.key}.part")
+
+    @staticmethod
+    def chunk_count(session):
+        return max(1, -(-session.total_size // CHUNK_SIZE))
+
+    @classmethod
+    def missing_chunks(cls, session):
+        return [index for index in range(cls.chunk_count(session)) if str(index) not in session.chunk_hashes]
+
+    @classmethod
+    def start(cls, owner, purpose, target_id, document_type, file_name, total_size):
+        max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 100 * 1024 * 1024)
+        if total_size < 1 or total_size > max_size:
+            raise UploadError(f"File size must be between 1 and {max_size} bytes.")
+        session = UploadSession.objects.create(
+            owner=owner,
+            purpose=purpose,
+            target_id=target_id,
+            document_type=document_type,
+            file_name=os.path.basename(file_name)[:255],
+            total_size=total_size,
+            expires_at=timezone.now() + timedelta(hours=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24)),
+        )
+        os.makedirs(cls.partial_root(), exist_ok=True)
+        with open(cls.partial_path(session), 'wb') as handle:
+            handle.truncate(total_size)
+        return session
+
+    @classmethod
+    def write_chunk(cls, session, index, stream, expected_sha256=None):
+        """
+        Copies chunk `index` from `stream` into the partial file while
+        hashing it. Re-sending a chunk replaces it.
+        """
+        if index < 0 or index >= cls.chunk_count(session):
+            raise UploadError(f"Chunk index must be between 0 and {cls.chunk_count(session) - 1}.")
+        if session.expires_at <= timezone.now():
+            raise UploadError("Upload session has expired.")
+        offset = index * CHUNK_SIZE
+        length = min(CHUNK_SIZE, session.total_size - offset)
+
+        digest = hashlib.sha256()
+        received = 0
+        with open(cls.partial_path(session), 'r+b') as handle:
+            handle.seek(offset)
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                digest.update(data)
+                handle.write(data)
+                received += len(data)
+            # Anything past the chunk's length means the client split the file wrongly
+            if received < length or stream.read(1):
+                raise UploadError(f"Chunk {index} must be exactly {length} bytes.")
+
+        digest = digest.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            raise UploadError(f"Chunk {index} does not match its SHA-256; send it again.")
+
+        with transaction.atomic():
+            # Chunks of one upload may arrive in parallel
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            session.chunk_hashes[str(index)] = digest
+            session.save(update_fields=['chunk_hashes'])
+        return session
+
+    @classmethod
+    def content_hash(cls, session):
+        missing = cls.missing_chunks(session)
+        if missing:
+            raise UploadError(f"Upload is incomplete; missing chunks: {missing[:20]}.")
+        return tree_hash(session.chunk_hashes[str(index)] for index in range(cls.chunk_count(session)))
+
+    @classmethod
+    def attach(cls, session, document, content_hash, field_name='file'):
+        """
+        Points `document`'s file field at the finished upload, moving the
+        partial file into the field's storage. The caller saves `document`;
+        the session is removed.
+        """
+        field = document._meta.get_field(field_name)
+        partial = cls.partial_path(session)
+        name = field.storage.get_available_name(field.generate_filename(document, session.file_name))
+        try:
+            destination = field.storage.path(name)
+        except NotImplementedError:
+            # Remote storage: the file has to be sent on
+            with open(partial, 'rb') as handle:
+                name = field.storage.save(name, File(handle))
+            os.unlink(partial)
+        else:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(partial, destination)
+        setattr(document, field_name, name)
+        document.content_hash = content_hash
+        session.delete()
+        return document
+
+    @classmethod
+    def finish(cls, session, document, duplicates):
+        """
+        Completes `session` into the unsaved `document`. If one of
+        `duplicates` (e.g. the target's other documents) has the same
+        document type and content, that one is returned instead and
+        nothing is stored. Returns (document, created).
+        """
+        if session.expires_at <= timezone.now():
+            raise UploadError("Upload session has expired.")
+        content_hash = cls.content_hash(session)
+        existing = duplicates.filter(content_hash=content_hash, document_type=document.document_type).first()
+        if existing is not None:
+            cls.abort(session)
+            return existing, False
+        with transaction.atomic():
+            cls.attach(session, document, content_hash)
+            document.save()
+        return document, True
+
+    @classmethod
+    def abort(cls, session):
+        try:
+            os.unlink(cls.partial_path(session))
+        except FileNotFoundError:
+            pass
+        session.delete()
+
+    @classmethod
+    def purge_expired(cls, now=None):
+        expired = UploadSession.objects.filter(expires_at__lte=now or timezone.now())
+        count = 0
+        for session in expired.iterator():
+            cls.abort(session)
+            count += 1
+        return count
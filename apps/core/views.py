@@ -153,7 +153,9 @@ def lender_dashboard(request):
     expected_returns = total_invested * Decimal('0.06') if total_invested else 0
     net_profit = Transaction.objects.filter(transaction_type='interest').aggregate(total=Sum('amount'))['total'] or 0
 
-    available_loans = LoanApplication.objects.filter(status=LoanApplication.Status.SUBMITTED)[:5]
+    available_loans = LoanApplication.objects.filter(
+        status=LoanApplication.Status.SUBMITTED
+    ).select_related('borrower').order_by('-priority', 'id')[:5]
 
     # Simple placeholders for diversification and calendar
     diversification = {
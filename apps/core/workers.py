@@ -0,0 +1,47 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    A thread pool for work moved off the request cycle. Each task runs
+    with fresh database connections, closed again when it finishes, so
+    long-lived worker threads never hold stale connections.
+    """
+    def __init__(self, name, max_workers):
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._executor.submit(self._call, fn, args, kwargs)
+
+    def _call(self, fn, args, kwargs):
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            logger.exception(f"Task {fn.__qualname__} failed in worker pool '{self.name}'.")
+            raise
+        finally:
+            connections.close_all()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, max_workers):
+    """
+    The process-wide pool called `name`, created on first use.
+    """
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = WorkerPool(name, max_workers)
+        return _pools[name]
@@ -28,6 +28,11 @@ class LoanApplicationAdmin(admin.ModelAdmin):
             new_status = obj.status
             # Revert the object status to original for transition logic in service
             obj.status = form.initial.get('status')
+            # The transition only saves its own columns: save the other edits first
+            other_fields = [name for name in form.changed_data if name != 'status']
+            if other_fields:
+                obj.updated_by = request.user
+                obj.save(update_fields=other_fields + ['updated_by', 'updated_at'])
             try:
                 ApplicationService.transition_status(
                     obj, 
@@ -35,11 +40,8 @@ class LoanApplicationAdmin(admin.ModelAdmin):
                     request.user, 
                     reason="Manual Admin Update"
                 )
-                # ApplicationService.transition_status already calls application.save()
             except Exception as e:
                 messages.error(request, f"Transition failed: {str(e)}")
-                # Revert status to old value and save other modified fields if any
-                super().save_model(request, obj, form, change)
         else:
             super().save_model(request, obj, form, change)
 
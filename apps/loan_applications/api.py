@@ -2,8 +2,22 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import LoanApplication
-from .serializers import LoanApplicationSerializer, TransitionSerializer, ApplicationDocumentSerializer
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from core.models import UploadSession
+from core.serializers import UploadFinishSerializer, UploadSessionSerializer, UploadStartSerializer
+from core.uploads import UploadError, UploadService, hash_file
+from .models import ApplicationDocument, StatementAnalysis, StatusHistory
+from .queue import ClaimConflict, WorkQueueService
+from .serializers import (
+    LoanApplicationSerializer, TransitionSerializer, ApplicationDocumentSerializer, RiskWorklistItemSerializer,
+    BulkTransitionSerializer, BulkTransitionOutcomeSerializer, WorkQueueItemSerializer, WorkQueueQuerySerializer,
+    ClaimNextSerializer, StatementAnalysisSerializer
+)
 from .services import ApplicationService
+from .statements import StatementProcessingService
+
+UPLOAD_PURPOSE = 'application_document'
 
 class IsBorrowerOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -16,8 +30,20 @@ class LoanApplicationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']:
-            return LoanApplication.objects.all()
-        return LoanApplication.objects.filter(borrower=user)
+            queryset = LoanApplication.objects.all()
+        else:
+            queryset = LoanApplication.objects.filter(borrower=user)
+        if self.action in ['list', 'retrieve']:
+            # Nested documents and history in two queries instead of two per row
+            queryset = queryset.select_related('product').prefetch_related(
+                'documents',
+                Prefetch('status_history', queryset=StatusHistory.objects.select_related('created_by')),
+            ).order_by('-created_at', '-id')
+        return queryset
+
+    @staticmethod
+    def _is_officer(user):
+        return user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']
 
     def perform_create(self, serializer):
         serializer.save(borrower=self.request.user, created_by=self.request.user)
@@ -57,11 +83,201 @@ class LoanApplicationViewSet(viewsets.ModelViewSet):
                 return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """
+        Moves up to 5000 applications to one status in a single request.
+        Always 200: each item reports its own outcome.
+        """
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = BulkTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        outcomes = ApplicationService.bulk_transition(
+            serializer.validated_data['application_ids'],
+            serializer.validated_data['to_status'],
+            user,
+            reason=serializer.validated_data.get('reason', '')
+        )
+        succeeded = sum(1 for outcome in outcomes if outcome['ok'])
+        return Response({
+            'succeeded': succeeded,
+            'failed': len(outcomes) - succeeded,
+            'results': BulkTransitionOutcomeSerializer(outcomes, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def allowed_transitions(self, request):
+        """
+        ?ids=1,2,3 -> {application id: [statuses it can move to]}, computed
+        in batched queries with no side effects. Staff/officers only.
+        """
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+        except ValueError:
+            return Response({'ids': 'Comma-separated application ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > 1000:
+            return Response({'ids': 'At most 1000 ids per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        applications = self.get_queryset().filter(pk__in=ids).select_related('product', 'borrower__kyc_profile')
+        allowed = ApplicationService.allowed_transitions(applications, user)
+        return Response({str(pk): targets for pk, targets in allowed.items()})
+
+    @action(detail=False, methods=['get'])
+    def work_queue(self, request):
+        """
+        Queued applications, highest priority first. Pass `next_cursor` back
+        as `cursor` for the next page; `unclaimed=true` hides applications
+        other officers hold.
+        """
+        if not self._is_officer(request.user):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+        params = WorkQueueQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        try:
+            applications, next_cursor = WorkQueueService.page(
+                statuses=list(data.get('status') or []),
+                cursor=data.get('cursor'),
+                page_size=data['page_size'],
+                unclaimed_for=request.user if data['unclaimed'] else None,
+            )
+        except ValueError as e:
+            return Response({'cursor': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'results': WorkQueueItemSerializer(applications, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+    @action(detail=True, methods=['post'])
+    def claim(self, request, pk=None):
+        """
+        Claims the application for WORK_QUEUE_LEASE_SECONDS; claiming again renews it.
+        """
+        if not self._is_officer(request.user):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        application = self.get_object()
+        try:
+            WorkQueueService.claim(application, request.user)
+        except ClaimConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({'id': application.pk, 'claim_expires_at': application.claim_expires_at})
+
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        if not self._is_officer(request.user):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        application = self.get_object()
+        if not WorkQueueService.release(application, request.user):
+            return Response({'error': 'You do not hold this application.'}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'])
+    def claim_next(self, request):
+        """
+        Claims the next `count` highest-priority applications nobody holds.
+        """
+        if not self._is_officer(request.user):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = ClaimNextSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        claimed = WorkQueueService.claim_next(request.user, serializer.validated_data['count'])
+        return Response([
+            {'id': application.pk, 'claim_expires_at': application.claim_expires_at} for application in claimed
+        ])
+
+    @action(detail=False, methods=['post'])
+    def risk_worklist(self, request):
+        """
+        Evaluates every SUBMITTED application in one batch and returns the
+        ranked worklist (passes first, then failures by rule).
+        """
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+        from compliance.risk_engine import RiskEngineService
+        worklist = RiskEngineService.evaluate_batch(actor=user)
+        return Response(RiskWorklistItemSerializer(worklist, many=True).data)
+
     @action(detail=True, methods=['post'])
     def upload_document(self, request, pk=None):
         application = self.get_object()
         serializer = ApplicationDocumentSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(application=application, created_by=request.user)
+            content_hash = hash_file(serializer.validated_data['file'])
+            existing = application.documents.filter(
+                content_hash=content_hash, document_type=serializer.validated_data['document_type']
+            ).first()
+            if existing is not None:
+                return Response(ApplicationDocumentSerializer(existing).data)
+            document = serializer.save(application=application, created_by=request.user, content_hash=content_hash)
+            StatementProcessingService.enqueue(document)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'])
+    def statements(self, request, pk=None):
+        """
+        Processing status, timings and features of the application's bank statements.
+        """
+        application = self.get_object()
+        analyses = StatementAnalysis.objects.filter(document__application=application).order_by('pk')
+        return Response({
+            'statement_features': application.statement_features,
+            'analyses': StatementAnalysisSerializer(analyses, many=True).data,
+        })
+
+    @action(detail=True, methods=['post'])
+    def start_upload(self, request, pk=None):
+        """
+        Opens a chunked upload for a document of this application; send the
+        chunks to /api/uploads/<key>/chunks/<index>/, then call finish_upload.
+        """
+        application = self.get_object()
+        serializer = UploadStartSerializer(data=request.data, document_types=ApplicationDocument.DocType.choices)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = UploadService.start(
+                request.user, UPLOAD_PURPOSE, application.pk, serializer.validated_data['document_type'],
+                serializer.validated_data['file_name'], serializer.validated_data['size']
+            )
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def finish_upload(self, request, pk=None):
+        """
+        Turns a complete chunked upload into an ApplicationDocument. A file
+        already attached to this application as the same document type is
+        returned (200) instead of being stored twice.
+        """
+        application = self.get_object()
+        serializer = UploadFinishSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = get_object_or_404(
+            UploadSession, key=serializer.validated_data['upload'], owner=request.user,
+            purpose=UPLOAD_PURPOSE, target_id=application.pk
+        )
+        document = ApplicationDocument(
+            application=application, document_type=session.document_type, created_by=request.user
+        )
+        try:
+            document, created = UploadService.finish(session, document, application.documents.all())
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if created:
+            StatementProcessingService.enqueue(document)
+        return Response(
+            ApplicationDocumentSerializer(document).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
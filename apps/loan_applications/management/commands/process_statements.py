@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from loan_applications.models import ApplicationDocument, StatementAnalysis
+from loan_applications.statements import StatementProcessingService
+
+
+class Command(BaseCommand):
+    help = "Process queued bank statements whose retry is due (run every few minutes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help="Also queue bank statements uploaded before processing existed.")
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            missing = ApplicationDocument.objects.filter(
+                document_type=ApplicationDocument.DocType.BANK_STATEMENT, analysis__isnull=True
+            )
+            created = StatementAnalysis.objects.bulk_create([StatementAnalysis(document=document) for document in missing])
+            self.stdout.write(f"Queued {len(created)} unprocessed statements.")
+
+        processed = StatementProcessingService.retry_due(run=StatementProcessingService.process)
+        failed = StatementAnalysis.objects.filter(pk__in=processed, status=StatementAnalysis.Status.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f"Processed {len(processed)} statements ({failed} failed for good)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from loan_applications.queue import WorkQueueService
+
+
+class Command(BaseCommand):
+    help = "Recompute work queue priorities of SUBMITTED and UNDER_REVIEW applications (run after risk inputs change, or nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = WorkQueueService.refresh(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reprioritized {updated} queued applications."))
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_applications', '0003_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=10)),
+                ('format', models.CharField(blank=True, max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('features', models.JSONField(blank=True, default=dict)),
+                ('timings_ms', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='loan_applications.applicationdocument')),
+            ],
+            options={
+                'verbose_name_plural': 'Statement Analyses',
+            },
+        ),
+        migrations.AddField(
+            model_name='loanapplication',
+            name='statement_features',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='StatementTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posted_on', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='loan_applications.statementanalysis')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='statementanalysis',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='statement_retry_idx'),
+        ),
+    ]
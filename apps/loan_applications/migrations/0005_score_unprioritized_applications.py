@@ -0,0 +1,35 @@
+import datetime
+from decimal import Decimal
+from django.db import migrations
+
+# Frozen copy of queue.compute_priority without the risk term: the real
+# scores are large negative numbers, so rows left at the old default of 0
+# would sort ahead of every scored application
+PRIORITY_EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+AMOUNT_POINTS_UNIT = Decimal('1000')
+AMOUNT_POINTS_CAP = 48
+
+
+def score_unprioritized(apps, schema_editor):
+    LoanApplication = apps.get_model('loan_applications', 'LoanApplication')
+    unscored = LoanApplication.objects.filter(priority=0).only('id', 'created_at', 'amount').order_by('pk')
+    batch = []
+    for application in unscored.iterator(chunk_size=1000):
+        age_points = -int((application.created_at - PRIORITY_EPOCH).total_seconds() // 3600)
+        application.priority = age_points + min(int(application.amount // AMOUNT_POINTS_UNIT), AMOUNT_POINTS_CAP)
+        batch.append(application)
+        if len(batch) >= 1000:
+            LoanApplication.objects.bulk_update(batch, ['priority'])
+            batch = []
+    LoanApplication.objects.bulk_update(batch, ['priority'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_applications', '0004_statement_analysis'),
+    ]
+
+    operations = [
+        migrations.RunPython(score_unprioritized, migrations.RunPython.noop),
+    ]
@@ -30,10 +30,37 @@ class LoanApplication(AuditBaseModel):
         default=Status.DRAFT
     )
     remarks = models.TextField(blank=True)
+    # Officer work queue (see loan_applications.queue): higher is reviewed first;
+    # scored from age and amount on insert, rescored as it enters the queue
+    priority = models.IntegerField(default=0)
+    claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='claimed_applications'
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+    # Income/expense features from processed bank statements, read by the
+    # risk rules (see loan_applications.statements)
+    statement_features = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            # Work queue pages are keyset scans of one status by (priority desc, id)
+            models.Index(fields=['status', '-priority', 'id'], name='application_queue_idx'),
+        ]
 
     def __str__(self):
         return f"App {self.id} - {self.borrower.username} - {self.status}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            # Rows created straight into the queue (admin, imports) sort by age too
+            from .queue import compute_priority
+            self.priority = compute_priority(self, risk_passed=False)
+        super().save(*args, **kwargs)
+
 class ApplicationDocument(AuditBaseModel):
     class DocType(models.TextChoices):
         BANK_STATEMENT = 'BANK_STATEMENT', 'Bank Statement'
@@ -47,10 +74,57 @@ class ApplicationDocument(AuditBaseModel):
     )
     document_type = models.CharField(max_length=50, choices=DocType.choices)
     file = models.FileField(upload_to='loan_applications/%Y/%m/%d/')
+    # core.uploads content hash; the same file is stored once per owner and document type
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return f"{self.get_document_type_display()} for App {self.application.id}"
 
+class StatementAnalysis(models.Model):
+    """
+    Background parse of a BANK_STATEMENT document into transactions and
+    income/expense features.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    document = models.OneToOneField(ApplicationDocument, on_delete=models.CASCADE, related_name='analysis')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    format = models.CharField(max_length=10, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Queued retries wait until then
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    transaction_count = models.PositiveIntegerField(default=0)
+    features = models.JSONField(default=dict, blank=True)
+    timings_ms = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Statement Analyses"
+        indexes = [
+            # The retry sweep looks up queued work that is due
+            models.Index(fields=['status', 'next_attempt_at'], name='statement_retry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Statement analysis {self.id} for document {self.document_id} ({self.status})"
+
+class StatementTransaction(models.Model):
+    analysis = models.ForeignKey(StatementAnalysis, on_delete=models.CASCADE, related_name='transactions')
+    posted_on = models.DateField()
+    # Credits are positive, debits negative
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    description = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.posted_on} {self.amount} {self.description}"
+
 class StatusHistory(AuditBaseModel):
     application = models.ForeignKey(
         LoanApplication, 
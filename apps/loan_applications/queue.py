@@ -0,0 +1,201 @@
+"""
+Officer work queue over SUBMITTED and UNDER_REVIEW applications.
+
+Applications are ordered by LoanApplication.priority, an indexed integer
+computed from the risk result, the amount and the submission time. One
+point is one hour of waiting: the age term is the submission time counted
+in hours back from a fixed epoch, so waiting applications keep their
+relative order without being rescored as they get older. New applications
+are scored on insert from age and amount alone; the full score is computed
+when an application enters the queue or a review and by
+`python manage.py refresh_application_priorities` after risk inputs change.
+
+Officers claim applications for a lease (WORK_QUEUE_LEASE_SECONDS). A
+claim is a single conditional UPDATE, so two officers racing for the same
+application cannot both win it, and an abandoned claim simply expires.
+"""
+import base64
+import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from .models import LoanApplication, StatusHistory
+
+QUEUE_STATUSES = [LoanApplication.Status.SUBMITTED, LoanApplication.Status.UNDER_REVIEW]
+
+PRIORITY_EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+# A passing risk check moves an application three days ahead
+RISK_PASSED_POINTS = 72
+# One point per 1000 requested, up to two days
+AMOUNT_POINTS_UNIT = Decimal('1000')
+AMOUNT_POINTS_CAP = 48
+
+
+def compute_priority(application, risk_passed):
+    waited_from = application.created_at or timezone.now()
+    age_points = -int((waited_from - PRIORITY_EPOCH).total_seconds() // 3600)
+    amount_points = min(int(application.amount // AMOUNT_POINTS_UNIT), AMOUNT_POINTS_CAP)
+    return age_points + amount_points + (RISK_PASSED_POINTS if risk_passed else 0)
+
+
+def encode_cursor(application):
+    raw = f"{application.priority}|{application.pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Returns (priority, id) or raises ValueError.
+    """
+    try:
+        priority, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return int(priority), int(pk)
+    except (ValueError, UnicodeError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+class ClaimConflict(Exception):
+    """
+    The application is claimed by another officer, or not in the queue.
+    """
+
+
+class WorkQueueService:
+    @staticmethod
+    def lease():
+        return datetime.timedelta(seconds=getattr(settings, 'WORK_QUEUE_LEASE_SECONDS', 30 * 60))
+
+    @staticmethod
+    def _claimable_by(user, now):
+        return Q(claimed_by__isnull=True) | Q(claim_expires_at__lte=now) | Q(claimed_by=user)
+
+    @staticmethod
+    def prioritize(applications):
+        """
+        Recomputes and stores the priority of the given applications, with
+        one features query for their borrowers and one bulk update.
+        """
+        from compliance.features import load_risk_features_bulk
+        from compliance.risk_engine import RiskEngineService
+        applications = list(applications)
+        if not applications:
+            return 0
+        features = load_risk_features_bulk(
+            [application.borrower_id for application in applications], RiskEngineService.LATE_PAYMENT_THRESHOLD_DAYS
+        )
+        for application in applications:
+            is_passed = RiskEngineService._check(application, features[application.borrower_id])[0]
+            application.priority = compute_priority(application, is_passed)
+        return LoanApplication.objects.bulk_update(applications, ['priority'])
+
+    @staticmethod
+    def reprioritize(application):
+        """
+        Rescores one application as it enters the queue or a review, reusing
+        the borrower's memoized risk features when present.
+        """
+        from compliance.features import load_risk_features
+        from compliance.risk_engine import RiskEngineService
+        features = load_risk_features(application.borrower, RiskEngineService.LATE_PAYMENT_THRESHOLD_DAYS)
+        application.priority = compute_priority(application, RiskEngineService._check(application, features)[0])
+        LoanApplication.objects.filter(pk=application.pk).update(priority=application.priority)
+
+    @classmethod
+    def refresh(cls, chunk_size=500):
+        """
+        Recomputes every queued application's priority. Returns the count.
+        """
+        queued = LoanApplication.objects.filter(status__in=QUEUE_STATUSES).select_related('product').order_by('pk')
+        updated = 0
+        chunk = []
+        for application in queued.iterator(chunk_size=chunk_size):
+            chunk.append(application)
+            if len(chunk) >= chunk_size:
+                updated += cls.prioritize(chunk)
+                chunk = []
+        return updated + cls.prioritize(chunk)
+
+    @staticmethod
+    def page(statuses=None, cursor=None, page_size=50, unclaimed_for=None):
+        """
+        One page of the queue, highest priority first, with keyset pagination
+        on (priority, id). With `unclaimed_for`, applications that user cannot
+        claim are left out. Returns (applications, next_cursor).
+        """
+        queryset = LoanApplication.objects.filter(status__in=statuses or QUEUE_STATUSES)
+        if unclaimed_for is not None:
+            queryset = queryset.filter(WorkQueueService._claimable_by(unclaimed_for, timezone.now()))
+        if cursor:
+            priority, pk = decode_cursor(cursor)
+            queryset = queryset.filter(Q(priority__lt=priority) | Q(priority=priority, pk__gt=pk))
+
+        applications = list(
+            queryset.select_related('product', 'borrower', 'claimed_by').prefetch_related(
+                'documents',
+                Prefetch('status_history', queryset=StatusHistory.objects.select_related('created_by')),
+            ).order_by('-priority', 'id')[:page_size + 1]
+        )
+        next_cursor = encode_cursor(applications[page_size - 1]) if len(applications) > page_size else None
+        return applications[:page_size], next_cursor
+
+    @classmethod
+    def claim(cls, application, user):
+        """
+        Claims (or renews the claim on) a queued application for one lease.
+        Raises ClaimConflict if another officer holds it.
+        """
+        now = timezone.now()
+        expires_at = now + cls.lease()
+        claimed = LoanApplication.objects.filter(
+            cls._claimable_by(user, now), pk=application.pk, status__in=QUEUE_STATUSES
+        ).update(claimed_by=user, claim_expires_at=expires_at)
+        if not claimed:
+            raise ClaimConflict(f"Application {application.pk} is claimed by another officer or not in the queue.")
+        application.claimed_by, application.claim_expires_at = user, expires_at
+        return application
+
+    @classmethod
+    def claim_next(cls, user, count=1, statuses=None):
+        """
+        Claims up to `count` of the highest-priority applications nobody
+        holds. Candidates lost to a concurrent claim are skipped.
+        """
+        claimed = []
+        while len(claimed) < count:
+            now = timezone.now()
+            candidates = list(
+                LoanApplication.objects.filter(status__in=statuses or QUEUE_STATUSES)
+                .filter(Q(claimed_by__isnull=True) | Q(claim_expires_at__lte=now))
+                .exclude(pk__in=[application.pk for application in claimed])
+                .order_by('-priority', 'id')[:count - len(claimed)]
+            )
+            if not candidates:
+                break
+            for application in candidates:
+                try:
+                    claimed.append(cls.claim(application, user))
+                except ClaimConflict:
+                    continue
+        return claimed
+
+    @staticmethod
+    def release(application, user):
+        """
+        Gives up `user`'s claim. Returns False if they did not hold it.
+        """
+        released = LoanApplication.objects.filter(pk=application.pk, claimed_by=user).update(
+            claimed_by=None, claim_expires_at=None
+        )
+        if released:
+            application.claimed_by, application.claim_expires_at = None, None
+        return bool(released)
+
+    @staticmethod
+    def held_by_other(application, user, now=None):
+        return (
+            application.claimed_by_id is not None
+            and application.claimed_by_id != getattr(user, 'pk', None)
+            and application.claim_expires_at is not None
+            and application.claim_expires_at > (now or timezone.now())
+        )
@@ -1,10 +1,11 @@
 from rest_framework import serializers
-from .models import LoanApplication, ApplicationDocument, StatusHistory
+from .models import LoanApplication, ApplicationDocument, StatementAnalysis, StatusHistory
 
 class ApplicationDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ApplicationDocument
-        fields = ['id', 'document_type', 'file']
+        fields = ['id', 'document_type', 'file', 'content_hash']
+        read_only_fields = ['content_hash']
 
 class StatusHistorySerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='created_by.username', read_only=True)
@@ -13,6 +14,14 @@ class StatusHistorySerializer(serializers.ModelSerializer):
         model = StatusHistory
         fields = ['id', 'from_status', 'to_status', 'reason', 'created_at', 'user_name']
 
+class StatementAnalysisSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StatementAnalysis
+        fields = [
+            'id', 'document', 'status', 'format', 'attempts', 'next_attempt_at', 'error',
+            'transaction_count', 'features', 'timings_ms', 'started_at', 'finished_at'
+        ]
+
 class LoanApplicationSerializer(serializers.ModelSerializer):
     documents = ApplicationDocumentSerializer(many=True, read_only=True)
     status_history = StatusHistorySerializer(many=True, read_only=True)
@@ -22,10 +31,54 @@ class LoanApplicationSerializer(serializers.ModelSerializer):
         model = LoanApplication
         fields = [
             'id', 'product', 'product_name', 'amount', 'term', 
-            'status', 'remarks', 'documents', 'status_history'
+            'status', 'remarks', 'documents', 'status_history', 'statement_features'
+        ]
+        read_only_fields = ['status', 'borrower', 'statement_features']
+
+class WorkQueueItemSerializer(LoanApplicationSerializer):
+    borrower_name = serializers.CharField(source='borrower.username', read_only=True)
+    claimed_by_name = serializers.CharField(source='claimed_by.username', read_only=True, default=None)
+
+    class Meta(LoanApplicationSerializer.Meta):
+        fields = LoanApplicationSerializer.Meta.fields + [
+            'borrower', 'borrower_name', 'priority', 'created_at', 'claimed_by', 'claimed_by_name', 'claim_expires_at'
         ]
-        read_only_fields = ['status', 'borrower']
+
+class WorkQueueQuerySerializer(serializers.Serializer):
+    status = serializers.MultipleChoiceField(
+        choices=[LoanApplication.Status.SUBMITTED, LoanApplication.Status.UNDER_REVIEW], required=False
+    )
+    unclaimed = serializers.BooleanField(default=False)
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(min_value=1, max_value=200, default=50)
+
+class ClaimNextSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1, max_value=50, default=1)
 
 class TransitionSerializer(serializers.Serializer):
     to_status = serializers.ChoiceField(choices=LoanApplication.Status.choices)
     reason = serializers.CharField(required=False, allow_blank=True)
+
+class BulkTransitionSerializer(serializers.Serializer):
+    application_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=5000
+    )
+    to_status = serializers.ChoiceField(choices=LoanApplication.Status.choices)
+    reason = serializers.CharField(required=False, allow_blank=True)
+
+class BulkTransitionOutcomeSerializer(serializers.Serializer):
+    application_id = serializers.IntegerField()
+    ok = serializers.BooleanField()
+    status = serializers.CharField(allow_null=True)
+    error = serializers.CharField(allow_null=True)
+
+class RiskWorklistItemSerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    application_id = serializers.IntegerField()
+    borrower_id = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    submitted_at = serializers.DateTimeField()
+    is_passed = serializers.BooleanField()
+    failed_rule_code = serializers.CharField(allow_null=True)
+    message = serializers.CharField()
+    features = serializers.DictField()
@@ -1,6 +1,11 @@
+import logging
 from django.db import transaction
+from django.db.models import F
 from django.core.exceptions import ValidationError
 from .models import LoanApplication, StatusHistory
+from .state_machine import machine
+
+logger = logging.getLogger(__name__)
 
 class ApplicationService:
     @staticmethod
@@ -9,50 +14,98 @@ class ApplicationService:
         """
         Idempotent status transition with audit logging.
         """
+        from compliance.services import AuditService
+        with AuditService.buffered():
+            return ApplicationService._transition(application, to_status, user, reason)
+
+    BULK_CHUNK_SIZE = 200
+
+    @classmethod
+    def bulk_transition(cls, application_ids, to_status, user, reason="", chunk_size=None):
+        """
+        Moves many applications to `to_status`, with the same checks and side
+        effects as transition_status. Applications, borrowers, KYC profiles
+        and products are loaded per chunk in one query, and risk features
+        with one more. Each chunk commits on its own; each item runs in a
+        savepoint so a failing application does not affect the others.
+
+        Returns one outcome per requested id, in request order:
+        {'application_id', 'ok', 'status', 'error'}.
+        """
+        from compliance.services import AuditService
+        chunk_size = chunk_size or cls.BULK_CHUNK_SIZE
+        ids = list(dict.fromkeys(application_ids))
+        outcomes = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk_ids = ids[start:start + chunk_size]
+            applications = LoanApplication.objects.filter(pk__in=chunk_ids).select_related(
+                'product', 'borrower', 'borrower__kyc_profile'
+            ).in_bulk()
+            # One instance per borrower, so effects see each other's changes
+            borrowers = {}
+            for application in applications.values():
+                application.borrower = borrowers.setdefault(application.borrower_id, application.borrower)
+            cls._prime_risk_features(applications.values(), to_status)
+
+            with transaction.atomic(), AuditService.buffered():
+                for pk in chunk_ids:
+                    application = applications.get(pk)
+                    if application is None:
+                        outcomes[pk] = {'application_id': pk, 'ok': False, 'status': None, 'error': "Not found."}
+                        continue
+                    from_status = application.status
+                    try:
+                        # A failed item's writes and audit records are discarded with its savepoint
+                        with transaction.atomic(), AuditService.buffered():
+                            cls._transition(application, to_status, user, reason)
+                    except ValidationError as e:
+                        application.status = from_status
+                        outcomes[pk] = {
+                            'application_id': pk, 'ok': False, 'status': application.status, 'error': ' '.join(e.messages)
+                        }
+                    except Exception:
+                        # Earlier chunks are committed: report the item instead of failing the request
+                        logger.exception(f"Bulk transition of application {pk} to {to_status} failed.")
+                        application.status = from_status
+                        outcomes[pk] = {
+                            'application_id': pk, 'ok': False, 'status': application.status, 'error': "Unexpected error."
+                        }
+                    else:
+                        outcomes[pk] = {'application_id': pk, 'ok': True, 'status': application.status, 'error': None}
+        return [outcomes[pk] for pk in ids]
+
+    @staticmethod
+    def _prime_risk_features(applications, to_status):
+        # Risk guards and work queue scoring read the borrowers' features
+        if to_status not in [
+            LoanApplication.Status.SUBMITTED, LoanApplication.Status.UNDER_REVIEW, LoanApplication.Status.APPROVED
+        ]:
+            return
+        from compliance.features import prime_risk_features
+        from compliance.risk_engine import RiskEngineService
+        prime_risk_features(
+            [application.borrower for application in applications], RiskEngineService.LATE_PAYMENT_THRESHOLD_DAYS
+        )
+
+    @staticmethod
+    def _transition(application, to_status, user, reason):
+        """
+        Applies one edge of the application state machine: guards, status
+        update, history, audit event, effects and post-commit hooks.
+        """
         from_status = application.status
-        
+
         if from_status == to_status:
             return application
 
-        # Validate transitions
-        valid_transitions = {
-            LoanApplication.Status.DRAFT: [LoanApplication.Status.SUBMITTED],
-            LoanApplication.Status.SUBMITTED: [LoanApplication.Status.UNDER_REVIEW, LoanApplication.Status.REJECTED],
-            LoanApplication.Status.UNDER_REVIEW: [LoanApplication.Status.APPROVED, LoanApplication.Status.REJECTED],
-            LoanApplication.Status.APPROVED: [LoanApplication.Status.DISBURSED],
-        }
-
-        if to_status not in valid_transitions.get(from_status, []):
-            is_staff = user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']
-            if not is_staff:
-                raise ValidationError(f"Invalid transition from {from_status} to {to_status}")
-
-        # Business Constraint: KYC Check
-        if to_status == LoanApplication.Status.SUBMITTED:
-            # Check if user has a verified KYC profile
-            # Assuming KYCProfile is in accounts.models
-            if not hasattr(application.borrower, 'kyc_profile') or application.borrower.kyc_profile.status != 'VERIFIED':
-                raise ValidationError("KYC must be VERIFIED before submitting an application.")
-
-        # Business Constraint: Product limits
-        if from_status == LoanApplication.Status.DRAFT and to_status == LoanApplication.Status.SUBMITTED:
-            product = application.product
-            if application.amount < product.min_amount or application.amount > product.max_amount:
-                raise ValidationError(f"Amount must be between {product.min_amount} and {product.max_amount}")
-            if application.term < product.min_term or application.term > product.max_term:
-                raise ValidationError(f"Term must be between {product.min_term} and {product.max_term}")
-
-        # Risk Engine Evaluation
-        if to_status in [LoanApplication.Status.UNDER_REVIEW, LoanApplication.Status.APPROVED]:
-            from compliance.risk_engine import RiskEngineService
-            risk_result = RiskEngineService.evaluate(application, actor=user)
-            if not risk_result.is_passed:
-                raise ValidationError(f"Compliance Check Failed: {risk_result.message}")
+        # Raises ValidationError if the edge is closed or a guard blocks it
+        edge = machine.check(application, to_status, user)
 
         # Update application
         application.status = to_status
         application.updated_by = user
-        application.save()
+        # Leave the work queue columns to their own conditional updates
+        application.save(update_fields=['status', 'updated_by', 'updated_at'])
 
         # Log history
         StatusHistory.objects.create(
@@ -64,34 +117,33 @@ class ApplicationService:
         )
 
         # Centralized Audit Logging
-        from compliance.services import AuditService
-        from compliance.events import AuditEventType
-        
-        event_map = {
-            LoanApplication.Status.APPROVED: AuditEventType.LOAN_APPROVED,
-            LoanApplication.Status.REJECTED: AuditEventType.LOAN_REJECTED,
-            LoanApplication.Status.DISBURSED: AuditEventType.LOAN_DISBURSED,
-            LoanApplication.Status.SUBMITTED: AuditEventType.LOAN_APPLICATION_SUBMITTED,
-        }
-        
-        event_type = event_map.get(to_status)
-        if event_type:
+        if edge.event_type:
+            from compliance.services import AuditService
             AuditService.log_event(
                 actor=user,
                 target=application,
-                event_type=event_type,
+                event_type=edge.event_type,
                 description=f"Status transition: {from_status} -> {to_status}. Reason: {reason}",
                 payload_before={"status": from_status},
                 payload_after={"status": to_status},
                 metadata={"reason": reason}
             )
 
-        # Handle Disbursement logic
-        if to_status == LoanApplication.Status.DISBURSED:
-            ApplicationService._apply_disbursement(application, user)
+        for effect in edge.effects:
+            effect(application, user)
+        for hook in edge.commit_hooks:
+            transaction.on_commit(lambda hook=hook: hook(application, user))
 
         return application
 
+    @staticmethod
+    def allowed_transitions(applications, user=None):
+        """
+        {application pk: [statuses it can move to]} for many applications,
+        evaluated in batches and without writing anything.
+        """
+        return machine.allowed_transitions(list(applications), user)
+
     @staticmethod
     def _apply_disbursement(application, user):
         """
@@ -104,9 +156,10 @@ class ApplicationService:
         if BlacklistService.is_blacklisted(borrower):
             raise ValidationError("Disbursement blocked: The user is currently blacklisted.")
 
-        borrower.balance += application.amount
-        borrower.save()
-        
+        # Atomic increment: other instances of the same borrower may be stale
+        type(borrower).objects.filter(pk=borrower.pk).update(balance=F('balance') + application.amount)
+        borrower.refresh_from_db(fields=['balance'])
+
         # In a real system, we'd also create a Transaction record here
         from core.models import Transaction
         Transaction.objects.create(
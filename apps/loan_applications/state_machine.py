@@ -0,0 +1,229 @@
+"""
+Declarative state machine for LoanApplication.status.
+
+Edges, guards, in-transaction effects and post-commit hooks are registered
+once at import. Guards work on lists of applications so the same code
+answers "may this application move?" during a transition and "which
+moves are open for these N applications?" when rendering officer UIs.
+
+A guard is called as guard(applications, user, dry_run) and returns
+{application pk: error message} for the applications it blocks. With
+dry_run=True it must not write anything (no audit records).
+"""
+from collections import defaultdict
+from django.core.exceptions import ValidationError
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from .models import LoanApplication
+
+Status = LoanApplication.Status
+
+
+class Edge:
+    __slots__ = ('source', 'target', 'declared', 'event_type', 'guards', 'effects', 'commit_hooks')
+
+    def __init__(self, source, target, declared):
+        self.source = source
+        self.target = target
+        # Undeclared edges exist for staff overrides only
+        self.declared = declared
+        self.event_type = None
+        self.guards = []
+        self.effects = []
+        self.commit_hooks = []
+
+
+class StateMachine:
+    def __init__(self, states):
+        self.states = list(states)
+        self.edges = {
+            (source, target): Edge(source, target, declared=False)
+            for source in self.states for target in self.states if source != target
+        }
+
+    def _matching(self, targets, sources):
+        return [
+            edge for edge in self.edges.values()
+            if edge.target in targets and (sources is None or edge.source in sources)
+        ]
+
+    def allow(self, source, *targets):
+        for target in targets:
+            self.edges[(source, target)].declared = True
+
+    def emit(self, target, event_type):
+        """
+        Audit event type recorded when entering `target`.
+        """
+        for edge in self._matching([target], None):
+            edge.event_type = event_type
+
+    def guard(self, targets, sources=None):
+        def register(fn):
+            for edge in self._matching(targets, sources):
+                edge.guards.append(fn)
+            return fn
+        return register
+
+    def effect(self, targets, sources=None):
+        """
+        Registers fn(application, user), run inside the transition's transaction.
+        """
+        def register(fn):
+            for edge in self._matching(targets, sources):
+                edge.effects.append(fn)
+            return fn
+        return register
+
+    def on_commit(self, targets, sources=None):
+        """
+        Registers fn(application, user), run once the transition has committed.
+        """
+        def register(fn):
+            for edge in self._matching(targets, sources):
+                edge.commit_hooks.append(fn)
+            return fn
+        return register
+
+    def edge(self, source, target):
+        return self.edges[(source, target)]
+
+    @staticmethod
+    def is_staff(user):
+        return user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']
+
+    def check(self, application, target, user):
+        """
+        Raises ValidationError if `application` may not move to `target`.
+        Runs the live guards (a risk evaluation is audited).
+        """
+        edge = self.edge(application.status, target)
+        if not edge.declared and not self.is_staff(user):
+            raise ValidationError(f"Invalid transition from {edge.source} to {edge.target}")
+        for guard in edge.guards:
+            failures = guard([application], user, False)
+            if application.pk in failures:
+                raise ValidationError(failures[application.pk])
+        return edge
+
+    def allowed_transitions(self, applications, user=None):
+        """
+        {application pk: [target statuses]} along declared edges whose guards
+        pass, for many applications at once. Each guard runs once per
+        source status over all applications in it, without side effects.
+        """
+        by_status = defaultdict(list)
+        for application in applications:
+            by_status[application.status].append(application)
+
+        allowed = {}
+        for source, group in by_status.items():
+            results = {}
+            for edge in self.edges.values():
+                if edge.source != source or not edge.declared:
+                    continue
+                blocked = set()
+                for guard in edge.guards:
+                    if guard not in results:
+                        results[guard] = guard(group, user, True)
+                    blocked.update(results[guard])
+                for application in group:
+                    if application.pk not in blocked:
+                        allowed.setdefault(application.pk, []).append(edge.target)
+            for application in group:
+                allowed.setdefault(application.pk, [])
+        return allowed
+
+
+machine = StateMachine(Status.values)
+
+machine.allow(Status.DRAFT, Status.SUBMITTED)
+machine.allow(Status.SUBMITTED, Status.UNDER_REVIEW, Status.REJECTED)
+machine.allow(Status.UNDER_REVIEW, Status.APPROVED, Status.REJECTED)
+machine.allow(Status.APPROVED, Status.DISBURSED)
+
+
+def _register_events():
+    from compliance.events import AuditEventType
+    machine.emit(Status.APPROVED, AuditEventType.LOAN_APPROVED)
+    machine.emit(Status.REJECTED, AuditEventType.LOAN_REJECTED)
+    machine.emit(Status.DISBURSED, AuditEventType.LOAN_DISBURSED)
+    machine.emit(Status.SUBMITTED, AuditEventType.LOAN_APPLICATION_SUBMITTED)
+
+
+_register_events()
+
+
+@machine.guard([Status.SUBMITTED])
+def kyc_verified(applications, user, dry_run):
+    prefetch_related_objects(applications, 'borrower__kyc_profile')
+    message = "KYC must be VERIFIED before submitting an application."
+    return {
+        application.pk: message for application in applications
+        if not hasattr(application.borrower, 'kyc_profile') or application.borrower.kyc_profile.status != 'VERIFIED'
+    }
+
+
+@machine.guard([Status.SUBMITTED], sources=[Status.DRAFT])
+def within_product_limits(applications, user, dry_run):
+    prefetch_related_objects(applications, 'product')
+    failures = {}
+    for application in applications:
+        product = application.product
+        if application.amount < product.min_amount or application.amount > product.max_amount:
+            failures[application.pk] = f"Amount must be between {product.min_amount} and {product.max_amount}"
+        elif application.term < product.min_term or application.term > product.max_term:
+            failures[application.pk] = f"Term must be between {product.min_term} and {product.max_term}"
+    return failures
+
+
+@machine.guard([Status.UNDER_REVIEW, Status.APPROVED])
+def risk_checks_pass(applications, user, dry_run):
+    from compliance.features import load_risk_features_bulk
+    from compliance.risk_engine import RiskEngineService
+    failures = {}
+    if dry_run:
+        prefetch_related_objects(applications, 'product')
+        features = load_risk_features_bulk(
+            [application.borrower_id for application in applications], RiskEngineService.LATE_PAYMENT_THRESHOLD_DAYS
+        )
+        for application in applications:
+            is_passed, _, message, _, _ = RiskEngineService._check(application, features[application.borrower_id])
+            if not is_passed:
+                failures[application.pk] = f"Compliance Check Failed: {message}"
+        return failures
+
+    for application in applications:
+        result = RiskEngineService.evaluate(application, actor=user)
+        if not result.is_passed:
+            failures[application.pk] = f"Compliance Check Failed: {result.message}"
+    return failures
+
+
+@machine.guard(Status.values, sources=[Status.SUBMITTED, Status.UNDER_REVIEW])
+def not_claimed_by_other(applications, user, dry_run):
+    from .queue import WorkQueueService
+    now = timezone.now()
+    return {
+        application.pk: "Application is claimed by another officer."
+        for application in applications if WorkQueueService.held_by_other(application, user, now)
+    }
+
+
+@machine.effect([Status.SUBMITTED, Status.UNDER_REVIEW])
+def reprioritize(application, user):
+    from .queue import WorkQueueService
+    WorkQueueService.reprioritize(application)
+
+
+@machine.effect([Status.APPROVED, Status.REJECTED, Status.DISBURSED], sources=[Status.SUBMITTED, Status.UNDER_REVIEW])
+def release_claim(application, user):
+    if application.claimed_by_id is not None:
+        application.claimed_by, application.claim_expires_at = None, None
+        LoanApplication.objects.filter(pk=application.pk).update(claimed_by=None, claim_expires_at=None)
+
+
+@machine.effect([Status.DISBURSED])
+def credit_borrower(application, user):
+    from .services import ApplicationService
+    ApplicationService._apply_disbursement(application, user)
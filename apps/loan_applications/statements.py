@@ -0,0 +1,406 @@
+"""
+Background processing of BANK_STATEMENT documents.
+
+Uploaded statements are parsed on a worker pool into StatementTransaction
+rows and summarized into income and expense features. The application's
+statement_features (the sum over its processed statements) are what the
+risk rules see as has_statement, monthly_income, monthly_expenses and
+net_monthly_income.
+
+Statements are read as a stream, one line at a time, so memory does not
+grow with the file. CSV exports (date, amount or credit/debit columns,
+description), OFX/QFX files and plain-text statements with one
+"date description amount" line per transaction are understood. Rows that
+cannot be read (footers such as "Closing balance", blank amounts) are
+skipped and counted in the features as skipped_rows; a statement fails
+only when no transaction in it can be read.
+
+A failed attempt is retried with exponential backoff up to MAX_ATTEMPTS,
+except for files that are not a statement at all (StatementError), which
+fail at once. `python manage.py process_statements` resubmits retries
+that are due and statements whose worker died.
+"""
+import csv
+import io
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from core.workers import get_pool
+from .models import ApplicationDocument, LoanApplication, StatementAnalysis, StatementTransaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+MAX_ATTEMPTS = 4
+# Retry n waits RETRY_BACKOFF * 4**(n - 1)
+RETRY_BACKOFF = timedelta(minutes=1)
+# Running analyses older than this are treated as dead
+STALE_AFTER = timedelta(minutes=15)
+INSERT_BATCH_SIZE = 1000
+
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d.%m.%Y', '%Y%m%d', '%d-%m-%Y']
+
+CSV_COLUMNS = {
+    'date': ['date', 'posted', 'posting date', 'transaction date', 'booking date', 'value date'],
+    'amount': ['amount', 'transaction amount'],
+    'credit': ['credit', 'deposit', 'money in', 'paid in'],
+    'debit': ['debit', 'withdrawal', 'money out', 'paid out'],
+    'description': ['description', 'details', 'memo', 'narrative', 'payee', 'name', 'reference'],
+}
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+TEXT_LINE = re.compile(
+    r'^\s*(?P<date>\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{4})\s+(?P<description>.*?)\s+'
+    r'(?P<amount>[-+]?\(?[$€£]?[\d,]+\.\d{2}\)?)(?:\s*(?P<side>CR|DR))?\s*$',
+    re.IGNORECASE
+)
+NOT_AMOUNT = re.compile(r'[^\d.\-]')
+
+
+class StatementError(Exception):
+    """
+    The file is not a statement this module can read; retrying will not help.
+    """
+
+
+def parse_date(value):
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise StatementError(f"Unrecognized date '{value}'.")
+
+
+def parse_amount(value):
+    value = value.strip()
+    negative = value.startswith('(') and value.endswith(')')
+    try:
+        amount = Decimal(NOT_AMOUNT.sub('', value))
+    except InvalidOperation:
+        raise StatementError(f"Unrecognized amount '{value}'.")
+    return -amount if negative else amount
+
+
+def detect_format(name, head):
+    name = name.lower()
+    if name.endswith(('.ofx', '.qfx')) or 'OFXHEADER' in head or '<OFX>' in head.upper():
+        return 'ofx'
+    if name.endswith('.csv'):
+        return 'csv'
+    first_line = head.split('\n', 1)[0].lower()
+    if ',' in first_line and any(column in first_line for column in CSV_COLUMNS['date']):
+        return 'csv'
+    return 'text'
+
+
+def _csv_column(header, kind):
+    for position, name in enumerate(header):
+        if name in CSV_COLUMNS[kind]:
+            return position
+    return None
+
+
+def _skip(on_skip, error):
+    if on_skip is not None:
+        on_skip(error)
+
+
+def parse_csv(lines, on_skip=None):
+    """
+    Yields (date, amount, description) per data row. Rows that do not
+    parse are passed to `on_skip` as StatementErrors and left out.
+    """
+    reader = csv.reader(lines)
+    header = [name.strip().lower() for name in next(reader, [])]
+    date, amount, description = (_csv_column(header, kind) for kind in ['date', 'amount', 'description'])
+    credit, debit = _csv_column(header, 'credit'), _csv_column(header, 'debit')
+    if date is None or (amount is None and credit is None and debit is None):
+        raise StatementError("CSV statement needs a date column and an amount (or credit/debit) column.")
+
+    for row in reader:
+        row += [''] * (len(header) - len(row))
+        if not row[date].strip():
+            continue
+        try:
+            if amount is not None:
+                value = parse_amount(row[amount])
+            else:
+                value = Decimal('0')
+                if credit is not None and row[credit].strip():
+                    value += parse_amount(row[credit])
+                if debit is not None and row[debit].strip():
+                    value -= abs(parse_amount(row[debit]))
+            posted_on = parse_date(row[date])
+        except StatementError as e:
+            _skip(on_skip, StatementError(f"Line {reader.line_num}: {e}"))
+            continue
+        yield posted_on, value, row[description].strip() if description is not None else ''
+
+
+def parse_ofx(lines, on_skip=None):
+    """
+    Reads <STMTTRN> blocks from SGML (OFX 1.x) or XML (OFX 2.x) files.
+    Blocks that do not parse are passed to `on_skip` and left out.
+    """
+    current = None
+    for line in lines:
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield from _ofx_transaction(current, on_skip)
+                    current = None
+                elif not closing:
+                    current = {}
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+    if current is not None:
+        yield from _ofx_transaction(current, on_skip)
+
+
+def _ofx_transaction(fields, on_skip):
+    try:
+        if 'DTPOSTED' not in fields or 'TRNAMT' not in fields:
+            raise StatementError("OFX transaction without DTPOSTED or TRNAMT.")
+        yield (
+            parse_date(fields['DTPOSTED'][:8]),
+            parse_amount(fields['TRNAMT']),
+            fields.get('NAME') or fields.get('MEMO') or '',
+        )
+    except StatementError as e:
+        _skip(on_skip, e)
+
+
+def parse_text(lines, on_skip=None):
+    """
+    One transaction per "date description amount [CR|DR]" line; other lines
+    (headers, balances, page footers) are ignored. Transaction lines that do
+    not parse are passed to `on_skip` and left out.
+    """
+    for line in lines:
+        match = TEXT_LINE.match(line)
+        if match is None:
+            continue
+        try:
+            amount = parse_amount(match['amount'])
+            posted_on = parse_date(match['date'])
+        except StatementError as e:
+            _skip(on_skip, e)
+            continue
+        if (match['side'] or '').upper() == 'DR':
+            amount = -abs(amount)
+        yield posted_on, amount, match['description'].strip()
+
+
+PARSERS = {'csv': parse_csv, 'ofx': parse_ofx, 'text': parse_text}
+
+
+class StatementSummary:
+    """
+    Running income/expense totals over a stream of transactions.
+    """
+    def __init__(self):
+        self.count = 0
+        self.skipped = 0
+        self.income = Decimal('0')
+        self.expenses = Decimal('0')
+        self.months = set()
+        self.first = None
+        self.last = None
+
+    def add(self, posted_on, amount):
+        self.count += 1
+        if amount >= 0:
+            self.income += amount
+        else:
+            self.expenses -= amount
+        self.months.add(f"{posted_on:%Y-%m}")
+        self.first = posted_on if self.first is None else min(self.first, posted_on)
+        self.last = posted_on if self.last is None else max(self.last, posted_on)
+
+    def skip(self, error):
+        self.skipped += 1
+
+    def as_dict(self):
+        return {
+            'transactions': self.count,
+            'skipped_rows': self.skipped,
+            'income_total': str(self.income),
+            'expense_total': str(self.expenses),
+            'months': sorted(self.months),
+            'period_start': self.first.isoformat() if self.first else None,
+            'period_end': self.last.isoformat() if self.last else None,
+        }
+
+
+def application_features(analyses):
+    """
+    Monthly income and expenses over the months covered by an
+    application's processed statements.
+    """
+    income, expenses, months = Decimal('0'), Decimal('0'), set()
+    for features in analyses:
+        income += Decimal(features['income_total'])
+        expenses += Decimal(features['expense_total'])
+        months.update(features['months'])
+    if not months:
+        return {}
+    count = Decimal(len(months))
+    cent = Decimal('0.01')
+    monthly_income = (income / count).quantize(cent)
+    monthly_expenses = (expenses / count).quantize(cent)
+    return {
+        'has_statement': True,
+        'statements': len(analyses),
+        'months': len(months),
+        'monthly_income': str(monthly_income),
+        'monthly_expenses': str(monthly_expenses),
+        'net_monthly_income': str(monthly_income - monthly_expenses),
+    }
+
+
+class StatementProcessingService:
+    @staticmethod
+    def pool():
+        return get_pool('statements', getattr(settings, 'STATEMENT_WORKERS', DEFAULT_WORKERS))
+
+    @classmethod
+    def enqueue(cls, document):
+        """
+        Queues a BANK_STATEMENT document for processing once the current
+        transaction commits. Other document types are ignored.
+        """
+        if document.document_type != ApplicationDocument.DocType.BANK_STATEMENT:
+            return None
+        analysis, _ = StatementAnalysis.objects.get_or_create(document=document)
+        transaction.on_commit(lambda: cls.pool().submit(cls.process, analysis.pk))
+        return analysis
+
+    @classmethod
+    def retry_due(cls, now=None, run=None):
+        """
+        Requeues analyses whose worker died and submits every queued one
+        that is due (to `run` instead of the pool, if given). Returns the
+        submitted ids.
+        """
+        now = now or timezone.now()
+        StatementAnalysis.objects.filter(
+            status=StatementAnalysis.Status.RUNNING, started_at__lt=now - STALE_AFTER
+        ).update(status=StatementAnalysis.Status.QUEUED, next_attempt_at=now, error="Worker stopped responding.")
+        due = list(
+            StatementAnalysis.objects.filter(status=StatementAnalysis.Status.QUEUED)
+            .exclude(next_attempt_at__gt=now).order_by('pk').values_list('pk', flat=True)
+        )
+        for analysis_id in due:
+            if run is not None:
+                run(analysis_id)
+            else:
+                cls.pool().submit(cls.process, analysis_id)
+        return due
+
+    @classmethod
+    def process(cls, analysis_id):
+        """
+        Parses one statement. Called on a worker thread.
+        """
+        now = timezone.now()
+        claimed = StatementAnalysis.objects.filter(pk=analysis_id, status=StatementAnalysis.Status.QUEUED).exclude(
+            next_attempt_at__gt=now
+        ).update(status=StatementAnalysis.Status.RUNNING, attempts=F('attempts') + 1, started_at=now)
+        if not claimed:
+            return
+        analysis = StatementAnalysis.objects.select_related('document').get(pk=analysis_id)
+        try:
+            cls._parse(analysis)
+        except Exception as e:
+            permanent = isinstance(e, StatementError) or analysis.attempts >= MAX_ATTEMPTS
+            if isinstance(e, StatementError):
+                logger.warning(f"Statement analysis {analysis_id} rejected the file: {e}")
+            elif permanent:
+                logger.exception(f"Statement analysis {analysis_id} failed after {analysis.attempts} attempts.")
+            else:
+                logger.warning(f"Statement analysis {analysis_id} failed (attempt {analysis.attempts}): {e}")
+            StatementAnalysis.objects.filter(pk=analysis_id).update(
+                status=StatementAnalysis.Status.FAILED if permanent else StatementAnalysis.Status.QUEUED,
+                next_attempt_at=None if permanent else timezone.now() + RETRY_BACKOFF * 4 ** (analysis.attempts - 1),
+                error=str(e),
+                finished_at=timezone.now() if permanent else None,
+            )
+            return
+        cls.refresh_application(analysis.document.application_id)
+
+    @classmethod
+    def _parse(cls, analysis):
+        timings = {}
+        started = time.perf_counter()
+        document = analysis.document
+        with document.file.open('rb') as raw:
+            text = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+            head = text.read(4096)
+            analysis.format = detect_format(document.file.name, head)
+            lines = _prepend(head, text)
+            timings['open'] = round((time.perf_counter() - started) * 1000, 3)
+
+            summary = StatementSummary()
+            parsed = time.perf_counter()
+            with transaction.atomic():
+                # A retry replaces what an earlier attempt stored
+                analysis.transactions.all().delete()
+                batch = []
+                for posted_on, amount, description in PARSERS[analysis.format](lines, on_skip=summary.skip):
+                    summary.add(posted_on, amount)
+                    batch.append(StatementTransaction(
+                        analysis=analysis, posted_on=posted_on, amount=amount, description=description[:255]
+                    ))
+                    if len(batch) >= INSERT_BATCH_SIZE:
+                        StatementTransaction.objects.bulk_create(batch)
+                        batch = []
+                StatementTransaction.objects.bulk_create(batch)
+                if not summary.count:
+                    raise StatementError(
+                        f"No transactions found in the statement ({summary.skipped} unreadable rows skipped)."
+                        if summary.skipped else "No transactions found in the statement."
+                    )
+                timings['parse'] = round((time.perf_counter() - parsed) * 1000, 3)
+                timings['total'] = round((time.perf_counter() - started) * 1000, 3)
+
+                StatementAnalysis.objects.filter(pk=analysis.pk).update(
+                    status=StatementAnalysis.Status.DONE,
+                    format=analysis.format,
+                    transaction_count=summary.count,
+                    features=summary.as_dict(),
+                    timings_ms=timings,
+                    error='',
+                    next_attempt_at=None,
+                    finished_at=timezone.now(),
+                )
+
+    @staticmethod
+    def refresh_application(application_id):
+        """
+        Recomputes the application's statement_features from its processed statements.
+        """
+        analyses = list(StatementAnalysis.objects.filter(
+            document__application_id=application_id, status=StatementAnalysis.Status.DONE
+        ).values_list('features', flat=True))
+        features = application_features(analyses)
+        LoanApplication.objects.filter(pk=application_id).update(statement_features=features)
+        return features
+
+
+def _prepend(head, text):
+    """
+    Lines of `head` followed by the rest of `text`, without re-reading.
+    """
+    rest = text.readline()
+    first = io.StringIO(head + rest)
+    yield from first
+    yield from text
@@ -0,0 +1,400 @@
+from decimal import Decimal
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from compliance.events import AuditEventType
+from compliance.models import AuditLog
+from compliance.risk_engine import RiskEngineService
+from loan_applications.models import LoanApplication
+from loan_applications.services import ApplicationService
+from loan_products.models import LoanProduct
+
+User = get_user_model()
+
+
+class BulkTransitionTests(TestCase):
+    def setUp(self):
+        from compliance.blacklist_cache import membership
+        # As at process start: blacklist membership is already in memory
+        membership.reset()
+        membership.load()
+        self.user = User.objects.create_user(username='borrower', password='password')
+        self.product = LoanProduct.objects.create(
+            name="Test Product", min_amount=100, max_amount=10000, min_term=1, max_term=12, default_interest_rate=10
+        )
+        self.app = LoanApplication.objects.create(borrower=self.user, product=self.product, amount=1000, term=6)
+        self.officer = User.objects.create_user(username='officer', password='password', role='LOAN_OFFICER')
+
+    def test_bulk_transition_reports_per_item_outcomes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIClient
+        from loan_applications.models import StatusHistory
+        borrowers = [User.objects.create_user(username=f'bulk{i}', password='password') for i in range(4)]
+        borrowers[1].is_blacklisted = True
+        borrowers[1].save()
+        apps = [
+            LoanApplication.objects.create(
+                borrower=borrower, product=self.product, amount=amount, term=6, status=LoanApplication.Status.SUBMITTED
+            )
+            for borrower, amount in zip(borrowers, [1000, 1000, 6000, 2000])
+        ]
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = '/api/applications/bulk_transition/'
+        payload = {'application_ids': [a.pk for a in apps] + [999999], 'to_status': 'UNDER_REVIEW', 'reason': 'Morning queue'}
+        self.assertEqual(client.post(url, payload, format='json').status_code, 403)
+
+        client.force_authenticate(user=self.officer)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (2, 3))
+        self.assertEqual(
+            [(r['application_id'], r['ok'], r['status']) for r in response.data['results']],
+            [(apps[0].pk, True, 'UNDER_REVIEW'), (apps[1].pk, False, 'SUBMITTED'), (apps[2].pk, False, 'SUBMITTED'),
+             (apps[3].pk, True, 'UNDER_REVIEW'), (999999, False, None)]
+        )
+        self.assertIn("blacklist", response.data['results'][1]['error'])
+        self.assertEqual(StatusHistory.objects.filter(reason='Morning queue').count(), 2)
+        # Only the successful items keep their risk evaluation audit records
+        self.assertEqual(AuditLog.objects.filter(event_type=AuditEventType.COMPLIANCE_RISK_EVALUATION).count(), 2)
+        # Applications with borrowers, KYC and products in one query, features in one more
+        self.assertEqual(sum('FROM "accounts_user"' in q['sql'] and 'active_loan_count' in q['sql'] for q in queries), 1)
+        self.assertEqual(sum(q['sql'].startswith('SELECT') and 'FROM "loan_applications_loanapplication"' in q['sql'] for q in queries), 1)
+        self.assertEqual(sum('FROM "accounts_kycprofile"' in q['sql'] for q in queries), 0)
+
+    def test_disbursements_to_one_borrower_are_all_credited(self):
+        apps = [
+            LoanApplication.objects.create(
+                borrower=self.user, product=self.product, amount=amount, term=6, status=LoanApplication.Status.APPROVED
+            )
+            for amount in [1000, 250]
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            results = ApplicationService.bulk_transition([a.pk for a in apps], LoanApplication.Status.DISBURSED, self.officer)
+        self.assertEqual([r['ok'] for r in results], [True, True])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('1250.00'))
+
+    def test_unexpected_errors_are_reported_per_item(self):
+        from loan_applications import services
+        second = LoanApplication.objects.create(
+            borrower=self.user, product=self.product, amount=500, term=6, status=LoanApplication.Status.APPROVED
+        )
+        self.app.status = LoanApplication.Status.APPROVED
+        self.app.save()
+        real_transition = ApplicationService._transition
+
+        def transition(application, *args):
+            if application.pk == self.app.pk:
+                raise RuntimeError("storage unavailable")
+            return real_transition(application, *args)
+
+        with patch.object(services.ApplicationService, '_transition', side_effect=transition), \
+                self.assertLogs('loan_applications.services', 'ERROR'):
+            results = ApplicationService.bulk_transition(
+                [self.app.pk, second.pk], LoanApplication.Status.REJECTED, self.officer, chunk_size=1
+            )
+        self.assertEqual(
+            [(r['ok'], r['status'], r['error']) for r in results],
+            [(False, 'APPROVED', "Unexpected error."), (True, 'REJECTED', None)]
+        )
+
+
+class StateMachineTests(TestCase):
+    def setUp(self):
+        BulkTransitionTests.setUp(self)
+
+    def test_allowed_transitions_are_batched_and_side_effect_free(self):
+        from rest_framework.test import APIClient
+        from accounts.models import KYCProfile
+        from loan_applications.services import ApplicationService
+        from loan_applications.state_machine import machine
+        KYCProfile.objects.create(
+            user=self.user, full_name="Bo Rower", id_number='K-1', date_of_birth='1990-01-01', status='VERIFIED'
+        )
+        unverified = User.objects.create_user(username='unverified', password='password')
+        draft_ok = self.app
+        draft_too_big = LoanApplication.objects.create(borrower=self.user, product=self.product, amount=20000, term=6)
+        draft_no_kyc = LoanApplication.objects.create(borrower=unverified, product=self.product, amount=500, term=6)
+        submitted = LoanApplication.objects.create(
+            borrower=self.user, product=self.product, amount=500, term=6, status=LoanApplication.Status.SUBMITTED
+        )
+        risky = LoanApplication.objects.create(
+            borrower=self.user, product=self.product, amount=6000, term=6, status=LoanApplication.Status.SUBMITTED
+        )
+
+        officer = self.officer
+        client = APIClient()
+        client.force_authenticate(user=officer)
+        ids = [draft_ok.pk, draft_too_big.pk, draft_no_kyc.pk, submitted.pk, risky.pk]
+        # applications (+ product, KYC), risk features
+        with self.assertNumQueries(2):
+            response = client.get('/api/applications/allowed_transitions/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.data, {
+            str(draft_ok.pk): ['SUBMITTED'],
+            str(draft_too_big.pk): [],
+            str(draft_no_kyc.pk): [],
+            str(submitted.pk): ['UNDER_REVIEW', 'REJECTED'],
+            str(risky.pk): ['REJECTED'],
+        })
+        self.assertFalse(AuditLog.objects.filter(event_type=AuditEventType.COMPLIANCE_RISK_EVALUATION).exists())
+
+        # Post-commit hooks run once the transition's transaction commits
+        seen = []
+        hook = machine.on_commit([LoanApplication.Status.REJECTED])(lambda application, user: seen.append(application.pk))
+        self.addCleanup(lambda: [edge.commit_hooks.remove(hook) for edge in machine.edges.values() if hook in edge.commit_hooks])
+        with self.captureOnCommitCallbacks(execute=True):
+            ApplicationService.transition_status(risky, LoanApplication.Status.REJECTED, officer)
+            self.assertEqual(seen, [])
+        self.assertEqual(seen, [risky.pk])
+
+
+class ApplicationAdminTests(TestCase):
+    def setUp(self):
+        BulkTransitionTests.setUp(self)
+        self.admin = User.objects.create_superuser(username='admin', password='password', role='ADMIN')
+        self.client.force_login(self.admin)
+
+    def test_status_change_keeps_other_edits(self):
+        self.app.status = LoanApplication.Status.SUBMITTED
+        self.app.save()
+        prefixes = ['documents', 'status_history']
+        data = {
+            'borrower': self.user.pk, 'product': self.product.pk, 'amount': '1500.00', 'term': 9,
+            'status': 'REJECTED', 'remarks': "Edited with the status",
+        }
+        for prefix in prefixes:
+            data.update({f'{prefix}-TOTAL_FORMS': 0, f'{prefix}-INITIAL_FORMS': 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/admin/loan_applications/loanapplication/{self.app.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+
+        self.app.refresh_from_db()
+        self.assertEqual(
+            (self.app.status, self.app.amount, self.app.term, self.app.remarks),
+            ('REJECTED', Decimal('1500.00'), 9, "Edited with the status")
+        )
+        self.assertEqual(self.app.status_history.get().reason, "Manual Admin Update")
+
+
+class WorkQueueTests(TestCase):
+    def setUp(self):
+        BulkTransitionTests.setUp(self)
+
+    def test_work_queue_orders_by_priority_and_leases_claims(self):
+        from datetime import timedelta
+        from rest_framework.test import APIClient
+        from loan_applications.queue import WorkQueueService
+        from loan_applications.services import ApplicationService
+        now = timezone.now()
+
+        def queued(amount, hours_ago):
+            application = LoanApplication.objects.create(
+                borrower=self.user, product=self.product, amount=amount, term=6, status=LoanApplication.Status.SUBMITTED
+            )
+            LoanApplication.objects.filter(pk=application.pk).update(created_at=now - timedelta(hours=hours_ago))
+            return application
+
+        old_small = queued(500, hours_ago=48)
+        new_large = queued(4000, hours_ago=1)
+        new_small = queued(500, hours_ago=1)
+        old_risky = queued(6000, hours_ago=60)  # fails the risk check
+        self.assertEqual(WorkQueueService.refresh(), 4)
+
+        first = User.objects.create_user(username='first', password='password', role='LOAN_OFFICER')
+        second = User.objects.create_user(username='second', password='password', role='LOAN_OFFICER')
+        client = APIClient()
+        client.force_authenticate(user=first)
+
+        # applications (+ product, borrower, claimant), documents, history
+        with self.assertNumQueries(3):
+            response = client.get('/api/applications/work_queue/', {'page_size': 2})
+        self.assertEqual([item['id'] for item in response.data['results']], [old_small.pk, new_large.pk])
+        response = client.get('/api/applications/work_queue/', {'page_size': 2, 'cursor': response.data['next_cursor']})
+        self.assertEqual([item['id'] for item in response.data['results']], [new_small.pk, old_risky.pk])
+        self.assertIsNone(response.data['next_cursor'])
+        self.assertEqual(client.get('/api/applications/work_queue/', {'cursor': 'junk'}).status_code, 400)
+
+        # Claims: one holder at a time until the lease lapses
+        self.assertEqual(client.post(f'/api/applications/{old_small.pk}/claim/').status_code, 200)
+        other = APIClient()
+        other.force_authenticate(user=second)
+        self.assertEqual(other.post(f'/api/applications/{old_small.pk}/claim/').status_code, 409)
+        response = other.post('/api/applications/claim_next/', {'count': 1}, format='json')
+        self.assertEqual([item['id'] for item in response.data], [new_large.pk])
+        response = other.get('/api/applications/work_queue/', {'unclaimed': 'true'})
+        self.assertEqual([item['id'] for item in response.data['results']], [new_large.pk, new_small.pk, old_risky.pk])
+
+        # Another officer's claim blocks transitions; leaving the queue releases it
+        old_small.refresh_from_db()
+        with self.assertRaises(ValidationError):
+            ApplicationService.transition_status(old_small, LoanApplication.Status.REJECTED, second)
+        ApplicationService.transition_status(old_small, LoanApplication.Status.REJECTED, first)
+        old_small.refresh_from_db()
+        self.assertIsNone(old_small.claimed_by_id)
+
+        LoanApplication.objects.filter(pk=new_large.pk).update(claim_expires_at=now - timedelta(seconds=1))
+        self.assertEqual(client.post(f'/api/applications/{new_large.pk}/claim/').status_code, 200)
+        self.assertEqual(other.post(f'/api/applications/{new_large.pk}/release/').status_code, 409)
+        self.assertEqual(client.post(f'/api/applications/{new_large.pk}/release/').status_code, 204)
+
+    def test_new_applications_are_scored_on_insert(self):
+        from datetime import timedelta
+        from loan_applications.queue import WorkQueueService
+        older = LoanApplication.objects.create(
+            borrower=self.user, product=self.product, amount=500, term=6, status=LoanApplication.Status.SUBMITTED
+        )
+        LoanApplication.objects.filter(pk=older.pk).update(
+            priority=older.priority + 24, created_at=older.created_at - timedelta(days=1)
+        )
+        # Created straight into the queue, never rescored: still behind the older one
+        newer = LoanApplication.objects.create(
+            borrower=self.user, product=self.product, amount=500, term=6, status=LoanApplication.Status.SUBMITTED
+        )
+        self.assertLess(newer.priority, 0)
+        applications, _ = WorkQueueService.page()
+        self.assertEqual([application.pk for application in applications], [older.pk, newer.pk])
+
+
+class StatementProcessingTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        from rest_framework.test import APIClient
+        self.borrower = User.objects.create_user(username='borrower', password='password')
+        self.product = LoanProduct.objects.create(
+            name="Test Product", min_amount=100, max_amount=10000, min_term=1, max_term=12, default_interest_rate=10
+        )
+        self.app = LoanApplication.objects.create(borrower=self.borrower, product=self.product, amount=1000, term=6)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.borrower)
+
+    def _upload(self, name, content, document_type='BANK_STATEMENT'):
+        from unittest.mock import patch
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from loan_applications.statements import StatementProcessingService
+        with patch.object(StatementProcessingService, 'pool') as pool, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/applications/{self.app.pk}/upload_document/',
+                {'document_type': document_type, 'file': SimpleUploadedFile(name, content)}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 201)
+        return pool.return_value.submit
+
+    def test_statements_are_parsed_into_transactions_and_features(self):
+        from loan_applications.models import StatementAnalysis
+        from loan_applications.statements import StatementProcessingService
+        submit = self._upload('march.csv', (
+            "Date,Description,Credit,Debit\n"
+            "2026-03-01,Salary,\"3,000.00\",\n"
+            "2026-03-05,Rent,,1200.00\n"
+            "2026-03-20,Groceries,,300.00\n"
+        ).encode('utf-8'))
+        self._upload('april.ofx', (
+            "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20260401120000<TRNAMT>3000.00<NAME>Salary</STMTTRN>\n"
+            "<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20260405\n<TRNAMT>-1500.00\n<NAME>Rent\n</STMTTRN>\n"
+            "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+        ).encode('utf-8'))
+        self._upload('may.txt', (
+            "ACME BANK  Statement for May 2026\n"
+            "Date        Description          Amount\n"
+            "01/05/2026  Salary               3,000.00 CR\n"
+            "03/05/2026  Rent                 1,200.00 DR\n"
+            "Closing balance                  5,800.00\n"
+        ).encode('utf-8'))
+        self._upload('id.pdf', b'%PDF-1.4', document_type='OTHER').assert_not_called()
+
+        self.assertEqual(StatementAnalysis.objects.count(), 3)
+        analysis_id = submit.call_args.args[1]
+        for analysis in StatementAnalysis.objects.order_by('pk'):
+            StatementProcessingService.process(analysis.pk)
+
+        analyses = {a.format: a for a in StatementAnalysis.objects.all()}
+        self.assertEqual(set(analyses), {'csv', 'ofx', 'text'})
+        csv_analysis = StatementAnalysis.objects.get(pk=analysis_id)
+        self.assertEqual(csv_analysis.status, StatementAnalysis.Status.DONE)
+        self.assertEqual(
+            sorted(csv_analysis.transactions.values_list('amount', flat=True)),
+            [Decimal('-1200.00'), Decimal('-300.00'), Decimal('3000.00')]
+        )
+        self.assertEqual(analyses['ofx'].features['expense_total'], '1500.00')
+        self.assertEqual(analyses['text'].transaction_count, 2)
+        self.assertEqual(set(csv_analysis.timings_ms), {'open', 'parse', 'total'})
+
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.statement_features, {
+            'has_statement': True, 'statements': 3, 'months': 3,
+            'monthly_income': '3000.00', 'monthly_expenses': '1400.00', 'net_monthly_income': '1600.00',
+        })
+
+        # Product rules can now use the statement features
+        self.product.eligibility_criteria = {'rules': [{
+            'id': 'S01', 'code': 'LOW_NET_INCOME',
+            'require': {'field': 'net_monthly_income', 'op': 'gte', 'value': '2000'},
+            'message': "Net monthly income ${net_monthly_income} is below $2000.",
+        }]}
+        self.product.save()
+        result = RiskEngineService.evaluate(self.app)
+        self.assertEqual(result.failed_rule_code, 'LOW_NET_INCOME')
+
+    def test_failures_are_retried_with_backoff_unless_the_file_is_unreadable(self):
+        from datetime import timedelta
+        from unittest.mock import patch
+        from loan_applications.models import StatementAnalysis
+        from loan_applications import statements
+        self._upload('junk.csv', b"foo,bar\n1,2\n")
+        self._upload('good.csv', b"date,amount,description\n2026-03-01,100.00,Deposit\n")
+        junk, good = StatementAnalysis.objects.order_by('pk')
+
+        statements.StatementProcessingService.process(junk.pk)
+        junk.refresh_from_db()
+        self.assertEqual((junk.status, junk.attempts), (StatementAnalysis.Status.FAILED, 1))
+
+        with patch.object(statements, 'parse_csv', side_effect=OSError("storage unavailable")), \
+                patch.dict(statements.PARSERS, csv=statements.parse_csv):
+            statements.StatementProcessingService.process(good.pk)
+        good.refresh_from_db()
+        self.assertEqual((good.status, good.attempts, good.error), (StatementAnalysis.Status.QUEUED, 1, "storage unavailable"))
+        self.assertGreater(good.next_attempt_at, timezone.now())
+
+        # Not due yet, then picked up by the retry sweep
+        self.assertEqual(statements.StatementProcessingService.retry_due(run=statements.StatementProcessingService.process), [])
+        later = timezone.now() + statements.RETRY_BACKOFF + timedelta(seconds=1)
+        with patch.object(statements.timezone, 'now', return_value=later):
+            processed = statements.StatementProcessingService.retry_due(run=statements.StatementProcessingService.process)
+        self.assertEqual(processed, [good.pk])
+        good.refresh_from_db()
+        self.assertEqual((good.status, good.attempts, good.transaction_count), (StatementAnalysis.Status.DONE, 2, 1))
+
+    def test_unreadable_rows_are_skipped_and_counted(self):
+        from loan_applications.models import StatementAnalysis
+        from loan_applications.statements import StatementProcessingService
+        self._upload('march.csv', (
+            "date,amount,description\n"
+            "2026-03-01,3000.00,Salary\n"
+            "2026-03-05,,Pending card payment\n"
+            "2026-03-06,-1200.00,Rent\n"
+            "Closing balance,1800.00,\n"
+        ).encode('utf-8'))
+        self._upload('footer.csv', b"date,amount,description\nTotal,0.00,\n")
+        good, footer_only = StatementAnalysis.objects.order_by('pk')
+        for analysis in (good, footer_only):
+            StatementProcessingService.process(analysis.pk)
+
+        good.refresh_from_db()
+        self.assertEqual((good.status, good.transaction_count), (StatementAnalysis.Status.DONE, 2))
+        self.assertEqual((good.features['skipped_rows'], good.features['income_total']), (2, '3000.00'))
+        footer_only.refresh_from_db()
+        self.assertEqual(footer_only.status, StatementAnalysis.Status.FAILED)
+        self.assertEqual(footer_only.error, "No transactions found in the statement (1 unreadable rows skipped).")
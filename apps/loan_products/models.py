@@ -40,6 +40,12 @@ class LoanProduct(AuditBaseModel):
             raise ValidationError("Minimum amount cannot be greater than maximum amount.")
         if self.min_term > self.max_term:
             raise ValidationError("Minimum term cannot be greater than maximum term.")
+        if self.eligibility_criteria and 'rules' in self.eligibility_criteria:
+            from compliance.rules import compile_rules
+            try:
+                compile_rules(self.eligibility_criteria)
+            except ValidationError as e:
+                raise ValidationError({'eligibility_criteria': e.messages})
 
     def __str__(self):
         return f"{self.name} ({self.get_interest_type_display()})"
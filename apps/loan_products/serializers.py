@@ -16,3 +16,13 @@ class LoanProductSerializer(serializers.ModelSerializer):
             'min_amount', 'max_amount', 'min_term', 'max_term', 
             'default_interest_rate', 'is_active', 'eligibility_criteria', 'fees'
         ]
+
+    def validate_eligibility_criteria(self, value):
+        if value and 'rules' in value:
+            from django.core.exceptions import ValidationError
+            from compliance.rules import compile_rules
+            try:
+                compile_rules(value)
+            except ValidationError as e:
+                raise serializers.ValidationError(e.messages)
+        return value
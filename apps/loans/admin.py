@@ -34,20 +34,21 @@ class LoanAdmin(admin.ModelAdmin):
             if form.is_valid():
                 reason = form.cleaned_data['reason']
                 count = 0
-                for loan in queryset:
-                    if loan.status != Loan.Status.CLOSED:
-                        loan.status = Loan.Status.CLOSED  # Or a dedicated WRITE_OFF status if added
-                        loan.is_active = False
-                        loan.save()
-                        
-                        AuditService.log_event(
-                            actor=request.user,
-                            target=loan,
-                            event_type=AuditEventType.ADMIN_LOAN_WRITE_OFF,
-                            description=f"Loan written off by Admin. Reason: {reason}",
-                            metadata={"reason": reason}
-                        )
-                        count += 1
+                with AuditService.buffered():
+                    for loan in queryset:
+                        if loan.status != Loan.Status.CLOSED:
+                            loan.status = Loan.Status.CLOSED  # Or a dedicated WRITE_OFF status if added
+                            loan.is_active = False
+                            loan.save()
+                            
+                            AuditService.log_event(
+                                actor=request.user,
+                                target=loan,
+                                event_type=AuditEventType.ADMIN_LOAN_WRITE_OFF,
+                                description=f"Loan written off by Admin. Reason: {reason}",
+                                metadata={"reason": reason}
+                            )
+                            count += 1
                 
                 self.message_user(request, f"Successfully wrote off {count} loans.")
                 return HttpResponseRedirect(request.get_full_path())
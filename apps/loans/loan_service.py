@@ -82,14 +82,8 @@ class LoanService:
         amount -= pay_principal
         
         # Update Status
-        total_expected = installment.principal_expected + installment.interest_expected + installment.penalty_expected
-        total_paid = installment.principal_paid + installment.interest_paid + installment.penalty_paid
-        
-        if total_paid >= total_expected:
-            installment.status = LoanInstallment.Status.PAID
-        elif total_paid > 0:
-            installment.status = LoanInstallment.Status.PARTIAL
-            
+        installment.status = LoanInstallment.derive_status(installment, unpaid_status=installment.status)
+
         installment.updated_by = user
         installment.save()
         
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_loan_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['updated_at'], name='loan_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loaninstallment',
+            index=models.Index(fields=['updated_at'], name='installment_updated_idx'),
+        ),
+    ]
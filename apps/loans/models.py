@@ -45,6 +45,12 @@ class Loan(AuditBaseModel):
     
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Incremental report snapshot refresh scans rows changed since a watermark
+            models.Index(fields=['updated_at'], name='loan_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Loan {self.id} - {self.borrower.username} (${self.principal})"
 
@@ -85,6 +91,10 @@ class LoanInstallment(AuditBaseModel):
 
     class Meta:
         ordering = ['due_date']
+        indexes = [
+            # Incremental report snapshot refresh scans rows changed since a watermark
+            models.Index(fields=['updated_at'], name='installment_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Installment {self.id} for Loan {self.loan_id} (Due: {self.due_date})"
@@ -97,13 +107,30 @@ class LoanInstallment(AuditBaseModel):
         self.penalty_paid += Decimal(str(penalty_amount))
         self.interest_paid += Decimal(str(interest_amount))
         self.principal_paid += Decimal(str(principal_amount))
-        
-        total_expected = self.penalty_expected + self.interest_expected + self.principal_expected
-        total_paid = self.penalty_paid + self.interest_paid + self.principal_paid
-        
-        if total_paid >= total_expected:
-            self.status = self.Status.PAID
-        elif total_paid > 0:
-            self.status = self.Status.PARTIAL
-        
+        self.status = self.derive_status(self, unpaid_status=self.status)
         self.save()
+
+    def recalculate_status(self, today=None):
+        """
+        Derives status from paid amounts and due date (does not save).
+        Used when funds are taken back off an installment.
+        """
+        from django.utils import timezone
+        overdue = self.due_date < (today or timezone.now().date())
+        self.status = self.derive_status(self, unpaid_status=self.Status.OVERDUE if overdue else self.Status.PENDING)
+        return self.status
+
+    @classmethod
+    def derive_status(cls, amounts, unpaid_status):
+        """
+        The one status rule for installments and their in-memory snapshots:
+        PAID once everything expected is paid, PARTIAL while something is,
+        otherwise `unpaid_status`. `amounts` has the *_expected/*_paid attributes.
+        """
+        total_expected = amounts.penalty_expected + amounts.interest_expected + amounts.principal_expected
+        total_paid = amounts.penalty_paid + amounts.interest_paid + amounts.principal_paid
+        if total_paid >= total_expected:
+            return cls.Status.PAID
+        if total_paid > 0:
+            return cls.Status.PARTIAL
+        return unpaid_status
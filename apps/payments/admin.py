@@ -1,8 +1,21 @@
 from django.contrib import admin
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
 from django.utils import timezone
+from django.utils.html import format_html
 from .models import Payment, PaymentGatewayTransaction, RepaymentAllocation, PaymentAuditLog
+from .services.archive_service import PaymentArchiveService
 
-class PaymentGatewayTransactionInline(admin.TabularInline):
+class RecentOnlyInlineMixin:
+    """
+    Only rows inside the archive retention window are rendered inline;
+    older ones are fetched on demand from the archive.
+    """
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(created_at__gte=PaymentArchiveService.cutoff())
+
+class PaymentGatewayTransactionInline(RecentOnlyInlineMixin, admin.TabularInline):
     model = PaymentGatewayTransaction
     extra = 0
     readonly_fields = ['action', 'raw_response', 'is_success', 'created_at']
@@ -17,7 +30,7 @@ class RepaymentAllocationInline(admin.TabularInline):
     ]
     can_delete = False
 
-class PaymentAuditLogInline(admin.TabularInline):
+class PaymentAuditLogInline(RecentOnlyInlineMixin, admin.TabularInline):
     model = PaymentAuditLog
     extra = 0
     readonly_fields = ['event_type', 'from_status', 'to_status', 'description', 'metadata', 'created_at']
@@ -36,7 +49,7 @@ class PaymentAdmin(admin.ModelAdmin):
             return [
                 'user', 'loan', 'amount', 'currency', 'payment_method', 
                 'gateway_reference', 'idempotency_key', 'metadata', 'captured_at',
-                'created_at', 'updated_at'
+                'created_at', 'updated_at', 'archived_history'
             ]
         return ['captured_at', 'created_at', 'updated_at']
     
@@ -56,6 +69,46 @@ class PaymentAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_fieldsets(self, request, obj=None):
+        if obj:
+            return self.fieldsets + (('Archive', {'fields': ('archived_history',)}),)
+        return self.fieldsets
+
+    def archived_history(self, obj):
+        links = [
+            format_html(
+                '<a href="{}" target="_blank">{}</a>',
+                reverse('admin:payments_payment_archived', args=[obj.pk, table]),
+                table.replace('_', ' ').title()
+            )
+            for table in PaymentArchiveService.TABLES
+        ]
+        return format_html(
+            'Rows older than {} days are archived: {}',
+            PaymentArchiveService.retention_days(),
+            format_html(' | '.join(['{}'] * len(links)), *links)
+        )
+    archived_history.short_description = "Archived logs"
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:payment_id>/archived/<str:table>/',
+                self.admin_site.admin_view(self.archived_view),
+                name='payments_payment_archived'
+            ),
+        ] + super().get_urls()
+
+    def archived_view(self, request, payment_id, table):
+        payment = get_object_or_404(Payment, pk=payment_id)
+        if not self.has_view_permission(request, payment) or table not in PaymentArchiveService.TABLES:
+            return JsonResponse({"detail": "Not found."}, status=404)
+        return JsonResponse({
+            "payment_id": payment.pk,
+            "table": table,
+            "rows": PaymentArchiveService.fetch(payment.pk, table),
+        })
+
     def has_change_permission(self, request, obj=None):
         # Prevent manual changes to settled payments (COMPLETED/REFUNDED)
         if obj and obj.status in [Payment.Status.COMPLETED, Payment.Status.REFUNDED]:
@@ -101,7 +154,7 @@ class PaymentAdmin(admin.ModelAdmin):
 @admin.register(RepaymentAllocation)
 class RepaymentAllocationAdmin(admin.ModelAdmin):
     list_display = ['payment', 'installment', 'principal_amount', 'interest_amount', 'created_at']
-    readonly_fields = [f.name for f in RepaymentAllocation._meta.get_fields()]
+    readonly_fields = [f.name for f in RepaymentAllocation._meta.get_fields() if not f.one_to_many]
     
     def has_add_permission(self, request): return False
     def has_delete_permission(self, request, obj=None): return False
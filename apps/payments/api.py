@@ -1,12 +1,23 @@
+import tempfile
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.views import APIView
+from django.core.exceptions import ValidationError
+from django.http import FileResponse
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from core.readers import RecordFormat
 from .models import Payment
 from loans.models import Loan
-from .serializers import PaymentSerializer
+from .serializers import PaymentSerializer, AllocationSimulationRequestSerializer, AllocationSimulationSerializer
 from .services.repayment_service import RepaymentAllocationService
+from .services.bulk_import_service import BulkPaymentImportService
+from .services.reversal_service import PaymentReversalService
+from .services.simulation_service import AllocationSimulationService
+from .gateways.instrumentation import gateway_metrics, breaker_snapshot
+from .locks import lock_metrics
 
 class IsOwnerOrAdmin(permissions.BasePermission):
     """
@@ -99,3 +110,89 @@ class PaymentViewSet(viewsets.ModelViewSet):
             {"message": f"Allocated to {len(allocations)} installments."},
             status=status.HTTP_200_OK
         )
+
+    @action(detail=False, methods=['post'])
+    def simulate(self, request):
+        """
+        POST /api/payments/payments/simulate/
+        Preview how a payment would be split across a loan's installments. Nothing is saved.
+        """
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', '') in ['ADMIN', 'LOAN_OFFICER']):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = AllocationSimulationRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = AllocationSimulationService.simulate(
+            serializer.validated_data['loan'],
+            serializer.validated_data['amount']
+        )
+        return Response(AllocationSimulationSerializer(result).data)
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def refund(self, request, pk=None):
+        """
+        POST /api/payments/payments/{id}/refund/
+        Refund (or charge back) a completed payment and unwind its allocations.
+        """
+        payment = self.get_object()
+        reason = request.data.get('reason', '')
+        kind = request.data.get('kind', PaymentReversalService.Kind.REFUND)
+        if kind not in (PaymentReversalService.Kind.REFUND, PaymentReversalService.Kind.CHARGEBACK):
+            return Response({"error": f"Unknown reversal kind: {kind}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not reason:
+            return Response({"error": "A reason is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            reversals = PaymentReversalService.reverse_payment(payment, request.user, reason, kind=kind)
+        except ValidationError as e:
+            return Response({"error": "; ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        payment.refresh_from_db()
+        return Response({
+            "message": f"Reversed {len(reversals)} allocations.",
+            "payment": self.get_serializer(payment).data
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser], parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        """
+        POST /api/payments/payments/bulk_import/
+        Import a bank-transfer statement (CSV or JSONL) and download the per-row results.
+        """
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"error": "A statement file is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get('format') or RecordFormat.detect(upload.name)
+        if fmt not in (RecordFormat.CSV, RecordFormat.JSONL):
+            return Response({"error": f"Unsupported format: {fmt}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        result_file = tempfile.TemporaryFile()
+        summary = BulkPaymentImportService.import_file(upload, fmt, request.user, result_file)
+
+        response = FileResponse(
+            result_file,
+            as_attachment=True,
+            filename=f"payment_import_{summary['import_id']}.csv",
+            content_type='text/csv'
+        )
+        for key in ('rows', 'created', 'duplicates', 'errors'):
+            response[f'X-Import-{key.capitalize()}'] = str(summary[key])
+        return response
+
+
+class GatewayMetricsView(APIView):
+    """
+    GET /api/payments/internal/metrics/
+    Process-local gateway latency/error metrics, circuit breaker states and
+    allocation lock waits. Staff only.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "gateways": gateway_metrics.snapshot(),
+            "circuit_breakers": breaker_snapshot(),
+            "allocation_locks": lock_metrics.snapshot(),
+        })
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .api import PaymentViewSet
+from .api import PaymentViewSet, GatewayMetricsView
 from .views import WebhookView
 
 router = DefaultRouter()
@@ -9,4 +9,5 @@ router.register(r'payments', PaymentViewSet, basename='payment')
 urlpatterns = [
     path('', include(router.urls)),
     path('webhooks/<str:provider>/', WebhookView.as_view(), name='gateway-webhook'),
+    path('internal/metrics/', GatewayMetricsView.as_view(), name='gateway-metrics'),
 ]
@@ -1,5 +1,8 @@
 from typing import Dict, Type
+from django.conf import settings
 from .base import BasePaymentGateway
+from .faulty import FaultInjectingGateway
+from .instrumentation import InstrumentedGateway
 from .mock import MockGateway
 from ..models import Payment
 
@@ -16,9 +19,20 @@ class GatewayFactory:
         Payment.Method.BANK_TRANSFER: MockGateway
     }
     
+    # Local-only provider that fails/slows down per PAYMENT_GATEWAY_FAULTS
+    _local_gateways: Dict[str, Type[BasePaymentGateway]] = {
+        'FAULTY': FaultInjectingGateway,
+    }
+
     @classmethod
     def get_gateway(cls, method: str) -> BasePaymentGateway:
+        """
+        Returns the gateway wrapped with latency/error metrics and the
+        provider's circuit breaker (see gateways.instrumentation).
+        """
         gateway_class = cls._gateways.get(method)
+        if not gateway_class and getattr(settings, 'PAYMENT_GATEWAY_FAULTS', None) is not None:
+            gateway_class = cls._local_gateways.get(method)
         if not gateway_class:
             raise ValueError(f"No gateway implementation found for method: {method}")
-        return gateway_class()
+        return InstrumentedGateway(gateway_class(), provider=method)
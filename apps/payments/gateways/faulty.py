@@ -0,0 +1,49 @@
+import random
+import time
+from django.conf import settings
+from .mock import MockGateway
+
+class GatewayFaultError(Exception):
+    """
+    Error raised by FaultInjectingGateway to simulate a provider failure.
+    """
+    pass
+
+class FaultInjectingGateway(MockGateway):
+    """
+    MockGateway that fails and/or slows down on demand, for exercising the
+    circuit breaker and latency metrics locally.
+
+    Configured through the PAYMENT_GATEWAY_FAULTS setting, read on every call:
+        {'failure_rate': 0.5, 'latency_ms': 200, 'seed': 42}
+    """
+    _random = None
+    _seed = None
+
+    def _inject(self):
+        faults = getattr(settings, 'PAYMENT_GATEWAY_FAULTS', {})
+        cls = FaultInjectingGateway
+        if cls._random is None or faults.get('seed') != cls._seed:
+            cls._seed = faults.get('seed')
+            cls._random = random.Random(cls._seed)
+
+        if faults.get('latency_ms'):
+            time.sleep(faults['latency_ms'] / 1000)
+        if cls._random.random() < faults.get('failure_rate', 0):
+            raise GatewayFaultError("Injected gateway failure.")
+
+    def initiate_payment(self, *args, **kwargs):
+        self._inject()
+        return super().initiate_payment(*args, **kwargs)
+
+    def verify_webhook_signature(self, *args, **kwargs):
+        self._inject()
+        return super().verify_webhook_signature(*args, **kwargs)
+
+    def handle_webhook_payload(self, *args, **kwargs):
+        self._inject()
+        return super().handle_webhook_payload(*args, **kwargs)
+
+    def get_payment_status(self, *args, **kwargs):
+        self._inject()
+        return super().get_payment_status(*args, **kwargs)
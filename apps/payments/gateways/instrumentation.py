@@ -0,0 +1,235 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+DEFAULT_BREAKER_SETTINGS = {
+    'window': 20,          # number of recent calls considered
+    'min_calls': 10,       # don't trip before this many calls are in the window
+    'error_rate': 0.5,     # fraction of failed calls that opens the breaker
+    'slow_call_ms': 5000,  # calls slower than this count as failures
+    'reset_timeout': 30,   # seconds to stay open before allowing a probe
+}
+
+
+class GatewayUnavailableError(Exception):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+    """
+    def __init__(self, provider, retry_after):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"Gateway {provider} is unavailable (circuit open, retry in {retry_after:.0f}s).")
+
+
+class GatewayMetrics:
+    """
+    Process-local latency histograms and call/error counters per (provider, method).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, provider, method, elapsed_ms, error=None):
+        with self._lock:
+            series = self._series.setdefault((provider, method), {
+                'calls': 0,
+                'errors': 0,
+                'error_types': {},
+                'latency_sum_ms': 0.0,
+                'latency_max_ms': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            })
+            series['calls'] += 1
+            series['latency_sum_ms'] += elapsed_ms
+            series['latency_max_ms'] = max(series['latency_max_ms'], elapsed_ms)
+            series['buckets'][bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+            if error is not None:
+                series['errors'] += 1
+                name = type(error).__name__
+                series['error_types'][name] = series['error_types'].get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for (provider, method), series in self._series.items():
+                cumulative, buckets = 0, {}
+                for bound, count in zip(LATENCY_BUCKETS_MS + ['+Inf'], series['buckets']):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                result.setdefault(provider, {})[method] = {
+                    'calls': series['calls'],
+                    'errors': series['errors'],
+                    'error_types': dict(series['error_types']),
+                    'latency_avg_ms': series['latency_sum_ms'] / series['calls'],
+                    'latency_max_ms': series['latency_max_ms'],
+                    'latency_buckets_ms': buckets,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker over a rolling window of recent call outcomes.
+
+    CLOSED: calls flow; trips to OPEN when the failure rate crosses the threshold.
+    OPEN: calls fail fast until `reset_timeout` has passed.
+    HALF_OPEN: a single probe call is let through; success closes the
+    breaker, failure re-opens it.
+    """
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, provider, window, min_calls, error_rate, slow_call_ms, reset_timeout, clock=time.monotonic):
+        self.provider = provider
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_ms = slow_call_ms
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def before_call(self):
+        """
+        Raises GatewayUnavailableError if the call must not go through.
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.OPEN:
+                raise GatewayUnavailableError(self.provider, self.reset_timeout - (self._clock() - self._opened_at))
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise GatewayUnavailableError(self.provider, 0)
+                self._probe_in_flight = True
+
+    def after_call(self, elapsed_ms, failed):
+        failed = failed or elapsed_ms >= self.slow_call_ms
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self._open()
+                else:
+                    logger.info(f"Circuit for gateway {self.provider} closed after successful probe.")
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.error_rate):
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self.times_opened += 1
+        logger.warning(f"Circuit for gateway {self.provider} opened.")
+
+    def snapshot(self):
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                'state': self._state,
+                'times_opened': self.times_opened,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': sum(self._outcomes),
+            }
+
+
+gateway_metrics = GatewayMetrics()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider):
+    with _breakers_lock:
+        if provider not in _breakers:
+            config = dict(DEFAULT_BREAKER_SETTINGS, **getattr(settings, 'PAYMENT_GATEWAY_BREAKER', {}))
+            _breakers[provider] = CircuitBreaker(provider, **config)
+        return _breakers[provider]
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def breaker_snapshot():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.provider: breaker.snapshot() for breaker in breakers}
+
+
+class InstrumentedGateway:
+    """
+    Wraps a BasePaymentGateway: every public method is timed and counted.
+    Only the calls that go out to the provider are guarded by its circuit
+    breaker; webhook parsing and signature checks are local, so they keep
+    working while the provider is down and bad input cannot open the circuit.
+    """
+    OUTBOUND_METHODS = frozenset(['initiate_payment', 'get_payment_status'])
+
+    def __init__(self, gateway, provider):
+        self._gateway = gateway
+        self.provider = provider
+        self.breaker = get_breaker(provider)
+
+    def __getattr__(self, name):
+        attr = getattr(self._gateway, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        breaker = self.breaker if name in self.OUTBOUND_METHODS else None
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            if breaker is not None:
+                breaker.before_call()
+            started = time.monotonic()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                elapsed_ms = (time.monotonic() - started) * 1000
+                gateway_metrics.observe(self.provider, name, elapsed_ms, error=e)
+                if breaker is not None:
+                    breaker.after_call(elapsed_ms, failed=True)
+                raise
+            elapsed_ms = (time.monotonic() - started) * 1000
+            gateway_metrics.observe(self.provider, name, elapsed_ms)
+            if breaker is not None:
+                breaker.after_call(elapsed_ms, failed=False)
+            return result
+
+        return call
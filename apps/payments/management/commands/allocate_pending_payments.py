@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from payments.services.repayment_service import RepaymentAllocationService
+
+
+class Command(BaseCommand):
+    help = "Allocate completed payments that are still waiting in the allocation queue (e.g. bank imports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Maximum number of payments to process.")
+
+    def handle(self, *args, **options):
+        processed, failed = RepaymentAllocationService.process_pending(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Allocated {processed} payments ({failed} failed)."))
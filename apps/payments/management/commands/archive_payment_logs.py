@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from payments.services.archive_service import PaymentArchiveService
+
+
+class Command(BaseCommand):
+    help = "Move payment audit logs and gateway transactions older than the retention window into archive segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help="Override PAYMENT_ARCHIVE_RETENTION_DAYS.")
+        parser.add_argument('--segment-size', type=int, default=PaymentArchiveService.SEGMENT_SIZE)
+
+    def handle(self, *args, **options):
+        archived = PaymentArchiveService.archive(
+            retention_days=options['retention_days'],
+            segment_size=options['segment_size']
+        )
+        for table, count in archived.items():
+            self.stdout.write(f"{table}: {count} rows archived")
+        self.stdout.write(self.style.SUCCESS("Archival complete."))
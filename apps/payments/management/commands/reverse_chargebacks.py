@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.readers import RecordFormat
+from payments.services.reversal_service import PaymentReversalService
+
+
+class Command(BaseCommand):
+    help = "Reverse every payment listed in a chargeback file (CSV or JSONL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Chargeback file with payment_id, gateway_reference or idempotency_key and reason columns.")
+        parser.add_argument('--actor', help="Username recorded as the actor on audit entries.")
+        parser.add_argument('--kind', default=PaymentReversalService.Kind.CHARGEBACK,
+                            choices=[PaymentReversalService.Kind.CHARGEBACK, PaymentReversalService.Kind.REFUND])
+        parser.add_argument('--chunk-size', type=int, default=PaymentReversalService.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        actor = None
+        if options['actor']:
+            try:
+                actor = get_user_model().objects.get(username=options['actor'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Unknown user: {options['actor']}")
+
+        with open(options['path'], 'rb') as fileobj:
+            summary, results = PaymentReversalService.reverse_file(
+                fileobj,
+                RecordFormat.detect(options['path']),
+                actor,
+                kind=options['kind'],
+                chunk_size=options['chunk_size']
+            )
+
+        for result in results:
+            if result['result'] == 'ERROR':
+                self.stderr.write(f"Row {result['row']}: {result['message']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['rows']} rows: {summary['reversed']} reversed, "
+            f"{summary['skipped']} already reversed, {summary['errors']} errors."
+        ))
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_paymentauditlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanLock',
+            fields=[
+                ('loan_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('acquired_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_loanlock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repaymentallocation',
+            name='reversal_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reversals', to='payments.repaymentallocation'),
+        ),
+    ]
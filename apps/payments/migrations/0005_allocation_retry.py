@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_repaymentallocation_reversal_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='allocation_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='allocation_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='allocation_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -57,6 +57,10 @@ class Payment(AuditBaseModel):
     )
     metadata = models.JSONField(default=dict, blank=True)
     captured_at = models.DateTimeField(null=True, blank=True)
+    # Allocation queue bookkeeping: failed attempts wait until allocation_retry_at
+    allocation_attempts = models.PositiveSmallIntegerField(default=0)
+    allocation_error = models.TextField(blank=True)
+    allocation_retry_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Payment {self.id} - {self.user.username} (${self.amount})"
@@ -96,6 +100,14 @@ class RepaymentAllocation(AuditBaseModel):
     interest_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     penalty_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     fee_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Set on compensating (negative) rows written when a payment is refunded or charged back
+    reversal_of = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='reversals'
+    )
 
     class Meta:
         indexes = [
@@ -125,3 +137,14 @@ class PaymentAuditLog(AuditBaseModel):
 
     def __str__(self):
         return f"Audit {self.id} for Payment {self.payment_id}: {self.event_type}"
+
+class LoanLock(models.Model):
+    """
+    One row per loan, used to serialize allocations on databases without
+    advisory locks (see payments.locks.TableLockManager).
+    """
+    loan_id = models.BigIntegerField(primary_key=True)
+    acquired_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Lock for Loan {self.loan_id}"
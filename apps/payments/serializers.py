@@ -35,3 +35,33 @@ class PaymentSerializer(serializers.ModelSerializer):
         if not user.is_staff and value.borrower != user:
             raise serializers.ValidationError("You can only initiate payments for your own loans.")
         return value
+
+class AllocationSimulationRequestSerializer(serializers.Serializer):
+    loan = serializers.PrimaryKeyRelatedField(queryset=Loan.objects.all())
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Payment amount must be greater than zero.")
+        return value
+
+class SimulatedAllocationSerializer(serializers.Serializer):
+    installment_id = serializers.IntegerField()
+    penalty_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    interest_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    principal_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class SimulatedInstallmentSerializer(serializers.Serializer):
+    installment_id = serializers.IntegerField()
+    due_date = serializers.DateField()
+    status_before = serializers.CharField()
+    status = serializers.CharField()
+    penalty_paid = serializers.DecimalField(max_digits=12, decimal_places=2)
+    interest_paid = serializers.DecimalField(max_digits=12, decimal_places=2)
+    principal_paid = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class AllocationSimulationSerializer(serializers.Serializer):
+    loan_id = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    allocations = SimulatedAllocationSerializer(many=True)
+    installments = SimulatedInstallmentSerializer(many=True)
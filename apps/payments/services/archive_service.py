@@ -0,0 +1,77 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from core.archive import SegmentStore
+from ..models import PaymentAuditLog, PaymentGatewayTransaction
+
+class PaymentArchiveService:
+    """
+    Moves old PaymentAuditLog and PaymentGatewayTransaction rows out of the
+    hot tables into monthly, compressed segment files (see core.archive),
+    indexed by payment id for on-demand lookup.
+    """
+    TABLES = {
+        'audit_logs': PaymentAuditLog,
+        'gateway_transactions': PaymentGatewayTransaction,
+    }
+    SEGMENT_SIZE = 5000
+
+    @staticmethod
+    def retention_days():
+        return getattr(settings, 'PAYMENT_ARCHIVE_RETENTION_DAYS', 90)
+
+    @classmethod
+    def cutoff(cls, retention_days=None):
+        days = cls.retention_days() if retention_days is None else retention_days
+        return timezone.now() - timedelta(days=days)
+
+    @classmethod
+    def store(cls, table):
+        root = getattr(settings, 'PAYMENT_ARCHIVE_ROOT', os.path.join(settings.BASE_DIR, 'archive', 'payments'))
+        return SegmentStore(os.path.join(str(root), table))
+
+    @classmethod
+    def archive(cls, retention_days=None, segment_size=None):
+        """
+        Archives every row older than the retention window, one month
+        partition at a time. Returns {table: rows_archived}.
+
+        Rows are deleted only after their segment and index are on disk; if
+        a run dies in between, the next run archives them again and readers
+        de-duplicate by id.
+        """
+        cutoff = cls.cutoff(retention_days)
+        segment_size = segment_size or cls.SEGMENT_SIZE
+        archived = {}
+
+        for table, model in cls.TABLES.items():
+            archived[table] = 0
+            store = cls.store(table)
+            old_rows = model.objects.filter(created_at__lt=cutoff)
+            months = old_rows.annotate(month=TruncMonth('created_at')).values_list('month', flat=True).distinct()
+
+            for month in sorted(months):
+                month_rows = old_rows.filter(
+                    created_at__gte=month,
+                    created_at__lt=(month + timedelta(days=32)).replace(day=1)
+                ).order_by('id')
+                while True:
+                    batch = list(month_rows.values()[:segment_size])
+                    if not batch:
+                        break
+                    store.write_segment(f"{month:%Y-%m}", batch, key_field='payment_id')
+                    with transaction.atomic():
+                        model.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+                    archived[table] += len(batch)
+        return archived
+
+    @classmethod
+    def fetch(cls, payment_id, table):
+        """
+        Returns the archived rows of `table` for a payment, newest first.
+        """
+        rows = {row['id']: row for row in cls.store(table).lookup(payment_id, key_field='payment_id')}
+        return sorted(rows.values(), key=lambda row: row['created_at'], reverse=True)
@@ -0,0 +1,194 @@
+import csv
+import hashlib
+import io
+import re
+import uuid
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from core.readers import iter_records
+from loans.models import Loan
+from ..models import Payment, PaymentAuditLog
+
+LOAN_REFERENCE_RE = re.compile(r'^(?:LOAN|LN)?[-#\s]*(\d+)$', re.IGNORECASE)
+
+
+class BulkPaymentImportService:
+    """
+    Imports bank-transfer statements (CSV or JSONL) as completed payments.
+
+    Rows are validated in a single streaming pass and written in chunks:
+    each chunk resolves its loans with one query, skips keys already on
+    file, and bulk-inserts the new payments. Imported payments are left
+    with `captured_at` unset, which queues them for allocation
+    (see `RepaymentAllocationService.pending_allocation`).
+    """
+    CHUNK_SIZE = 1000
+    RESULT_HEADER = ['row', 'result', 'payment_id', 'loan_id', 'idempotency_key', 'message']
+
+    class Result:
+        CREATED = 'CREATED'
+        DUPLICATE = 'DUPLICATE'
+        ERROR = 'ERROR'
+
+    @staticmethod
+    def idempotency_key_for(bank_reference, loan_id):
+        """
+        Deterministic key so re-importing the same statement is a no-op.
+        """
+        digest = hashlib.sha256(f"{bank_reference.strip().upper()}|{loan_id}".encode('utf-8')).hexdigest()
+        return f"bank_{digest[:40]}"
+
+    @classmethod
+    def parse_row(cls, record):
+        """
+        Validates a raw statement row. Returns (parsed, error).
+        """
+        reference = str(record.get('reference') or '').strip()
+        match = LOAN_REFERENCE_RE.match(reference)
+        if not match:
+            return None, f"Unrecognised loan reference '{reference}'."
+
+        bank_reference = str(record.get('bank_reference') or '').strip()
+        if not bank_reference:
+            return None, "Missing bank_reference."
+
+        try:
+            amount = Decimal(str(record.get('amount') or '').replace(',', '').strip())
+        except InvalidOperation:
+            return None, f"Invalid amount '{record.get('amount')}'."
+        if amount <= 0 or amount != amount.quantize(Decimal('0.01')):
+            return None, f"Amount must be positive with at most 2 decimal places, got '{amount}'."
+
+        currency = str(record.get('currency') or 'USD').strip().upper()
+        if len(currency) != 3:
+            return None, f"Invalid currency '{currency}'."
+
+        loan_id = int(match.group(1))
+        return {
+            'loan_id': loan_id,
+            'amount': amount,
+            'currency': currency,
+            'bank_reference': bank_reference,
+            'value_date': str(record.get('value_date') or '').strip(),
+            'narrative': str(record.get('narrative') or '').strip(),
+            'idempotency_key': cls.idempotency_key_for(bank_reference, loan_id),
+        }, None
+
+    @classmethod
+    def import_file(cls, fileobj, fmt, actor, result_file, chunk_size=None):
+        """
+        Imports a statement and writes one result line per input row to
+        `result_file` (a binary file object). Returns summary counts.
+        """
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        import_id = uuid.uuid4().hex
+        summary = {'import_id': import_id, 'rows': 0, 'created': 0, 'duplicates': 0, 'errors': 0}
+
+        out = io.TextIOWrapper(result_file, encoding='utf-8', newline='')
+        writer = csv.writer(out)
+        writer.writerow(cls.RESULT_HEADER)
+
+        chunk = []
+        for row_number, record, error in iter_records(fileobj, fmt):
+            summary['rows'] += 1
+            parsed = None
+            if error is None:
+                parsed, error = cls.parse_row(record)
+            chunk.append((row_number, parsed, error))
+            if len(chunk) >= chunk_size:
+                cls._process_chunk(chunk, actor, import_id, writer, summary)
+                chunk = []
+        if chunk:
+            cls._process_chunk(chunk, actor, import_id, writer, summary)
+
+        out.flush()
+        out.detach()
+        result_file.seek(0)
+
+        from compliance.services import AuditService
+        from compliance.events import AuditEventType
+        AuditService.log_event(
+            actor=actor,
+            target=actor,
+            event_type=AuditEventType.PAYMENT_BULK_IMPORTED,
+            description=f"Bank statement import {import_id}: {summary['created']} payments created, "
+                        f"{summary['duplicates']} duplicates, {summary['errors']} errors.",
+            payload_after=summary
+        )
+        return summary
+
+    @classmethod
+    @transaction.atomic
+    def _process_chunk(cls, chunk, actor, import_id, writer, summary):
+        valid = [(row_number, parsed) for row_number, parsed, error in chunk if parsed]
+        loans = {
+            loan['id']: loan for loan in Loan.objects.filter(
+                pk__in={parsed['loan_id'] for _, parsed in valid}
+            ).values('id', 'borrower_id', 'status')
+        }
+        existing = dict(Payment.objects.filter(
+            idempotency_key__in=[parsed['idempotency_key'] for _, parsed in valid]
+        ).values_list('idempotency_key', 'id'))
+
+        outcomes = {}
+        to_create = []
+        for row_number, parsed in valid:
+            key = parsed['idempotency_key']
+            loan = loans.get(parsed['loan_id'])
+            if loan is None:
+                outcomes[row_number] = (cls.Result.ERROR, None, f"Loan {parsed['loan_id']} not found.")
+            elif loan['status'] != Loan.Status.ACTIVE:
+                outcomes[row_number] = (cls.Result.ERROR, None, f"Loan {parsed['loan_id']} is {loan['status']}.")
+            elif key in existing:
+                message = "Already imported." if existing[key] else "Duplicate of an earlier row in this file."
+                outcomes[row_number] = (cls.Result.DUPLICATE, existing[key], message)
+            else:
+                # Mark the key as taken so repeats within the same file are duplicates too
+                existing[key] = None
+                payment = Payment(
+                    user_id=loan['borrower_id'],
+                    loan_id=loan['id'],
+                    amount=parsed['amount'],
+                    currency=parsed['currency'],
+                    status=Payment.Status.COMPLETED,
+                    payment_method=Payment.Method.BANK_TRANSFER,
+                    idempotency_key=key,
+                    metadata={
+                        'source': 'bank_import',
+                        'import_id': import_id,
+                        'bank_reference': parsed['bank_reference'],
+                        'value_date': parsed['value_date'],
+                        'narrative': parsed['narrative'],
+                    },
+                    created_by=actor
+                )
+                to_create.append((row_number, payment))
+
+        created = Payment.objects.bulk_create([payment for _, payment in to_create])
+        PaymentAuditLog.objects.bulk_create([
+            PaymentAuditLog(
+                payment=payment,
+                event_type='BANK_IMPORTED',
+                to_status=payment.status,
+                description=f"Imported from bank statement {import_id} (ref {payment.metadata['bank_reference']}).",
+                created_by=actor
+            )
+            for payment in created
+        ])
+        for row_number, payment in to_create:
+            outcomes[row_number] = (cls.Result.CREATED, payment.pk, '')
+
+        parsed_by_row = dict(valid)
+        for row_number, parsed, error in chunk:
+            result, payment_id, message = outcomes.get(row_number, (cls.Result.ERROR, None, error))
+            if result == cls.Result.CREATED:
+                summary['created'] += 1
+            elif result == cls.Result.DUPLICATE:
+                summary['duplicates'] += 1
+            else:
+                summary['errors'] += 1
+            parsed = parsed_by_row.get(row_number) or {}
+            writer.writerow([
+                row_number, result, payment_id or '', parsed.get('loan_id', ''),
+                parsed.get('idempotency_key', ''), message
+            ])
@@ -1,10 +1,65 @@
-from decimal import Decimal
+import logging
+from datetime import timedelta
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from loans.models import LoanInstallment
+from ..locks import get_lock_manager
 from ..models import Payment, RepaymentAllocation
+from .waterfall import InstallmentSnapshot, allocate_waterfall
+
+logger = logging.getLogger(__name__)
+
+# A failed allocation waits RETRY_BACKOFF * 4**(attempts - 1), at most MAX_RETRY_DELAY
+RETRY_BACKOFF = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(days=1)
 
 class RepaymentAllocationService:
+    @staticmethod
+    def pending_allocation(now=None):
+        """
+        Completed payments that have not been allocated yet (the allocation
+        queue), leaving out failed ones until their retry is due.
+        """
+        return Payment.objects.filter(
+            status=Payment.Status.COMPLETED,
+            captured_at__isnull=True,
+            loan__isnull=False,
+            allocations__isnull=True
+        ).exclude(allocation_retry_at__gt=now or timezone.now()).order_by('created_at', 'id')
+
+    @classmethod
+    def process_pending(cls, limit=None):
+        """
+        Drains the allocation queue, one payment per transaction. A payment
+        that fails is logged, its error recorded, and it is skipped until
+        its retry is due. Returns (processed, failed) counts.
+        """
+        queryset = cls.pending_allocation().values_list('pk', flat=True)
+        if limit:
+            queryset = queryset[:limit]
+
+        processed = failed = 0
+        for payment_id in list(queryset):
+            try:
+                cls.process_payment(Payment(pk=payment_id))
+                processed += 1
+            except Exception as e:
+                logger.exception(f"Allocation of payment {payment_id} failed.")
+                cls._record_failure(payment_id, e)
+                failed += 1
+        return processed, failed
+
+    @staticmethod
+    def _record_failure(payment_id, error):
+        attempts = Payment.objects.filter(pk=payment_id).values_list('allocation_attempts', flat=True).first() or 0
+        delay = min(RETRY_BACKOFF * 4 ** attempts, MAX_RETRY_DELAY)
+        Payment.objects.filter(pk=payment_id).update(
+            allocation_attempts=F('allocation_attempts') + 1,
+            allocation_error=str(error),
+            allocation_retry_at=timezone.now() + delay,
+        )
+
     @staticmethod
     @transaction.atomic
     def process_payment(payment: Payment):
@@ -12,12 +67,26 @@ class RepaymentAllocationService:
         Allocates funds from a completed payment to loan installments.
         Waterfall: Penalty -> Interest -> Principal
         """
-        # Refetch with lock to prevent race conditions during allocation
-        payment = Payment.objects.select_for_update().get(pk=payment.pk)
-        
+        payment = Payment.objects.get(pk=payment.pk)
+        if payment.status != Payment.Status.COMPLETED or not payment.loan_id:
+            return []
+
+        # One lock per loan serializes allocations on the same loan without
+        # row-locking the payment, the loan and every unpaid installment.
+        from compliance.services import AuditService
+        with get_lock_manager().lock(payment.loan_id), AuditService.buffered():
+            return RepaymentAllocationService._allocate(
+                Payment.objects.select_related('loan').get(pk=payment.pk)
+            )
+
+    @staticmethod
+    def _allocate(payment):
+        """
+        Runs the waterfall. Caller must hold the loan lock.
+        """
         if payment.status != Payment.Status.COMPLETED:
             return []
-        
+
         # Check if already allocated to prevent double-processing
         if RepaymentAllocation.objects.filter(payment=payment).exists():
             return list(payment.allocations.all())
@@ -25,76 +94,26 @@ class RepaymentAllocationService:
         loan = payment.loan
         if not loan:
             return []
-            
-        # Lock loan to prevent concurrent status updates or other modifications
-        from loans.models import Loan
-        loan = Loan.objects.select_for_update().get(pk=loan.pk)
 
-        remaining_funds = Decimal(str(payment.amount))
-        allocations = []
-        
-        # Get all installments for the loan, ordered by due date
-        installments = LoanInstallment.objects.filter(
-            loan=loan,
-        ).exclude(
-            status=LoanInstallment.Status.PAID
-        ).order_by('due_date').select_for_update()
+        # Plan the split on in-memory snapshots, then persist it
+        installments = list(LoanInstallment.objects.filter(loan=loan).order_by('due_date', 'id'))
+        plan = allocate_waterfall(
+            payment.amount,
+            [InstallmentSnapshot.from_installment(inst) for inst in installments]
+        )
+        installments_by_id = {inst.pk: inst for inst in installments}
 
         try:
-            for inst in installments:
-                if remaining_funds <= 0:
-                    break
-                
-                penalty_due = max(Decimal('0'), inst.penalty_expected - inst.penalty_paid)
-                interest_due = max(Decimal('0'), inst.interest_expected - inst.interest_paid)
-                principal_due = max(Decimal('0'), inst.principal_expected - inst.principal_paid)
-                
-                # Waterfall: Penalty -> Interest -> Principal
-                p_alloc = min(remaining_funds, penalty_due)
-                remaining_funds -= p_alloc
-                
-                i_alloc = min(remaining_funds, interest_due)
-                remaining_funds -= i_alloc
-                
-                pr_alloc = min(remaining_funds, principal_due)
-                remaining_funds -= pr_alloc
-                
-                if p_alloc > 0 or i_alloc > 0 or pr_alloc > 0:
-                    alloc = RepaymentAllocation.objects.create(
-                        payment=payment,
-                        installment=inst,
-                        penalty_amount=p_alloc,
-                        interest_amount=i_alloc,
-                        principal_amount=pr_alloc
-                    )
-                    allocations.append(alloc)
-                    inst.apply_funds(p_alloc, i_alloc, pr_alloc)
-
-            # Handle Overpayment (excess funds reduce principal of the last installment)
-            if remaining_funds > 0:
-                last_inst = LoanInstallment.objects.filter(
-                    loan=loan
-                ).order_by('-due_date').first()
-                
-                if last_inst:
-                    # Find if we already created an allocation record for this installment in this run
-                    existing_alloc = next((a for a in allocations if a.installment_id == last_inst.id), None)
-                    if existing_alloc:
-                        existing_alloc.principal_amount += remaining_funds
-                        existing_alloc.save()
-                    else:
-                        alloc = RepaymentAllocation.objects.create(
-                            payment=payment,
-                            installment=last_inst,
-                            principal_amount=remaining_funds
-                        )
-                        allocations.append(alloc)
-                    
-                    last_inst.apply_funds(0, 0, remaining_funds)
-                    remaining_funds = Decimal('0')
+            allocations = RepaymentAllocation.objects.bulk_create([
+                RepaymentAllocation(payment=payment, **line) for line in plan
+            ])
+            for line in plan:
+                installments_by_id[line['installment_id']].apply_funds(
+                    line['penalty_amount'], line['interest_amount'], line['principal_amount']
+                )
 
             payment.captured_at = timezone.now()
-            payment.save()
+            payment.save(update_fields=['captured_at', 'updated_at'])
 
             # Record successful allocation
             from compliance.services import AuditService
@@ -0,0 +1,216 @@
+from collections import defaultdict
+from contextlib import nullcontext
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from core.readers import iter_records
+from loans.models import LoanInstallment
+from ..locks import get_lock_manager
+from ..models import Payment, RepaymentAllocation, PaymentAuditLog
+
+class PaymentReversalService:
+    """
+    Unwinds the allocations of refunded or charged-back payments.
+
+    Original allocation rows are never touched: each one gets a compensating
+    row with negated amounts (`reversal_of`), and the affected installments
+    are restored with a single bulk update.
+    """
+    CHUNK_SIZE = 200
+
+    class Kind:
+        REFUND = 'REFUND'
+        CHARGEBACK = 'CHARGEBACK'
+
+    AMOUNT_FIELDS = ['penalty_amount', 'interest_amount', 'principal_amount', 'fee_amount']
+
+    @classmethod
+    @transaction.atomic
+    def reverse_payment(cls, payment, actor, reason, kind=Kind.REFUND):
+        """
+        Marks a completed payment as REFUNDED and takes its funds back off the installments.
+        Reversing an already refunded payment is a no-op.
+        """
+        loan_id = Payment.objects.filter(pk=payment.pk).values_list('loan_id', flat=True).get()
+        # Allocation of this payment runs under the same loan lock, so the
+        # payment is read (and written) only once the lock is held
+        with get_lock_manager().lock(loan_id) if loan_id else nullcontext():
+            payment = Payment.objects.select_for_update().get(pk=payment.pk)
+            if payment.status == Payment.Status.REFUNDED:
+                return []
+            if payment.status != Payment.Status.COMPLETED:
+                raise ValidationError(f"Only completed payments can be reversed (payment {payment.pk} is {payment.status}).")
+
+            reversals = cls._unwind(payment, actor) if payment.loan_id else []
+
+            from_status = payment.status
+            payment.status = Payment.Status.REFUNDED
+            payment.updated_by = actor
+            payment.save(update_fields=['status', 'updated_by', 'updated_at'])
+
+        reversed_total = sum(
+            (-(r.penalty_amount + r.interest_amount + r.principal_amount + r.fee_amount) for r in reversals),
+            Decimal('0')
+        )
+        PaymentAuditLog.objects.create(
+            payment=payment,
+            event_type='REVERSED',
+            from_status=from_status,
+            to_status=payment.status,
+            description=f"{kind.title()} reversed {reversed_total} across {len(reversals)} allocations. Reason: {reason}",
+            metadata={"kind": kind, "reason": reason, "reversed_total": str(reversed_total)},
+            created_by=actor
+        )
+
+        from compliance.services import AuditService
+        from compliance.events import AuditEventType
+        AuditService.log_event(
+            actor=actor,
+            target=payment,
+            event_type=AuditEventType.PAYMENT_REVERSED,
+            description=f"Payment {payment.pk} reversed ({kind}). Reason: {reason}",
+            payload_before={"status": from_status},
+            payload_after={"status": payment.status, "reversed_total": str(reversed_total)},
+            metadata={"kind": kind, "reason": reason}
+        )
+        return reversals
+
+    @classmethod
+    def _unwind(cls, payment, actor):
+        """
+        Writes compensating allocations and restores installment paid amounts.
+        Caller must hold the loan lock.
+        """
+        originals = list(RepaymentAllocation.objects.filter(
+            payment=payment,
+            reversal_of__isnull=True,
+            reversals__isnull=True
+        ))
+        if not originals:
+            return []
+
+        deltas = defaultdict(lambda: defaultdict(Decimal))
+        for alloc in originals:
+            for field in cls.AMOUNT_FIELDS:
+                deltas[alloc.installment_id][field] += getattr(alloc, field)
+
+        now = timezone.now()
+        today = now.date()
+        installments = list(LoanInstallment.objects.filter(pk__in=deltas.keys()))
+        for inst in installments:
+            delta = deltas[inst.pk]
+            inst.penalty_paid -= delta['penalty_amount']
+            inst.interest_paid -= delta['interest_amount']
+            inst.principal_paid -= delta['principal_amount']
+            inst.recalculate_status(today)
+            inst.updated_at = now
+            inst.updated_by = actor
+        LoanInstallment.objects.bulk_update(
+            installments,
+            ['penalty_paid', 'interest_paid', 'principal_paid', 'status', 'updated_at', 'updated_by']
+        )
+
+        return RepaymentAllocation.objects.bulk_create([
+            RepaymentAllocation(
+                payment=payment,
+                installment_id=alloc.installment_id,
+                reversal_of=alloc,
+                created_by=actor,
+                **{field: -getattr(alloc, field) for field in cls.AMOUNT_FIELDS}
+            )
+            for alloc in originals
+        ])
+
+    @classmethod
+    def reverse_file(cls, fileobj, fmt, actor, kind=Kind.CHARGEBACK, chunk_size=None):
+        """
+        Reverses every payment listed in a chargeback file (CSV or JSONL with
+        `payment_id`, `gateway_reference` or `idempotency_key`, plus `reason`).
+        Each chunk runs in its own transaction; a bad row only fails itself.
+        Returns (summary, results) where results holds one dict per row.
+        """
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        summary = {'rows': 0, 'reversed': 0, 'skipped': 0, 'errors': 0}
+        results = []
+
+        chunk = []
+        for row_number, record, error in iter_records(fileobj, fmt):
+            summary['rows'] += 1
+            chunk.append((row_number, record, error))
+            if len(chunk) >= chunk_size:
+                results.extend(cls._reverse_chunk(chunk, actor, kind, summary))
+                chunk = []
+        if chunk:
+            results.extend(cls._reverse_chunk(chunk, actor, kind, summary))
+        return summary, results
+
+    @classmethod
+    def _reverse_chunk(cls, chunk, actor, kind, summary):
+        # The chunk's audit events are written with one insert at commit
+        from compliance.services import AuditService
+        with transaction.atomic(), AuditService.buffered():
+            return cls._reverse_rows(chunk, actor, kind, summary)
+
+    @classmethod
+    def _reverse_rows(cls, chunk, actor, kind, summary):
+        from compliance.services import AuditService
+        ids, refs, keys = set(), set(), set()
+        for _, record, _ in chunk:
+            if not record:
+                continue
+            if str(record.get('payment_id') or '').strip().isdigit():
+                ids.add(int(record['payment_id']))
+            if record.get('gateway_reference'):
+                refs.add(str(record['gateway_reference']).strip())
+            if record.get('idempotency_key'):
+                keys.add(str(record['idempotency_key']).strip())
+        lookup = Q(pk__in=ids) | Q(gateway_reference__in=refs) | Q(idempotency_key__in=keys)
+
+        by_id, by_ref, by_key = {}, {}, {}
+        for payment in Payment.objects.filter(lookup):
+            by_id[payment.pk] = payment
+            by_ref[payment.gateway_reference] = payment
+            by_key[payment.idempotency_key] = payment
+
+        results = []
+        seen = set()
+        for row_number, record, error in chunk:
+            payment = None
+            if record:
+                payment_id = str(record.get('payment_id') or '').strip()
+                payment = (
+                    (by_id.get(int(payment_id)) if payment_id.isdigit() else None)
+                    or by_ref.get(str(record.get('gateway_reference') or '').strip())
+                    or by_key.get(str(record.get('idempotency_key') or '').strip())
+                )
+                if payment is None and error is None:
+                    error = "Payment not found."
+
+            if error:
+                summary['errors'] += 1
+                results.append({'row': row_number, 'payment_id': None, 'result': 'ERROR', 'message': error})
+                continue
+
+            if payment.status == Payment.Status.REFUNDED or payment.pk in seen:
+                summary['skipped'] += 1
+                results.append({'row': row_number, 'payment_id': payment.pk, 'result': 'SKIPPED', 'message': "Already reversed."})
+                continue
+
+            try:
+                # A failed row drops its own buffered events along with its savepoint
+                with AuditService.buffered():
+                    reversals = cls.reverse_payment(payment, actor, record.get('reason') or kind.title(), kind=kind)
+            except ValidationError as e:
+                summary['errors'] += 1
+                results.append({'row': row_number, 'payment_id': payment.pk, 'result': 'ERROR', 'message': "; ".join(e.messages)})
+                continue
+
+            seen.add(payment.pk)
+            summary['reversed'] += 1
+            results.append({
+                'row': row_number, 'payment_id': payment.pk, 'result': 'REVERSED',
+                'message': f"{len(reversals)} allocations reversed."
+            })
+        return results
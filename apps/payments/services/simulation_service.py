@@ -0,0 +1,132 @@
+from collections import defaultdict
+from decimal import Decimal
+from loans.models import LoanInstallment
+from ..models import Payment, RepaymentAllocation
+from .waterfall import InstallmentSnapshot, allocate_waterfall
+
+class AllocationSimulationService:
+    """
+    Side-effect-free runs of the repayment waterfall.
+
+    `simulate` previews how a proposed payment would be split today.
+    `replay` re-runs historical payments against a rebuilt installment
+    history and diffs the result with the stored allocations.
+    """
+
+    @staticmethod
+    def simulate(loan, amount):
+        """
+        Returns the proposed allocations and resulting installment states
+        for a payment of `amount` on `loan`. Nothing is written.
+        """
+        installments = LoanInstallment.objects.filter(loan=loan).order_by('due_date', 'id')
+        before = [InstallmentSnapshot.from_installment(inst) for inst in installments]
+        after = [snap.copy() for snap in before]
+        plan = allocate_waterfall(amount, after)
+
+        statuses_before = {snap.id: snap.status for snap in before}
+        return {
+            'loan_id': loan.pk,
+            'amount': Decimal(str(amount)),
+            'allocations': plan,
+            'installments': [
+                dict(snap.as_dict(), status_before=statuses_before[snap.id])
+                for snap in after
+            ],
+        }
+
+    @classmethod
+    def replay(cls, start, end, loan_ids=None):
+        """
+        Re-runs every payment captured between `start` and `end` and reports
+        the ones whose simulated split differs from the stored allocations.
+
+        Each loan's history is rebuilt from zero paid, applying all of its
+        allocated payments in capture order (including those before `start`),
+        and undoing refunded payments at the time they were reversed.
+        """
+        payments = Payment.objects.filter(
+            captured_at__gte=start,
+            captured_at__lt=end,
+            loan__isnull=False,
+            status__in=[Payment.Status.COMPLETED, Payment.Status.REFUNDED]
+        )
+        if loan_ids:
+            payments = payments.filter(loan_id__in=loan_ids)
+
+        summary = {'loans': 0, 'payments': 0, 'matched': 0, 'mismatched': 0}
+        diffs = []
+        for loan_id in payments.values_list('loan_id', flat=True).distinct().order_by('loan_id').iterator():
+            summary['loans'] += 1
+            for diff in cls._replay_loan(loan_id, start, end):
+                summary['payments'] += 1
+                if diff['matches']:
+                    summary['matched'] += 1
+                else:
+                    summary['mismatched'] += 1
+                    diffs.append(diff)
+        return summary, diffs
+
+    @classmethod
+    def _replay_loan(cls, loan_id, start, end):
+        snapshots = [
+            InstallmentSnapshot(
+                inst.pk, inst.due_date, LoanInstallment.Status.PENDING,
+                inst.penalty_expected, inst.interest_expected, inst.principal_expected
+            )
+            for inst in LoanInstallment.objects.filter(loan_id=loan_id).order_by('due_date', 'id')
+        ]
+        by_id = {snap.id: snap for snap in snapshots}
+
+        payments = list(Payment.objects.filter(
+            loan_id=loan_id,
+            captured_at__isnull=False,
+            captured_at__lt=end,
+            status__in=[Payment.Status.COMPLETED, Payment.Status.REFUNDED]
+        ).order_by('captured_at', 'id'))
+
+        stored = defaultdict(dict)
+        reversed_at = {}
+        for alloc in RepaymentAllocation.objects.filter(payment__in=payments).order_by('id'):
+            if alloc.reversal_of_id:
+                reversed_at.setdefault(alloc.payment_id, alloc.created_at)
+                continue
+            stored[alloc.payment_id][alloc.installment_id] = cls._amounts(alloc)
+
+        # Timeline of allocations and reversals, in the order they happened
+        events = [(p.captured_at, 0, p) for p in payments]
+        events += [(reversed_at[p.pk], 1, p) for p in payments if p.pk in reversed_at]
+        events.sort(key=lambda e: (e[0], e[1], e[2].pk))
+
+        simulated = {}
+        for _, is_reversal, payment in events:
+            if is_reversal:
+                for line in simulated.get(payment.pk, []):
+                    snap = by_id[line['installment_id']]
+                    snap.apply(-line['penalty_amount'], -line['interest_amount'], -line['principal_amount'])
+                    cls._reset_status(snap)
+                continue
+
+            plan = allocate_waterfall(payment.amount, snapshots)
+            simulated[payment.pk] = plan
+            if payment.captured_at < start:
+                continue
+
+            proposed = {line['installment_id']: cls._amounts(line) for line in plan}
+            yield {
+                'payment_id': payment.pk,
+                'loan_id': loan_id,
+                'captured_at': payment.captured_at,
+                'matches': proposed == stored.get(payment.pk, {}),
+                'stored': stored.get(payment.pk, {}),
+                'simulated': proposed,
+            }
+
+    @staticmethod
+    def _amounts(line):
+        get = line.get if isinstance(line, dict) else lambda field: getattr(line, field)
+        return (get('penalty_amount'), get('interest_amount'), get('principal_amount'))
+
+    @staticmethod
+    def _reset_status(snap):
+        snap.status = LoanInstallment.derive_status(snap, unpaid_status=LoanInstallment.Status.PENDING)
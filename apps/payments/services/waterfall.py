@@ -0,0 +1,113 @@
+from decimal import Decimal
+from loans.models import LoanInstallment
+
+ZERO = Decimal('0')
+
+
+class InstallmentSnapshot:
+    """
+    In-memory copy of a LoanInstallment's amounts and status.
+    The waterfall only ever works on snapshots, so it has no side effects.
+    """
+    PAID = 'PAID'
+    PARTIAL = 'PARTIAL'
+
+    def __init__(self, id, due_date, status, penalty_expected, interest_expected, principal_expected,
+                 penalty_paid=ZERO, interest_paid=ZERO, principal_paid=ZERO):
+        self.id = id
+        self.due_date = due_date
+        self.status = status
+        self.penalty_expected = Decimal(str(penalty_expected))
+        self.interest_expected = Decimal(str(interest_expected))
+        self.principal_expected = Decimal(str(principal_expected))
+        self.penalty_paid = Decimal(str(penalty_paid))
+        self.interest_paid = Decimal(str(interest_paid))
+        self.principal_paid = Decimal(str(principal_paid))
+
+    @classmethod
+    def from_installment(cls, inst):
+        return cls(
+            inst.pk, inst.due_date, inst.status,
+            inst.penalty_expected, inst.interest_expected, inst.principal_expected,
+            inst.penalty_paid, inst.interest_paid, inst.principal_paid
+        )
+
+    def copy(self):
+        return InstallmentSnapshot(
+            self.id, self.due_date, self.status,
+            self.penalty_expected, self.interest_expected, self.principal_expected,
+            self.penalty_paid, self.interest_paid, self.principal_paid
+        )
+
+    def apply(self, penalty_amount, interest_amount, principal_amount):
+        """
+        Same arithmetic and status rules as LoanInstallment.apply_funds.
+        """
+        self.penalty_paid += penalty_amount
+        self.interest_paid += interest_amount
+        self.principal_paid += principal_amount
+        self.status = LoanInstallment.derive_status(self, unpaid_status=self.status)
+
+    def as_dict(self):
+        return {
+            'installment_id': self.id,
+            'due_date': self.due_date,
+            'status': self.status,
+            'penalty_paid': self.penalty_paid,
+            'interest_paid': self.interest_paid,
+            'principal_paid': self.principal_paid,
+        }
+
+
+def allocate_waterfall(amount, snapshots):
+    """
+    Splits `amount` across a loan's installments and applies it to the snapshots.
+    Waterfall: Penalty -> Interest -> Principal, oldest unpaid installment first.
+    Excess funds reduce the principal of the last installment.
+
+    Returns one dict per touched installment, keyed like RepaymentAllocation fields.
+    """
+    remaining_funds = Decimal(str(amount))
+    ordered = sorted(snapshots, key=lambda s: s.due_date)
+    lines = {}
+
+    # Installments already PAID before this payment are skipped, like the original query did
+    for snap in [s for s in ordered if s.status != InstallmentSnapshot.PAID]:
+        if remaining_funds <= 0:
+            break
+
+        penalty_due = max(ZERO, snap.penalty_expected - snap.penalty_paid)
+        interest_due = max(ZERO, snap.interest_expected - snap.interest_paid)
+        principal_due = max(ZERO, snap.principal_expected - snap.principal_paid)
+
+        p_alloc = min(remaining_funds, penalty_due)
+        remaining_funds -= p_alloc
+
+        i_alloc = min(remaining_funds, interest_due)
+        remaining_funds -= i_alloc
+
+        pr_alloc = min(remaining_funds, principal_due)
+        remaining_funds -= pr_alloc
+
+        if p_alloc > 0 or i_alloc > 0 or pr_alloc > 0:
+            lines[snap.id] = {
+                'installment_id': snap.id,
+                'penalty_amount': p_alloc,
+                'interest_amount': i_alloc,
+                'principal_amount': pr_alloc,
+            }
+            snap.apply(p_alloc, i_alloc, pr_alloc)
+
+    # Handle Overpayment (excess funds reduce principal of the last installment)
+    if remaining_funds > 0 and ordered:
+        last = ordered[-1]
+        line = lines.setdefault(last.id, {
+            'installment_id': last.id,
+            'penalty_amount': ZERO,
+            'interest_amount': ZERO,
+            'principal_amount': ZERO,
+        })
+        line['principal_amount'] += remaining_funds
+        last.apply(ZERO, ZERO, remaining_funds)
+
+    return list(lines.values())
@@ -1,4 +1,5 @@
 from decimal import Decimal
+from django.db import models
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from loans.models import Loan, LoanInstallment
@@ -142,6 +143,104 @@ class RepaymentAllocationTests(TestCase):
         self.inst1.refresh_from_db()
         self.assertEqual(self.inst1.penalty_paid, Decimal('0.00'))
 
+    def test_refund_unwinds_allocations(self):
+        """Test that refunding a payment restores installments with compensating rows."""
+        from .services.reversal_service import PaymentReversalService
+        payment = Payment.objects.create(
+            user=self.user,
+            loan=self.loan,
+            amount=Decimal('300.00'),
+            status=Payment.Status.COMPLETED,
+            payment_method=Payment.Method.WALLET,
+            idempotency_key='key_refund'
+        )
+        RepaymentAllocationService.process_payment(payment)
+
+        reversals = PaymentReversalService.reverse_payment(payment, None, "Customer dispute")
+        self.assertEqual(len(reversals), 2)
+
+        payment.refresh_from_db()
+        self.inst1.refresh_from_db()
+        self.inst2.refresh_from_db()
+        self.assertEqual(payment.status, Payment.Status.REFUNDED)
+        for inst in (self.inst1, self.inst2):
+            self.assertEqual(inst.penalty_paid + inst.interest_paid + inst.principal_paid, Decimal('0.00'))
+            self.assertNotIn(inst.status, [LoanInstallment.Status.PAID, LoanInstallment.Status.PARTIAL])
+
+        # Originals are kept; each has a negating row
+        totals = RepaymentAllocation.objects.filter(payment=payment).aggregate(
+            p=models.Sum('principal_amount'), i=models.Sum('interest_amount'), pen=models.Sum('penalty_amount')
+        )
+        self.assertEqual(totals, {'p': Decimal('0.00'), 'i': Decimal('0.00'), 'pen': Decimal('0.00')})
+
+        # Allocation never moved the wallet, so the ledger is left alone
+        from core.models import Transaction
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+        # Second reversal is a no-op
+        self.assertEqual(PaymentReversalService.reverse_payment(payment, None, "again"), [])
+
+    def test_chargeback_file_reverses_in_chunks(self):
+        """Test bulk reversal of a chargeback file, including unknown and repeated rows."""
+        import io
+        from .services.reversal_service import PaymentReversalService
+        payments = []
+        for i in range(3):
+            payment = Payment.objects.create(
+                user=self.user, loan=self.loan, amount=Decimal('10.00'),
+                status=Payment.Status.COMPLETED, payment_method=Payment.Method.WALLET,
+                idempotency_key=f'key_cb_{i}'
+            )
+            RepaymentAllocationService.process_payment(payment)
+            payments.append(payment)
+
+        content = "payment_id,idempotency_key,reason\n" + "".join(
+            f"{p.id},,fraud\n" for p in payments
+        ) + ",key_cb_0,fraud\n999999,,fraud\n"
+        summary, results = PaymentReversalService.reverse_file(
+            io.BytesIO(content.encode('utf-8')), 'csv', None, chunk_size=2
+        )
+        self.assertEqual(summary, {'rows': 5, 'reversed': 3, 'skipped': 1, 'errors': 1})
+        self.inst1.refresh_from_db()
+        self.assertEqual(self.inst1.penalty_paid, Decimal('0.00'))
+
+    def test_simulation_has_no_side_effects(self):
+        """Test that a simulated payment reports the split without writing anything."""
+        from .services.simulation_service import AllocationSimulationService
+        result = AllocationSimulationService.simulate(self.loan, Decimal('300.00'))
+
+        self.assertEqual(result['allocations'][0]['penalty_amount'], Decimal('10.00'))
+        self.assertEqual(result['allocations'][1]['interest_amount'], Decimal('15.00'))
+        statuses = [inst['status'] for inst in result['installments']]
+        self.assertEqual(statuses, [LoanInstallment.Status.PAID, LoanInstallment.Status.PARTIAL])
+
+        self.inst1.refresh_from_db()
+        self.assertEqual(self.inst1.penalty_paid, Decimal('0.00'))
+        self.assertFalse(RepaymentAllocation.objects.exists())
+
+    def test_replay_matches_stored_allocations(self):
+        """Test that replaying history reproduces stored allocations and flags tampered ones."""
+        from django.utils import timezone
+        from .services.simulation_service import AllocationSimulationService
+        for i, amount in enumerate(['100.00', '250.00']):
+            payment = Payment.objects.create(
+                user=self.user, loan=self.loan, amount=Decimal(amount),
+                status=Payment.Status.COMPLETED, payment_method=Payment.Method.WALLET,
+                idempotency_key=f'key_replay_{i}'
+            )
+            RepaymentAllocationService.process_payment(payment)
+
+        start = timezone.now() - timezone.timedelta(days=1)
+        end = timezone.now() + timezone.timedelta(days=1)
+        summary, diffs = AllocationSimulationService.replay(start, end)
+        self.assertEqual(summary['matched'], 2)
+        self.assertEqual(diffs, [])
+
+        RepaymentAllocation.objects.filter(payment=payment).update(penalty_amount=Decimal('1.00'))
+        summary, diffs = AllocationSimulationService.replay(start, end)
+        self.assertEqual(summary['mismatched'], 1)
+        self.assertEqual(diffs[0]['payment_id'], payment.id)
+
 from rest_framework.test import APITestCase, APIClient
 
 class PaymentAPITests(APITestCase):
@@ -199,3 +298,270 @@ class PaymentAPITests(APITestCase):
         
         # Total payments in DB should still be 1
         self.assertEqual(Payment.objects.filter(user=self.user).count(), 1)
+
+class BulkPaymentImportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='importadmin', password='password', is_staff=True)
+        self.borrower = User.objects.create_user(username='importborrower', password='password')
+        self.client.force_authenticate(user=self.admin)
+        self.product = LoanProduct.objects.create(
+            name='Import Product',
+            min_amount=100, max_amount=1000,
+            min_term=1, max_term=12,
+            default_interest_rate=10,
+            interest_type='FLAT'
+        )
+        self.application = LoanApplication.objects.create(
+            borrower=self.borrower, product=self.product, amount=500, term=1,
+            status=LoanApplication.Status.DISBURSED
+        )
+        self.loan = Loan.objects.create(
+            application=self.application, borrower=self.borrower, product=self.product,
+            principal=500, interest_rate=10, interest_type='FLAT', term=1,
+            status=Loan.Status.ACTIVE
+        )
+        self.installment = LoanInstallment.objects.create(
+            loan=self.loan, due_date='2026-02-22',
+            principal_expected=500, interest_expected=50
+        )
+
+    def _upload(self, content, name='statement.csv'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(
+            '/api/payments/payments/bulk_import/',
+            {'file': SimpleUploadedFile(name, content.encode('utf-8'))},
+            format='multipart'
+        )
+
+    def test_csv_import_creates_payments_and_reports_rows(self):
+        content = (
+            "reference,bank_reference,amount,currency\n"
+            f"LOAN-{self.loan.id},TRX-1,100.00,USD\n"
+            "LOAN-999999,TRX-2,50.00,USD\n"
+            f"LOAN-{self.loan.id},TRX-1,100.00,USD\n"
+            f"LOAN-{self.loan.id},TRX-3,abc,USD\n"
+        )
+        response = self._upload(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Import-Created'], '1')
+        self.assertEqual(response['X-Import-Duplicates'], '1')
+        self.assertEqual(response['X-Import-Errors'], '2')
+
+        import csv
+        import io
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([r['result'] for r in rows], ['CREATED', 'ERROR', 'DUPLICATE', 'ERROR'])
+
+        payment = Payment.objects.get(loan=self.loan)
+        self.assertEqual(payment.status, Payment.Status.COMPLETED)
+        self.assertEqual(payment.payment_method, Payment.Method.BANK_TRANSFER)
+        self.assertIsNone(payment.captured_at)
+
+        # Re-importing the same statement is idempotent
+        response = self._upload(content)
+        self.assertEqual(response['X-Import-Created'], '0')
+        self.assertEqual(Payment.objects.filter(loan=self.loan).count(), 1)
+
+    def test_jsonl_import_is_queued_for_allocation(self):
+        content = '{"reference": "%s", "bank_reference": "TRX-9", "amount": 150}\n' % self.loan.id
+        response = self._upload(content, name='statement.jsonl')
+        self.assertEqual(response['X-Import-Created'], '1')
+        self.assertEqual(RepaymentAllocationService.pending_allocation().count(), 1)
+
+        processed, failed = RepaymentAllocationService.process_pending()
+        self.assertEqual((processed, failed), (1, 0))
+        self.installment.refresh_from_db()
+        self.assertEqual(self.installment.interest_paid, Decimal('50.00'))
+        self.assertEqual(self.installment.principal_paid, Decimal('100.00'))
+        self.assertEqual(RepaymentAllocationService.pending_allocation().count(), 0)
+
+    def test_failed_allocations_are_logged_and_retried_later(self):
+        from unittest.mock import patch
+        content = '{"reference": "%s", "bank_reference": "TRX-10", "amount": 150}\n' % self.loan.id
+        self._upload(content, name='statement.jsonl')
+        payment = Payment.objects.get(loan=self.loan)
+
+        with patch.object(RepaymentAllocationService, 'process_payment', side_effect=RuntimeError("ledger down")), \
+                self.assertLogs('payments.services.repayment_service', level='ERROR') as logs:
+            self.assertEqual(RepaymentAllocationService.process_pending(), (0, 1))
+        self.assertIn(f"payment {payment.pk}", logs.output[0])
+        payment.refresh_from_db()
+        self.assertEqual((payment.allocation_attempts, payment.allocation_error), (1, "ledger down"))
+
+        # Skipped until the retry is due
+        self.assertEqual(RepaymentAllocationService.process_pending(), (0, 0))
+        later = payment.allocation_retry_at + timezone.timedelta(seconds=1)
+        self.assertEqual(RepaymentAllocationService.pending_allocation(now=later).count(), 1)
+
+    def test_bulk_import_requires_staff(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self._upload("reference,bank_reference,amount\n")
+        self.assertEqual(response.status_code, 403)
+
+class LoanLockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lockuser', password='password')
+        self.product = LoanProduct.objects.create(
+            name='Lock Product',
+            min_amount=100, max_amount=1000,
+            min_term=1, max_term=12,
+            default_interest_rate=10,
+            interest_type='FLAT'
+        )
+        self.application = LoanApplication.objects.create(
+            borrower=self.user, product=self.product, amount=500, term=1,
+            status=LoanApplication.Status.DISBURSED
+        )
+        self.loan = Loan.objects.create(
+            application=self.application, borrower=self.user, product=self.product,
+            principal=500, interest_rate=10, interest_type='FLAT', term=1,
+            status=Loan.Status.ACTIVE
+        )
+        LoanInstallment.objects.create(
+            loan=self.loan, due_date='2026-02-22',
+            principal_expected=500, interest_expected=50
+        )
+
+    def test_allocation_takes_loan_lock_and_records_wait(self):
+        from .locks import get_lock_manager, lock_metrics, TableLockManager
+        from .models import LoanLock
+        lock_metrics.reset()
+        self.assertIsInstance(get_lock_manager(), TableLockManager)
+
+        payment = Payment.objects.create(
+            user=self.user, loan=self.loan, amount=Decimal('100.00'),
+            status=Payment.Status.COMPLETED, payment_method=Payment.Method.WALLET,
+            idempotency_key='key_lock'
+        )
+        RepaymentAllocationService.process_payment(payment)
+
+        self.assertTrue(LoanLock.objects.filter(loan_id=self.loan.id).exists())
+        self.assertEqual(lock_metrics.snapshot()['lock_table']['acquired'], 1)
+
+    def test_lock_requires_transaction(self):
+        from django.db import connection
+        from django.db.transaction import TransactionManagementError
+        from unittest.mock import patch
+        from .locks import get_lock_manager
+        with patch.object(connection, 'in_atomic_block', False):
+            with self.assertRaises(TransactionManagementError):
+                with get_lock_manager().lock(self.loan.id):
+                    pass
+
+from django.test import override_settings
+
+class GatewayInstrumentationTests(APITestCase):
+    def setUp(self):
+        from .gateways.instrumentation import gateway_metrics, reset_breakers
+        gateway_metrics.reset()
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+
+    @override_settings(
+        PAYMENT_GATEWAY_FAULTS={'failure_rate': 1.0},
+        PAYMENT_GATEWAY_BREAKER={'window': 5, 'min_calls': 3, 'error_rate': 0.5, 'reset_timeout': 60}
+    )
+    def test_breaker_opens_on_outbound_calls_only(self):
+        from .gateways.factory import GatewayFactory
+        from .gateways.faulty import GatewayFaultError
+        from .gateways.instrumentation import GatewayUnavailableError, breaker_snapshot, gateway_metrics
+
+        # Failing webhook handling is counted but does not open the circuit
+        for _ in range(3):
+            response = self.client.post('/api/payments/webhooks/faulty/', '{}', content_type='application/json')
+            self.assertEqual(response.status_code, 500)
+        self.assertEqual(breaker_snapshot()['FAULTY']['state'], 'CLOSED')
+        self.assertEqual(gateway_metrics.snapshot()['FAULTY']['verify_webhook_signature']['errors'], 3)
+
+        gateway = GatewayFactory.get_gateway('FAULTY')
+        for _ in range(3):
+            with self.assertRaises(GatewayFaultError):
+                gateway.get_payment_status('ref')
+        with self.assertRaises(GatewayUnavailableError):
+            gateway.get_payment_status('ref')
+        with self.assertRaises(GatewayUnavailableError):
+            gateway.initiate_payment(100, 'USD', 'ref')
+
+        stats = gateway_metrics.snapshot()['FAULTY']['get_payment_status']
+        self.assertEqual((stats['calls'], stats['errors']), (3, 3))
+
+        # Webhooks are still accepted while the provider's circuit is open
+        with self.settings(PAYMENT_GATEWAY_FAULTS={}):
+            response = self.client.post('/api/payments/webhooks/faulty/', '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_half_open_probe_recovers(self):
+        from .gateways.instrumentation import CircuitBreaker, GatewayUnavailableError
+        now = [0.0]
+        breaker = CircuitBreaker('TEST', window=4, min_calls=2, error_rate=0.5,
+                                 slow_call_ms=1000, reset_timeout=10, clock=lambda: now[0])
+        breaker.after_call(1, failed=True)
+        breaker.after_call(1, failed=True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(GatewayUnavailableError):
+            breaker.before_call()
+
+        now[0] = 11
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.before_call()
+        # Only one probe at a time
+        with self.assertRaises(GatewayUnavailableError):
+            breaker.before_call()
+        breaker.after_call(1, failed=False)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        from .gateways.factory import GatewayFactory
+        GatewayFactory.get_gateway(Payment.Method.STRIPE).get_payment_status('ref')
+
+        user = User.objects.create_user(username='metricsuser', password='password')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get('/api/payments/internal/metrics/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get('/api/payments/internal/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['gateways']['STRIPE']['get_payment_status']['calls'], 1)
+        self.assertEqual(response.data['circuit_breakers']['STRIPE']['state'], 'CLOSED')
+
+import tempfile
+from datetime import timedelta
+from django.utils import timezone
+
+class PaymentArchiveTests(TestCase):
+    def setUp(self):
+        self.archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_root.cleanup)
+        self.user = User.objects.create_user(username='archiveuser', password='password')
+        self.payment = Payment.objects.create(
+            user=self.user, amount=100, payment_method=Payment.Method.STRIPE, idempotency_key='archive-1'
+        )
+
+    def test_archive_moves_old_rows_and_fetch_reads_them_back(self):
+        from .models import PaymentAuditLog, PaymentGatewayTransaction
+        from .services.archive_service import PaymentArchiveService
+
+        old_log = PaymentAuditLog.objects.create(payment=self.payment, event_type='INITIATED', description='old')
+        PaymentAuditLog.objects.create(payment=self.payment, event_type='CAPTURED', description='recent')
+        old_tx = PaymentGatewayTransaction.objects.create(
+            payment=self.payment, action='charge.succeeded', raw_response={'id': 'ch_1'}
+        )
+        old = timezone.now() - timedelta(days=200)
+        PaymentAuditLog.objects.filter(pk=old_log.pk).update(created_at=old)
+        PaymentGatewayTransaction.objects.filter(pk=old_tx.pk).update(created_at=old)
+
+        with override_settings(PAYMENT_ARCHIVE_ROOT=self.archive_root.name, PAYMENT_ARCHIVE_RETENTION_DAYS=90):
+            archived = PaymentArchiveService.archive()
+            self.assertEqual(archived, {'audit_logs': 1, 'gateway_transactions': 1})
+            self.assertFalse(PaymentAuditLog.objects.filter(pk=old_log.pk).exists())
+            self.assertEqual(PaymentAuditLog.objects.filter(payment=self.payment).count(), 1)
+
+            logs = PaymentArchiveService.fetch(self.payment.pk, 'audit_logs')
+            self.assertEqual([row['id'] for row in logs], [old_log.pk])
+            self.assertEqual(logs[0]['description'], 'old')
+            txs = PaymentArchiveService.fetch(self.payment.pk, 'gateway_transactions')
+            self.assertEqual(txs[0]['raw_response'], {'id': 'ch_1'})
+
+            # A second run finds nothing left to move
+            self.assertEqual(PaymentArchiveService.archive(), {'audit_logs': 0, 'gateway_transactions': 0})
@@ -19,3 +19,8 @@ sys.path.append(os.path.join(BASE_DIR, 'apps'))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
 
 application = get_asgi_application()
+
+# Checks in the first requests are then served from memory
+from compliance.blacklist_cache import membership  # noqa: E402
+
+membership.prime()
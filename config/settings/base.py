@@ -87,6 +87,16 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default=f'sqlite:///{BASE_DIR / "db.sqlite3"}'),
 }
 
+# Shared across worker processes in production (e.g. CACHE_URL=redis://...);
+# the blacklist membership version lives here
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+BLACKLIST_CACHE_ALIAS = 'default'
+# With the local-memory default, other processes' blacklist changes cannot
+# be announced, so each process reloads the set at least this often
+BLACKLIST_LOCAL_RELOAD_SECONDS = env.int('BLACKLIST_LOCAL_RELOAD_SECONDS', default=10)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,6 +127,52 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Hand buffered audit batches to a background writer after commit instead
+# of inserting them inside the caller's transaction
+AUDIT_ASYNC_WRITES = env.bool('AUDIT_ASYNC_WRITES', default=False)
+
+# An audit chain checkpoint is recorded every N audit records
+AUDIT_CHECKPOINT_INTERVAL = env.int('AUDIT_CHECKPOINT_INTERVAL', default=10000)
+
+# Audit rows older than this (and covered by a verified chain checkpoint)
+# are sealed into cold storage by `python manage.py tier_audit_logs`
+AUDIT_ARCHIVE_ROOT = env('AUDIT_ARCHIVE_ROOT', default=os.path.join(BASE_DIR, 'archive', 'audit'))
+AUDIT_HOT_RETENTION_DAYS = env.int('AUDIT_HOT_RETENTION_DAYS', default=365)
+
+# Payment log archival: rows older than the retention window are moved to
+# compressed segment files (see `python manage.py archive_payment_logs`)
+PAYMENT_ARCHIVE_ROOT = env('PAYMENT_ARCHIVE_ROOT', default=os.path.join(BASE_DIR, 'archive', 'payments'))
+PAYMENT_ARCHIVE_RETENTION_DAYS = env.int('PAYMENT_ARCHIVE_RETENTION_DAYS', default=90)
+
+# Background report exports (POST /compliance/api/report-jobs/) run on a
+# local pool of this many threads and write their files here
+REPORT_JOB_WORKERS = env.int('REPORT_JOB_WORKERS', default=2)
+REPORT_OUTPUT_ROOT = env('REPORT_OUTPUT_ROOT', default=os.path.join(MEDIA_ROOT, 'reports'))
+
+# Incremental report snapshots re-read rows updated up to this long before
+# the previous snapshot started; must exceed the longest transaction that
+# writes loans or installments, or its changes can be missed
+REPORT_SNAPSHOT_WATERMARK_MARGIN_SECONDS = env.int('REPORT_SNAPSHOT_WATERMARK_MARGIN_SECONDS', default=15 * 60)
+
+# Month-partitioned Parquet exports for analysts
+# (`python manage.py export_parquet`, requires the optional pyarrow package)
+ANALYTICS_EXPORT_ROOT = env('ANALYTICS_EXPORT_ROOT', default=os.path.join(BASE_DIR, 'exports', 'parquet'))
+
+# How long an officer's claim on a work queue application lasts before
+# another officer may take it over
+WORK_QUEUE_LEASE_SECONDS = env.int('WORK_QUEUE_LEASE_SECONDS', default=30 * 60)
+
+# Chunked document uploads (core.uploads): partial files live here until
+# finished; sessions left unfinished expire and are removed by
+# `python manage.py purge_upload_sessions`
+UPLOAD_PARTIAL_ROOT = env('UPLOAD_PARTIAL_ROOT', default=os.path.join(MEDIA_ROOT, 'uploads', 'partial'))
+UPLOAD_MAX_SIZE = env.int('UPLOAD_MAX_SIZE', default=100 * 1024 * 1024)
+UPLOAD_SESSION_TTL_HOURS = env.int('UPLOAD_SESSION_TTL_HOURS', default=24)
+
+# Uploaded bank statements are parsed on a local pool of this many threads;
+# `python manage.py process_statements` resubmits due retries
+STATEMENT_WORKERS = env.int('STATEMENT_WORKERS', default=2)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -29,6 +29,7 @@ urlpatterns = [
     path('api/products/', include('loan_products.api_urls')),
     path('api/applications/', include('loan_applications.api_urls')),
     path('api/payments/', include('payments.api_urls')),
+    path('api/uploads/', include('core.api_urls')),
     path('compliance/', include('compliance.urls')),
     path('', include('core.urls')), 
 ]